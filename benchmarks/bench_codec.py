@@ -0,0 +1,133 @@
+"""Per-request JSON codec cost: stdlib json against orjson.
+
+Compares the serialization work FastAPI does on a get_projects response and
+on the ingestion routes, with the JSONResponse/json.loads pair the app used
+before and the ORJSONResponse/ORJSONRequest pair it uses now.
+
+    python -m benchmarks.bench_codec
+
+Settings are read from the environment or .env like the app.
+"""
+import json
+import time
+from typing import Callable, Dict, Tuple
+
+import orjson
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from src.projects import schemas
+
+
+def project(n: int) -> dict:
+    return {
+        "id": n,
+        "name": f"Project {n}",
+        "slug": f"project-{n}",
+        "api_key": "k" * 32,
+        "mixpanel_key": "m" * 32,
+        "data_center": "EU",
+        "is_premium": n % 2 == 0,
+        "org": {"name": "Org", "slug": "org"},
+        "creator": {"first_name": "Ada", "last_name": "Lovelace"},
+        "count_per_hour": [{"count": n}],
+    }
+
+
+def event(n: int) -> dict:
+    return {
+        "distinct_id": f"user-{n}",
+        "event": "Checkout",
+        "properties": {f"prop_{i}": f"value {i} of {n}" for i in range(40)},
+    }
+
+
+PROJECTS = {
+    "message": "Projects retrieved",
+    "status": 200,
+    "data": [project(n) for n in range(50)],
+}
+EVENT_BODY = json.dumps(event(0)).encode()
+BATCH_BODY = json.dumps([event(n) for n in range(500)]).encode()
+ACCEPTED = {"message": "event sent successfully to Mix Pannel", "status": 200}
+
+
+def serialized(field, content: dict):
+    """Validated, jsonable_encoder'ed content, as FastAPI hands it to the response."""
+    coro = serialize_response(field=field, response_content=content)
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("serialize_response suspended")
+
+
+def respond(model, content: dict, response_class) -> Callable[[], bytes]:
+    """FastAPI's response path: validate, jsonable_encoder, then render."""
+    field = create_response_field(name="response", type_=model)
+    return lambda: response_class(serialized(field, content)).body
+
+
+def render(model, content: dict, response_class) -> Callable[[], bytes]:
+    """Only the render step of the response path."""
+    encoded = serialized(create_response_field(name="response", type_=model), content)
+    return lambda: response_class(encoded).body
+
+
+def ingest(body: bytes, loads, response_class) -> Callable[[], bytes]:
+    """Request decode plus the response of an ingestion route."""
+    return lambda: response_class({**ACCEPTED, "received": len(loads(body))}).body
+
+
+# name -> (stdlib json, orjson)
+BENCHMARKS: Dict[str, Tuple[Callable, Callable]] = {
+    "get_projects render (50 projects)": (
+        render(schemas.MessageListProjectResp, PROJECTS, JSONResponse),
+        render(schemas.MessageListProjectResp, PROJECTS, ORJSONResponse),
+    ),
+    "get_projects response (50 projects)": (
+        respond(schemas.MessageListProjectResp, PROJECTS, JSONResponse),
+        respond(schemas.MessageListProjectResp, PROJECTS, ORJSONResponse),
+    ),
+    "event_props request + response": (
+        ingest(EVENT_BODY, json.loads, JSONResponse),
+        ingest(EVENT_BODY, orjson.loads, ORJSONResponse),
+    ),
+    "event_batch request (500 events)": (
+        ingest(BATCH_BODY, json.loads, JSONResponse),
+        ingest(BATCH_BODY, orjson.loads, ORJSONResponse),
+    ),
+}
+
+
+def per_call(fn: Callable, seconds: float = 0.5, repeat: int = 5) -> float:
+    """Best time of one call in seconds over `repeat` runs."""
+    fn()
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - start >= seconds / 10:
+            break
+        loops *= 2
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def main():
+    print(f"{'benchmark':40} {'json us':>10} {'orjson us':>10} {'saved':>7}")
+    for name, (stdlib, fast) in BENCHMARKS.items():
+        before, after = per_call(stdlib) * 1e6, per_call(fast) * 1e6
+        print(f"{name:40} {before:10.1f} {after:10.1f} {1 - after / before:7.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Microbenchmarks of the hot paths, with stored JSON baselines.
+
+    python -m benchmarks.suite run --save benchmarks/baselines/local.json
+    python -m benchmarks.suite compare benchmarks/baselines/local.json --threshold 0.15
+
+`compare` runs the suite (or reads a second results file) and exits with 1
+when a benchmark is slower than its baseline by more than the threshold.
+Settings are read from the environment or .env like the app.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+from datetime import datetime
+from typing import Callable, Dict
+
+from benchmarks import bench_codec
+from benchmarks.bench_codec import per_call
+from src.app.utils.db_utils import hash_password, verify_password
+from src.app.utils.mixers import Mixer
+from src.auth import oauth
+from src.auth.models import User
+from src.organization.models import Organization, OrgMember
+from src.organization.org_service import org_service
+from src.projects import schemas
+from src.projects.mixer_ops import run_operation
+from src.projects.models import Project, ProjectRateLimit
+from src.projects.project_service import project_service
+
+
+class NullConsumer:
+    """Mixpanel consumer dropping messages, so only the Mixer side is timed."""
+
+    def send(self, endpoint, json_message, api_key=None, api_secret=None):
+        pass
+
+
+def large_properties(size: int = 200) -> dict:
+    return {f"prop_{i}": f"value {i}" if i % 2 else i for i in range(size)}
+
+
+def loaded(instance, **relationships):
+    """ORM instance with its relationships already loaded, as after a query.
+
+    Set through __dict__ so back_populates does not link the fixtures both
+    ways, which jsonable_encoder would follow forever.
+    """
+    instance.__dict__.update(relationships)
+    return instance
+
+
+USER = User(id=1, first_name="Ada", last_name="Lovelace", email="ada@example.com")
+ORG = Organization(id=1, name="Org", slug="org", created_by=1)
+MEMBER = loaded(
+    OrgMember(id=1, org_id=1, member_id=1, role="Member"), member=USER, org=ORG
+)
+ORG_WITH_MEMBERS = loaded(
+    Organization(id=1, name="Org", slug="org", created_by=1),
+    creator=USER,
+    org_member=[
+        loaded(OrgMember(id=n, org_id=1, member_id=1, role="Member"), member=USER)
+        for n in range(10)
+    ],
+)
+PROJECT = loaded(
+    Project(
+        id=1,
+        name="Project",
+        slug="project",
+        org_id=1,
+        api_key="k" * 32,
+        data_center="EU",
+        mixpanel_key="m" * 32,
+        is_premium=True,
+        created_by=1,
+    ),
+    org=ORG,
+    creator=USER,
+    pj_rate=[ProjectRateLimit(id=1, project_id=1, count=3)],
+)
+
+MIXER = Mixer("token", "EU", consumer=NullConsumer())
+EVENT = schemas.EventProp(distinct_id="d", event="e", properties=large_properties(20))
+PEOPLE = schemas.PeopleProp_(distinct_id="d", data={"visits": 1})
+EVENT_DICT = {"distinct_id": "d", "event": "e", "properties": large_properties()}
+PEOPLE_DICT = {
+    "distinct_id": "d",
+    "first_name": "Ada",
+    "last_name": "Lovelace",
+    "email": "ada@example.com",
+    "phone_number": "+000",
+    "extra_props": large_properties(),
+}
+PASSWORD = "correct horse battery staple"
+HASHED = hash_password(PASSWORD)
+TOKEN = oauth.create_access_token({"email": "ada@example.com"})
+
+BENCHMARKS: Dict[str, Callable] = {
+    "mixer.track_events": lambda: MIXER.track_events("d", "e", EVENT.properties),
+    "mixer.increment_people": lambda: MIXER.increment_people("d", {"visits": 1}),
+    "mixer_ops.run_operation track": lambda: run_operation(MIXER, "track", EVENT),
+    "mixer_ops.run_operation increment": lambda: run_operation(
+        MIXER, "increment", PEOPLE
+    ),
+    "ProjectService.orm_call": lambda: project_service.orm_call(PROJECT),
+    "OrgService.orm_call": lambda: org_service.orm_call(ORG_WITH_MEMBERS),
+    "OrgService.member_orm_call": lambda: org_service.member_orm_call(MEMBER),
+    "EventProp.parse_obj (200 properties)": lambda: schemas.EventProp.parse_obj(
+        EVENT_DICT
+    ),
+    "PeopleProp.parse_obj (200 properties)": lambda: schemas.PeopleProp.parse_obj(
+        PEOPLE_DICT
+    ),
+    "verify_password": lambda: verify_password(HASHED, PASSWORD),
+    "oauth.create_access_token": lambda: oauth.create_access_token(
+        {"email": "ada@example.com"}
+    ),
+    "jwt.decode access token": lambda: oauth.jwt.decode(
+        TOKEN, oauth.access_secret_key, algorithms=[oauth.Algorithm]
+    ),
+}
+for name, (_, fast) in bench_codec.BENCHMARKS.items():
+    BENCHMARKS[f"codec: {name}"] = fast
+
+
+def run(pattern: str | None = None) -> dict:
+    """Times every benchmark whose name matches pattern.
+
+    Returns:
+        dict: {"meta": {...}, "results": {name: {"us_per_call": ...}}}
+    """
+    results = {}
+    for name, fn in BENCHMARKS.items():
+        if pattern and not re.search(pattern, name):
+            continue
+        results[name] = {"us_per_call": round(per_call(fn) * 1e6, 3)}
+        print(f"{name:55} {results[name]['us_per_call']:12.1f} us", file=sys.stderr)
+
+    return {
+        "meta": {
+            "created": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Benchmarks slower than their baseline by more than threshold.
+
+    Returns:
+        list: (name, baseline us, current us, change) of each regression.
+    """
+    regressions = []
+    print(f"{'benchmark':55} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:55} {'-':>10} {result['us_per_call']:10.1f}      new")
+            continue
+        change = result["us_per_call"] / before["us_per_call"] - 1
+        flag = "  REGRESSION" if change > threshold else ""
+        print(
+            f"{name:55} {before['us_per_call']:10.1f} "
+            f"{result['us_per_call']:10.1f} {change:8.1%}{flag}"
+        )
+        if change > threshold:
+            regressions.append(
+                (name, before["us_per_call"], result["us_per_call"], change)
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="time the suite")
+    run_parser.add_argument("--filter", help="regex of benchmark names")
+    run_parser.add_argument("--save", help="write the results to this JSON file")
+
+    compare_parser = commands.add_parser("compare", help="check against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current", nargs="?", help="results file to compare")
+    compare_parser.add_argument("--filter", help="regex of benchmark names")
+    compare_parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run(args.filter)
+        if args.save:
+            os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+            with open(args.save, "w") as f:
+                json.dump(results, f, indent=2)
+        else:
+            print(json.dumps(results, indent=2))
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        current = run(args.filter)
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) past {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
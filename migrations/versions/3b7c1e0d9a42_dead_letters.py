@@ -0,0 +1,42 @@
+"""Dead letters of failed Mixpanel messages
+
+Revision ID: 3b7c1e0d9a42
+Revises: 255302eff303
+Create Date: 2026-10-18 10:12:41.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3b7c1e0d9a42"
+down_revision = "255302eff303"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "dead_letters",
+        sa.Column("id", sa.Integer),
+        sa.Column("project_id", sa.Integer, nullable=False),
+        sa.Column("endpoint", sa.String, nullable=False),
+        sa.Column("message", sa.Text, nullable=False),
+        sa.Column("error", sa.Text, nullable=True),
+        sa.Column("attempts", sa.Integer, nullable=False, server_default=sa.text("1")),
+        sa.Column(
+            "date_created", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()")
+        ),
+        sa.Column(
+            "date_updated", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()")
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"], ondelete="CASCADE"),
+    )
+    op.create_index("ix_dead_letters_project_id", "dead_letters", ["project_id", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_dead_letters_project_id", table_name="dead_letters")
+    op.drop_table("dead_letters")
@@ -0,0 +1,46 @@
+"""Hourly buckets of project rate limits
+
+Revision ID: 7f2d4a9c1b63
+Revises: 3b7c1e0d9a42
+Create Date: 2026-10-18 14:37:05.918342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7f2d4a9c1b63"
+down_revision = "3b7c1e0d9a42"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "project_rate_buckets",
+        sa.Column("id", sa.Integer),
+        sa.Column("project_id", sa.Integer, nullable=False),
+        sa.Column("hour_bucket", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("count", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column(
+            "date_created", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()")
+        ),
+        sa.Column(
+            "date_updated", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()")
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"], ondelete="CASCADE"),
+        sa.UniqueConstraint("project_id", "hour_bucket"),
+    )
+    # pruning old buckets scans by hour.
+    op.create_index(
+        "ix_project_rate_buckets_hour_bucket", "project_rate_buckets", ["hour_bucket"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_project_rate_buckets_hour_bucket", table_name="project_rate_buckets"
+    )
+    op.drop_table("project_rate_buckets")
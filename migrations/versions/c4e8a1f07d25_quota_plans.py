@@ -0,0 +1,58 @@
+"""Quota plans of projects and organizations
+
+Revision ID: c4e8a1f07d25
+Revises: 7f2d4a9c1b63
+Create Date: 2026-10-18 16:02:48.337190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "c4e8a1f07d25"
+down_revision = "7f2d4a9c1b63"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "quota_plans",
+        sa.Column("id", sa.Integer),
+        sa.Column("name", sa.String, nullable=False),
+        sa.Column("hourly_limit", sa.Integer, nullable=False),
+        sa.Column("burst", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column(
+            "weights",
+            postgresql.JSONB,
+            nullable=False,
+            server_default=sa.text("'{}'::jsonb"),
+        ),
+        sa.Column(
+            "date_created", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()")
+        ),
+        sa.Column(
+            "date_updated", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()")
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    for table in ("projects", "organization"):
+        op.add_column(table, sa.Column("quota_plan_id", sa.Integer, nullable=True))
+        op.create_foreign_key(
+            f"{table}_quota_plan_id_fkey",
+            table,
+            "quota_plans",
+            ["quota_plan_id"],
+            ["id"],
+            ondelete="SET NULL",
+        )
+
+
+def downgrade() -> None:
+    for table in ("projects", "organization"):
+        op.drop_constraint(f"{table}_quota_plan_id_fkey", table, type_="foreignkey")
+        op.drop_column(table, "quota_plan_id")
+    op.drop_table("quota_plans")
@@ -1,19 +1,148 @@
+import json
+import logging
+import zlib
+from typing import Dict, List
+
 from celery import Celery
 from celery.schedules import crontab
+from celery.utils.time import get_exponential_backoff_interval
 
+from src.app.config import mixer_settings
+from src.app.utils.batcher import BufferKey, MixerBatcher
+from src.app.utils.dead_letters import dead_letter_store
+from src.app.utils.tiers import PREMIUM
+from src.projects import mixer_ops
 from src.projects.project_service import project_service
 
+logger = logging.getLogger(__name__)
+
 job = Celery("mixer", broker="redis://localhost:6379/0")
 job.conf.enable_utc = True
 
 
+def delivery_queue_name(mixpanel_key: str, premium: bool = False) -> str:
+    """Celery queue of a Project, spreading projects over the delivery queues.
+
+    Premium projects have a queue of their own, so workers consuming it are
+    never behind freemium traffic.
+
+    Args:
+        mixpanel_key (str): Mixpanel key of the Project.
+        premium (bool, optional): the Project is premium. Defaults to False.
+
+    Returns:
+        str: queue name.
+    """
+    if premium:
+        return "mixer.delivery.premium"
+    shard = zlib.crc32(mixpanel_key.encode()) % mixer_settings.mixer_celery_queues
+    return f"mixer.delivery.{shard}"
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    if name == deliver_operations.name:
+        premium = args[3] if len(args) > 3 else kwargs.get("premium", False)
+        return {"queue": delivery_queue_name(args[0], premium)}
+    return None
+
+
+job.conf.update(
+    task_routes=(route_task,),
+    # a delivery is only acked once Mixpanel has taken the whole batch.
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=mixer_settings.mixer_celery_prefetch,
+    worker_concurrency=mixer_settings.mixer_celery_concurrency,
+)
+
+
 @job.task
 def update_throttle_job():
     return project_service.job_pjs_rate_limit()
 
 
+@job.task
+def persist_rate_limits_job():
+    return project_service.persist_rate_limits()
+
+
+@job.task(bind=True, max_retries=mixer_settings.mixer_celery_max_retries)
+def deliver_operations(
+    self,
+    mixpanel_key: str,
+    data_center: str | None,
+    operations: List[dict],
+    premium: bool = False,
+    messages: Dict[str, List[str]] | None = None,
+):
+    if messages is None:
+        messages = mixer_ops.capture_operations(mixpanel_key, data_center, operations)
+    try:
+        # the last retry keeps what Mixpanel still refuses as dead letters.
+        return mixer_ops.deliver_messages(
+            mixpanel_key,
+            data_center,
+            messages,
+            dead_letter=self.request.retries >= self.max_retries,
+            attempts=self.request.retries + 1,
+            premium=premium,
+        )
+    except mixer_ops.PartialDelivery as e:
+        # retries only the messages Mixpanel did not take, so updates such as
+        # $add or $append it took are not applied twice.
+        raise self.retry(
+            exc=e,
+            args=(mixpanel_key, data_center, [], premium),
+            kwargs={"messages": e.failed},
+            countdown=get_exponential_backoff_interval(
+                factor=1, retries=self.request.retries, maximum=600, full_jitter=True
+            ),
+        )
+
+
+class OperationBatcher(MixerBatcher):
+    """Batches accepted operations per project and hands them to Celery.
+
+    Batches Celery could not take are kept as dead letters.
+    """
+
+    def deliver(self, key: BufferKey, batch: List[str]):
+        mixpanel_key, data_center, tier_name = key
+        operations = [json.loads(operation) for operation in batch]
+        deliver_operations.delay(
+            mixpanel_key, data_center, operations, tier_name == PREMIUM
+        )
+
+    def dead_letter(self, key: BufferKey, batch: List[str], error: Exception):
+        mixpanel_key, data_center, _ = key
+        logger.error(
+            "Celery did not take %s operations of %s: %s",
+            len(batch),
+            mixpanel_key,
+            error,
+        )
+        if self.dead_letters is None:
+            return
+        operations = [json.loads(operation) for operation in batch]
+        messages = mixer_ops.capture_operations(mixpanel_key, data_center, operations)
+        for endpoint, endpoint_messages in messages.items():
+            self.dead_letters.add(mixpanel_key, endpoint, endpoint_messages, str(error))
+
+
+operation_batcher = OperationBatcher(
+    mixer_settings.mixer_batch_size,
+    mixer_settings.mixer_batch_max_age,
+    dead_letters=dead_letter_store,
+)
+
+
 job.add_periodic_task(
     crontab(minute=0, hour="*"),
     update_throttle_job.s(),
-    name="Project Rate Limit Count to 0",
+    name="Prune Project Rate Limit hour buckets",
+)
+job.add_periodic_task(
+    mixer_settings.mixer_rate_limit_persist_interval,
+    persist_rate_limits_job.s(),
+    name="Persist Project Rate Limit counts",
 )
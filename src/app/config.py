@@ -26,6 +26,88 @@ class MailSettings(AbstractSettings):
     mail_from_name: str
 
 
+class MixerSettings(AbstractSettings):
+    mixer_batch_enabled: bool = True
+    mixer_batch_size: int = 50
+    mixer_batch_max_age: float = 1.0
+    mixer_coalesce_enabled: bool = True
+    mixer_dedup_enabled: bool = True
+    mixer_dedup_window: float = 600.0
+    mixer_dedup_buckets: int = 10
+    mixer_dedup_max_ids: int = 1_000_000
+    mixer_api_scheme: str = "https"
+    mixer_api_host: str = "api.mixpanel.com"
+    mixer_eu_api_host: str = "api-eu.mixpanel.com"
+    mixer_pool_maxsize: int = 20
+    mixer_client_cache_size: int = 1024
+    mixer_delivery_workers: int = 8
+    mixer_delivery_queue_size: int = 10000
+    mixer_bulk_max_events: int = 5000
+    mixer_stream_max_line_bytes: int = 1024 * 1024
+    mixer_stream_max_errors: int = 100
+    mixer_spool_enabled: bool = False
+    mixer_spool_dir: str = "spool"
+    mixer_spool_segment_bytes: int = 16 * 1024 * 1024
+    mixer_spool_max_bytes: int = 1024 * 1024 * 1024
+    mixer_spool_fsync_interval: float = 1.0
+    mixer_delivery_backend: str = "local"
+    mixer_celery_queues: int = 4
+    mixer_celery_concurrency: int = 8
+    mixer_celery_prefetch: int = 1
+    mixer_celery_max_retries: int = 5
+    mixer_request_timeout: float = 5.0
+    mixer_gzip_enabled: bool = True
+    mixer_gzip_min_bytes: int = 1024
+    mixer_gzip_level: int = 6
+    mixer_retry_limit: int = 3
+    mixer_retry_backoff: float = 0.25
+    mixer_retry_backoff_max: float = 5.0
+    mixer_breaker_failures: int = 5
+    mixer_breaker_reset: float = 30.0
+    mixer_lane_concurrency: int = 16
+    mixer_lane_timeout: float = 1.0
+    mixer_lane_async_concurrency: int = 1000
+    mixer_transport: str = "async"
+    mixer_async_max_connections: int = 1000
+    mixer_async_max_keepalive: int = 100
+    mixer_premium_pool_maxsize: int = 20
+    mixer_premium_delivery_workers: int = 8
+    mixer_premium_delivery_queue_size: int = 10000
+    mixer_premium_lane_concurrency: int = 16
+    mixer_premium_lane_async_concurrency: int = 500
+    mixer_premium_async_max_connections: int = 500
+    mixer_premium_async_max_keepalive: int = 100
+    mixer_project_inflight: int = 64
+    mixer_global_inflight: int = 1024
+    mixer_inflight_queue: int = 256
+    mixer_inflight_wait: float = 2.0
+    mixer_retry_after: int = 1
+    mixer_capture_enabled: bool = False
+    mixer_capture_path: str = "captures/capture.jsonl.gz"
+    mixer_capture_sample: float = 0.1
+    mixer_capture_redact: bool = True
+    mixer_capture_max_body: int = 1024 * 1024
+    mixer_dead_letter_enabled: bool = True
+    mixer_dead_letter_replay_rate: float = 5.0
+    mixer_dead_letter_replay_limit: int = 5000
+    mixer_rate_limit_backend: str = "redis"
+    mixer_rate_limit_redis_url: str = "redis://localhost:6379/1"
+    mixer_freemium_hourly_limit: int = 2
+    mixer_freemium_burst: int = 0
+    mixer_rate_burst_window: float = 60.0
+    mixer_rate_limit_window: float = 3600.0
+    mixer_rate_limit_persist_interval: float = 60.0
+    mixer_rate_bucket_retention_hours: int = 24
+    mixer_quota_plan_ttl: float = 30.0
+    mixer_quota_plan_check_interval: float = 2.0
+    mixer_quota_lease_enabled: bool = False
+    mixer_quota_lease_share: float = 0.1
+    mixer_quota_lease_max: int = 100
+    mixer_quota_lease_ttl: float = 60.0
+    mixer_quota_lease_low_water: float = 0.2
+
+
 db_settings = DBSettings()
 auth_settings = AuthSettings()
 mail_settings = MailSettings()
+mixer_settings = MixerSettings()
@@ -1,14 +1,24 @@
 from typing import List
 
-from fastapi import FastAPI, status
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from mixpanel import MixpanelException
 
-from src.app.config import db_settings
+from src.app.celery_jobs import operation_batcher
+from src.app.config import db_settings, mixer_settings
+from src.app.utils.capture import CaptureMiddleware, capture_writer
+from src.app.utils.metrics import metrics
+from src.app.utils.quota_lease import quota_leases
+from src.app.utils.quota_plans import quota_plans
+from src.app.utils.tiers import tiers
 from src.auth.auth_router import user_router
 from src.organization.org_router import org_router
-from src.projects.project_router import project_router
+from src.projects.project_router import INGESTION_PATHS, project_router
 
-app = FastAPI()
+# responses are rendered with orjson; request bodies are decoded with it by
+# the ORJSONRoute of each router.
+app = FastAPI(default_response_class=ORJSONResponse)
 
 
 origins: List = ["*", "http://localhost:3000"]
@@ -22,11 +32,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if capture_writer is not None:
+    # samples ingestion traffic for tools.replay.
+    app.add_middleware(
+        CaptureMiddleware,
+        writer=capture_writer,
+        paths=INGESTION_PATHS,
+        sample=mixer_settings.mixer_capture_sample,
+        redact_keys=mixer_settings.mixer_capture_redact,
+        max_body=mixer_settings.mixer_capture_max_body,
+    )
+
 app.include_router(user_router)
 app.include_router(org_router)
 app.include_router(project_router)
 
 
+@app.exception_handler(MixpanelException)
+def mixpanel_exception_handler(request: Request, exc: MixpanelException):
+    # the call could not be sent or stored for delivery.
+    return ORJSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": f"Mix Pannel call was not accepted: {exc}"},
+    )
+
+
+@app.on_event("startup")
+async def start_delivery_queue():
+    for tier in tiers.values():
+        await tier.start()
+    # loads the quota plans before the first rate limited call needs them.
+    quota_plans.invalidate()
+
+
+@app.on_event("shutdown")
+async def flush_mixer_batches():
+    # runs queued calls, then sends whatever is still buffered for Mixpanel.
+    operation_batcher.flush()
+    for tier in tiers.values():
+        await tier.stop()
+    if capture_writer is not None:
+        capture_writer.close()
+    if quota_leases is not None:
+        # gives the calls this worker leased and did not make back to the others.
+        quota_leases.close()
+
+
 @app.get("/", status_code=status.HTTP_200_OK)
 def root() -> dict:
     return {"message": "Welcome to the Mixer Project, I am Bolt.", "docs": "/docs"}
+
+
+@app.get("/metrics/", status_code=status.HTTP_200_OK)
+def get_metrics() -> dict:
+    return metrics.snapshot()
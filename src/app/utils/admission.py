@@ -0,0 +1,154 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Hashable
+
+from src.app.config import mixer_settings
+from src.app.utils.metrics import metrics
+
+
+class InFlightFull(Exception):
+    """Raised when a request cannot get an in-flight slot."""
+
+    def __init__(self, scope: str, retry_after: int):
+        super().__init__(f"{scope} in-flight limit reached")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class InFlightLimits:
+    """Per-project and global limits on the requests in flight on the event loop.
+
+    A request over a limit is refused straight away, unless it may wait: then
+    it queues for up to `wait_timeout` seconds, with at most `queue_size`
+    requests waiting at once. Deliveries made after their request was
+    answered hold a slot too, waiting for one as long as it takes.
+    """
+
+    def __init__(
+        self,
+        per_project: int,
+        global_limit: int,
+        queue_size: int,
+        wait_timeout: float,
+        retry_after: int,
+    ):
+        self.per_project = per_project
+        self.global_limit = global_limit
+        self.queue_size = queue_size
+        self.wait_timeout = wait_timeout
+        self.retry_after = retry_after
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.holding = 0
+        self.projects: Dict[Hashable, int] = {}
+        self._released: asyncio.Condition | None = None
+
+    def full(self, project: Hashable) -> str | None:
+        """Scope of the limit keeping project from a slot, if any."""
+        if self.in_flight >= self.global_limit:
+            return "global"
+        if self.projects.get(project, 0) >= self.per_project:
+            return "project"
+        return None
+
+    def released(self) -> asyncio.Condition:
+        if self._released is None:
+            self._released = asyncio.Condition()
+        return self._released
+
+    def _take(self, project: Hashable):
+        self.in_flight += 1
+        self.projects[project] = self.projects.get(project, 0) + 1
+
+    def reject(self, scope: str):
+        metrics.incr("mixer_inflight_rejected", scope=scope)
+        raise InFlightFull(scope, self.retry_after)
+
+    async def acquire(self, project: Hashable, wait: bool = False):
+        """Takes a slot for project.
+
+        Args:
+            project (Hashable): Project key, e.g. its id.
+            wait (bool, optional): queue when a limit is reached. Defaults to False.
+
+        Raises:
+            InFlightFull: If no slot is free, or none freed up in time.
+        """
+        scope = self.full(project)
+        if scope is None:
+            self._take(project)
+            return
+        if not wait or self.waiting >= self.queue_size:
+            self.reject(scope)
+
+        released = self.released()
+        self.waiting += 1
+        try:
+            async with released:
+                await asyncio.wait_for(
+                    released.wait_for(lambda: self.full(project) is None),
+                    self.wait_timeout,
+                )
+                self._take(project)
+        except asyncio.TimeoutError:
+            self.reject(self.full(project) or scope)
+        finally:
+            self.waiting -= 1
+
+    async def release(self, project: Hashable):
+        self.in_flight -= 1
+        count = self.projects.pop(project, 1) - 1
+        if count:
+            self.projects[project] = count
+        if self.waiting or self.holding:
+            released = self.released()
+            async with released:
+                released.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, project: Hashable, wait: bool = False):
+        await self.acquire(project, wait)
+        try:
+            yield
+        finally:
+            await self.release(project)
+
+    @asynccontextmanager
+    async def held(self, project: Hashable):
+        """Slot for a delivery that cannot be refused, as its request was
+        already accepted; waits for one without a timeout."""
+        released = self.released()
+        self.holding += 1
+        try:
+            async with released:
+                await released.wait_for(lambda: self.full(project) is None)
+                self._take(project)
+        finally:
+            self.holding -= 1
+        try:
+            yield
+        finally:
+            await self.release(project)
+
+    def busiest(self) -> float:
+        """Fill of the busiest project, from 0 to 1."""
+        return max(self.projects.values(), default=0) / self.per_project
+
+
+in_flight = InFlightLimits(
+    mixer_settings.mixer_project_inflight,
+    mixer_settings.mixer_global_inflight,
+    mixer_settings.mixer_inflight_queue,
+    mixer_settings.mixer_inflight_wait,
+    mixer_settings.mixer_retry_after,
+)
+
+metrics.register("mixer_inflight", lambda: in_flight.in_flight, scope="global")
+metrics.register("mixer_inflight_fill", in_flight.busiest, scope="project")
+metrics.register(
+    "mixer_inflight_fill",
+    lambda: in_flight.in_flight / in_flight.global_limit,
+    scope="global",
+)
+metrics.register("mixer_inflight_waiting", lambda: in_flight.waiting)
@@ -0,0 +1,108 @@
+import asyncio
+import weakref
+from typing import Dict, List
+
+import httpx
+from mixpanel import MixpanelException
+
+from src.app.utils.encoding import encode_request
+from src.app.utils.mixer_pool import (
+    ENDPOINT_PATHS,
+    MIXPANEL_MAX_BATCH,
+    api_host,
+    api_url,
+    raise_for_response,
+)
+from src.app.utils.resilience import DataCenterLane, lane_of
+from src.app.utils.schemas_utils import MixPanelDataCenter
+
+
+class AsyncMixerTransport:
+    """Non-blocking sender speaking the Mixpanel /track, /engage and /groups
+    wire format over a shared httpx connection pool.
+
+    httpx clients are bound to the event loop they are used on, so one
+    client is kept per running loop.
+    """
+
+    def __init__(
+        self,
+        max_connections: int,
+        max_keepalive: int,
+        timeout: float,
+        lanes: Dict[MixPanelDataCenter, DataCenterLane],
+    ):
+        self.lanes = lanes
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+        )
+        self.timeout = timeout
+        self._clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = httpx.AsyncClient(
+                limits=self.limits, timeout=self.timeout
+            )
+        return client
+
+    async def close(self):
+        """Closes the client of the running loop."""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    async def _post(self, url: str, json_message: str) -> bool:
+        body, headers = encode_request(json_message)
+        try:
+            response = await self.client().post(url, content=body, headers=headers)
+        except httpx.HTTPError as e:
+            raise MixpanelException(e) from e
+        return raise_for_response(response)
+
+    async def send(self, data_center: str | None, endpoint: str, json_message: str):
+        """Sends one request to Mixpanel through the lane of the data center.
+
+        Args:
+            data_center (str | None): MixPanelDataCenter value of the Project.
+            endpoint (str): "events", "people", "groups" or "imports".
+            json_message (str): JSON message or batch formatted for the endpoint.
+
+        Raises:
+            MixpanelException: If Mixpanel did not take the message.
+        """
+        if endpoint not in ENDPOINT_PATHS:
+            raise MixpanelException(f'No such endpoint "{endpoint}".')
+        url = api_url(api_host(data_center), endpoint)
+        return await lane_of(self.lanes, data_center).acall(
+            self._post, url, json_message
+        )
+
+    async def send_batches(
+        self, data_center: str | None, endpoint: str, messages: List[str]
+    ) -> List[str | None]:
+        """Sends messages in concurrent requests of 50.
+
+        Returns:
+            List[str | None]: per message, None when sent or the error of its request.
+        """
+        chunks = [
+            messages[start : start + MIXPANEL_MAX_BATCH]
+            for start in range(0, len(messages), MIXPANEL_MAX_BATCH)
+        ]
+        sent = await asyncio.gather(
+            *(
+                self.send(data_center, endpoint, "[{0}]".format(",".join(chunk)))
+                for chunk in chunks
+            ),
+            return_exceptions=True,
+        )
+
+        results: List[str | None] = []
+        for chunk, outcome in zip(chunks, sent):
+            error = str(outcome) if isinstance(outcome, Exception) else None
+            results.extend([error] * len(chunk))
+        return results
@@ -0,0 +1,343 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+from mixpanel import MixpanelException
+
+from src.app.utils.async_transport import AsyncMixerTransport
+from src.app.utils.coalesce import COALESCED_ENDPOINTS, coalesce
+from src.app.utils.dead_letters import DeadLetterStore
+from src.app.utils.metrics import metrics
+from src.app.utils.mixer_pool import (
+    MIXPANEL_ENDPOINTS,
+    MIXPANEL_MAX_BATCH,
+    ConsumerPool,
+)
+from src.app.utils.spool import MixerSpool
+
+logger = logging.getLogger(__name__)
+
+# (mixpanel_key, data_center, endpoint)
+BufferKey = Tuple[str, str | None, str]
+
+
+class MixerBatcher:
+    """Buffers Mixpanel messages per (project, data center, endpoint).
+
+    A buffer is flushed by a background thread once it holds `batch_size`
+    messages or once its oldest message is older than `max_age` seconds.
+    With `coalesce`, people and groups updates of the same profile are
+    merged before a buffer is considered full and before it is flushed.
+    Batches are sent through `consumer_pool`, and the ones that fail
+    delivery go to `dead_letters` when one is given.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        max_age: float,
+        coalesce: bool = False,
+        dead_letters: DeadLetterStore | None = None,
+        consumer_pool: ConsumerPool | None = None,
+    ):
+        self.batch_size = max(1, min(batch_size, MIXPANEL_MAX_BATCH))
+        self.max_age = max_age
+        self.coalesce = coalesce
+        self.dead_letters = dead_letters
+        self.consumer_pool = consumer_pool
+
+        self._buffers: Dict[BufferKey, List[str]] = {}
+        self._born: Dict[BufferKey, float] = {}
+        self._ready: List[Tuple[BufferKey, List[str]]] = []
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def send(self, key: BufferKey, json_message: str):
+        """Add a message to the buffer of its key.
+
+        Args:
+            key (BufferKey): (mixpanel_key, data_center, endpoint)
+            json_message (str): JSON message formatted for the endpoint.
+        """
+        with self._lock:
+            buf = self._buffers.get(key)
+            if buf is None:
+                buf = self._buffers[key] = []
+                self._born[key] = time.monotonic()
+            buf.append(json_message)
+            if len(buf) >= self.batch_size:
+                buf[:] = self.compact(key, buf)
+
+            # full buffers are handed to the flusher straight away.
+            if len(buf) >= self.batch_size:
+                self._ready.append((key, self._buffers.pop(key)))
+                del self._born[key]
+                self.wake()
+
+        self.start()
+
+    def wake(self):
+        """Has the flusher collect the ready batches now."""
+        self._wakeup.set()
+
+    def start(self):
+        """Starts the flusher thread if it is not running."""
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="mixer-batcher", daemon=True
+            )
+            self._thread.start()
+
+    def collect(self, force: bool = False) -> List[Tuple[BufferKey, List[str]]]:
+        """Takes the batches that are due for flushing.
+
+        Args:
+            force (bool, optional): take every buffer regardless of age. Defaults to False.
+
+        Returns:
+            List[Tuple[BufferKey, List[str]]]: batches to deliver.
+        """
+        now = time.monotonic()
+        with self._lock:
+            batches = self._ready
+            self._ready = []
+            for key, born in list(self._born.items()):
+                if force or now - born >= self.max_age:
+                    batches.append((key, self.compact(key, self._buffers.pop(key))))
+                    del self._born[key]
+        return batches
+
+    def compact(self, key: BufferKey, batch: List[str]) -> List[str]:
+        """Coalesces the profile updates of a batch when coalescing is on."""
+        if not self.coalesce or key[2] not in COALESCED_ENDPOINTS:
+            return batch
+        compacted = coalesce(batch)
+        if len(compacted) < len(batch):
+            metrics.incr(
+                "mixer_coalesced_messages", len(batch) - len(compacted), endpoint=key[2]
+            )
+        return compacted
+
+    def flush(self):
+        """Immediately deliver every buffered message."""
+        for key, batch in self.collect(force=True):
+            self._deliver_safely(key, batch)
+
+    def deliver(self, key: BufferKey, batch: List[str]):
+        """Send a batch of messages in one request to Mixpanel.
+
+        Args:
+            key (BufferKey): (mixpanel_key, data_center, endpoint)
+            batch (List[str]): JSON messages.
+        """
+        _, data_center, endpoint = key
+        batch_json = "[{0}]".format(",".join(batch))
+        self.consumer_pool.get(data_center).send(endpoint, batch_json)
+
+    def dead_letter(self, key: BufferKey, batch: List[str], error: Exception):
+        logger.error(
+            "Mixpanel batch of %s messages to %s failed: %s", len(batch), key[2], error
+        )
+        if self.dead_letters is not None:
+            self.dead_letters.add(key[0], key[2], batch, str(error))
+
+    def _deliver_safely(self, key: BufferKey, batch: List[str]):
+        try:
+            self.deliver(key, batch)
+        except Exception as e:
+            self.dead_letter(key, batch, e)
+
+    def _run(self):
+        tick = max(self.max_age / 2, 0.01)
+        while True:
+            self._wakeup.wait(tick)
+            self._wakeup.clear()
+            for key, batch in self.collect():
+                self._deliver_safely(key, batch)
+
+
+class AsyncMixerBatcher(MixerBatcher):
+    """MixerBatcher whose flusher runs an event loop and sends every due batch
+    concurrently with the async transport, at most `concurrency` at a time
+    and `per_project` at a time for one Mixpanel project.
+
+    On flush, the batches waiting or in flight get until the timeout to be
+    delivered; the ones still pending then are dead-lettered.
+    """
+
+    def __init__(
+        self,
+        *args,
+        transport: AsyncMixerTransport,
+        concurrency: int = 100,
+        per_project: int | None = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.transport = transport
+        self.concurrency = max(1, concurrency)
+        self.per_project = max(1, per_project or self.concurrency)
+        # mixpanel key -> batches of the project in flight.
+        self._projects: Dict[str, int] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._woken: asyncio.Event | None = None
+        self._slots: asyncio.Semaphore | None = None
+        # batches collected, waiting for a slot, then the ones in flight.
+        self._waiting: Deque[Tuple[BufferKey, List[str]]] = deque()
+        self._pending: Dict[asyncio.Task, Tuple[BufferKey, List[str]]] = {}
+        self._running = threading.Event()
+
+    def wake(self):
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(self._woken.set)
+
+    def _run(self):
+        asyncio.run(self._arun())
+
+    async def _arun(self):
+        self._woken = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._loop = asyncio.get_running_loop()
+        self._running.set()
+        tick = max(self.max_age / 2, 0.01)
+        while True:
+            self._waiting.extend(self.collect())
+            await self._start_waiting()
+            try:
+                await asyncio.wait_for(self._woken.wait(), tick)
+            except asyncio.TimeoutError:
+                pass
+            self._woken.clear()
+
+    def _next(self) -> Tuple[BufferKey, List[str]] | None:
+        """Takes the first waiting batch whose project has a free slot."""
+        for index, (key, batch) in enumerate(self._waiting):
+            if self._projects.get(key[0], 0) < self.per_project:
+                del self._waiting[index]
+                return key, batch
+        return None
+
+    async def _start_waiting(self, deadline: float | None = None):
+        """Starts delivering the waiting batches as slots free up, until the deadline."""
+        while self._waiting:
+            timeout = None if deadline is None else deadline - time.monotonic()
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout)
+            except asyncio.TimeoutError:
+                return
+            delivery = self._next()
+            if delivery is None:
+                self._slots.release()
+                if not self._pending:
+                    return
+                # every waiting project is at its limit: wait for one of them.
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    return
+                await asyncio.wait(
+                    list(self._pending),
+                    timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                continue
+            key, batch = delivery
+            self._projects[key[0]] = self._projects.get(key[0], 0) + 1
+            task = asyncio.create_task(self._adeliver_safely(key, batch))
+            self._pending[task] = delivery
+            task.add_done_callback(self._delivered)
+
+    def _delivered(self, task: asyncio.Task):
+        key, _ = self._pending.pop(task)
+        count = self._projects.pop(key[0], 1) - 1
+        if count:
+            self._projects[key[0]] = count
+        self._slots.release()
+
+    def flush(self, timeout: float = 10):
+        """Delivers every buffered message and waits for the batches in flight.
+
+        Args:
+            timeout (float, optional): seconds to wait for the deliveries. Defaults to 10.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._running.wait(timeout)
+        loop = self._loop
+        if loop is None or not loop.is_running():
+            super().flush()
+            return
+        asyncio.run_coroutine_threadsafe(self._aflush(timeout), loop).result()
+
+    async def _aflush(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        self._waiting.extend(self.collect(force=True))
+        while self._waiting or self._pending:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            await self._start_waiting(deadline)
+            if self._pending:
+                await asyncio.wait(
+                    list(self._pending),
+                    timeout=max(deadline - time.monotonic(), 0),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+
+        lost = list(self._waiting)
+        self._waiting.clear()
+        for task, delivery in list(self._pending.items()):
+            lost.append(delivery)
+            task.cancel()
+        for key, batch in lost:
+            error = MixpanelException("Mixer stopped before the batch was delivered")
+            await asyncio.to_thread(self.dead_letter, key, batch, error)
+
+    async def adeliver(self, key: BufferKey, batch: List[str]):
+        _, data_center, endpoint = key
+        batch_json = "[{0}]".format(",".join(batch))
+        await self.transport.send(data_center, endpoint, batch_json)
+
+    async def _adeliver_safely(self, key: BufferKey, batch: List[str]):
+        try:
+            await self.adeliver(key, batch)
+        except Exception as e:
+            await asyncio.to_thread(self.dead_letter, key, batch, e)
+
+
+class BatchedConsumer:
+    """Mixpanel consumer handing messages to a MixerBatcher instead of sending them.
+
+    When a spool is given, messages are written to it first and its drainer
+    sends them in batches.
+    """
+
+    def __init__(
+        self,
+        batcher: MixerBatcher,
+        token: str,
+        data_center: str | None,
+        spool: MixerSpool | None = None,
+    ):
+        self.batcher = batcher
+        self.token = token
+        self.data_center = data_center
+        self.spool = spool
+
+    def send(self, endpoint, json_message, api_key=None, api_secret=None):
+        if endpoint not in MIXPANEL_ENDPOINTS:
+            raise MixpanelException(f'No such endpoint "{endpoint}".')
+
+        key = (self.token, self.data_center, endpoint)
+        if self.spool is not None:
+            self.spool.append(key, json_message)
+        else:
+            self.batcher.send(key, json_message)
@@ -0,0 +1,184 @@
+import base64
+import gzip
+import hashlib
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Collection, List
+
+import orjson
+
+from src.app.config import mixer_settings
+from src.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+REDACTED_HEADERS = (b"mixer-key", b"authorization", b"cookie")
+
+
+def redact(value: bytes) -> str:
+    """Stable stand-in for a secret header value.
+
+    The same key always gives the same stand-in, so a capture still tells
+    projects apart without holding their keys.
+    """
+    return "redacted:" + hashlib.sha256(value).hexdigest()[:16]
+
+
+class CaptureWriter:
+    """Appends captured requests to a gzip JSONL file, one request per line.
+
+    Records are handed to a writer thread, so compressing and writing them
+    never blocks the event loop; past `max_pending` waiting records new ones
+    are dropped.
+    """
+
+    def __init__(self, path: str, max_pending: int = 10000):
+        self.path = path
+        self.records = 0
+        self._file = None
+        self._pending: queue.Queue = queue.Queue(max_pending)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def write(self, record: dict):
+        try:
+            self._pending.put_nowait(record)
+        except queue.Full:
+            metrics.incr("mixer_capture_dropped")
+            return
+        self.start()
+
+    def start(self):
+        """Starts the writer thread if it is not running."""
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="mixer-capture", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            record = self._pending.get()
+            if record is None:
+                return
+            try:
+                self._write(record)
+            except Exception as e:
+                metrics.incr("mixer_capture_dropped")
+                logger.error("Captured request was not written: %s", e)
+
+    def _write(self, record: dict):
+        line = orjson.dumps(record) + b"\n"
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = gzip.open(self.path, "ab")
+        self._file.write(line)
+        self.records += 1
+
+    def close(self):
+        """Writes the pending records, then closes the file."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                self._pending.put(None)
+                self._thread.join()
+            self._thread = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class CaptureMiddleware:
+    """ASGI middleware sampling requests to paths into a CaptureWriter.
+
+    Each record keeps the method, path, query, headers, body, response status
+    and the start time and duration of the request. Requests whose body is
+    over max_body are not captured, as they could not be replayed whole.
+    """
+
+    def __init__(
+        self,
+        app,
+        writer: CaptureWriter,
+        paths: Collection[str],
+        sample: float = 1.0,
+        redact_keys: bool = True,
+        max_body: int = 1024 * 1024,
+    ):
+        self.app = app
+        self.writer = writer
+        self.paths = frozenset(paths)
+        self.sample = sample
+        self.redact_keys = redact_keys
+        self.max_body = max_body
+
+    def headers(self, raw: List[tuple]) -> List[list]:
+        headers = []
+        for name, value in raw:
+            name = name.lower()
+            if self.redact_keys and name in REDACTED_HEADERS:
+                headers.append([name.decode("latin-1"), redact(value)])
+            else:
+                headers.append([name.decode("latin-1"), value.decode("latin-1")])
+        return headers
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"] not in self.paths
+            or random.random() >= self.sample
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        body = bytearray()
+        response = {"status": None}
+        oversized = False
+
+        async def capture_receive():
+            nonlocal oversized
+            message = await receive()
+            if message["type"] == "http.request" and not oversized:
+                body.extend(message.get("body", b""))
+                if len(body) > self.max_body:
+                    oversized = True
+                    body.clear()
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            await send(message)
+
+        at = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            if not oversized:
+                self.writer.write(
+                    {
+                        "at": at,
+                        "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "query": scope["query_string"].decode("latin-1"),
+                        "headers": self.headers(scope["headers"]),
+                        "body": base64.b64encode(bytes(body)).decode(),
+                        "status": response["status"],
+                    }
+                )
+
+
+capture_writer = (
+    CaptureWriter(mixer_settings.mixer_capture_path)
+    if mixer_settings.mixer_capture_enabled
+    else None
+)
@@ -0,0 +1,123 @@
+from typing import Callable, Dict, List, Tuple
+
+import orjson
+
+from src.app.utils.encoding import dumps
+
+# profile operation -> merge of the later update into the earlier one.
+MERGES: Dict[str, Callable] = {
+    # last write wins.
+    "$set": lambda earlier, later: {**earlier, **later},
+    # first write wins.
+    "$set_once": lambda earlier, later: {**later, **earlier},
+    "$add": lambda earlier, later: add(earlier, later),
+    "$union": lambda earlier, later: {
+        **earlier,
+        **{k: union(earlier.get(k, []), v) for k, v in later.items()},
+    },
+    "$unset": lambda earlier, later: union(earlier, later),
+}
+
+COALESCED_ENDPOINTS = ("people", "groups")
+
+
+def add(earlier: dict, later: dict) -> dict:
+    merged = dict(earlier)
+    for key, delta in later.items():
+        total = merged.get(key, 0)
+        for value in (total, delta):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise TypeError(f"$add of non-number {value!r}")
+        merged[key] = total + delta
+    return merged
+
+
+def union(earlier: list, later: list) -> list:
+    if not isinstance(earlier, list) or not isinstance(later, list):
+        raise TypeError("$union of non-list")
+    merged = list(earlier)
+    for value in later:
+        if value not in merged:
+            merged.append(value)
+    return merged
+
+
+def profile_of(message: dict) -> Tuple:
+    if "$distinct_id" in message:
+        return ("$distinct_id", message["$distinct_id"])
+    return (message.get("$group_key"), message.get("$group_id"))
+
+
+def operation_of(message: dict) -> str | None:
+    """The single mergeable operation of a profile update, if it has one."""
+    ops = [key for key in message if key in MERGES]
+    if len(ops) != 1:
+        return None
+    if not isinstance(message[ops[0]], (dict, list)):
+        return None
+    return ops[0]
+
+
+def context_of(message: dict, op: str) -> dict:
+    # everything that has to match for two updates to be merged.
+    return {k: v for k, v in message.items() if k not in (op, "$time")}
+
+
+def coalesce(messages: List[str]) -> List[str]:
+    """Merges consecutive updates of the same profile and operation.
+
+    An update is only merged into the latest pending update of its profile,
+    so updates of one profile keep their order; `$set` is last write wins,
+    `$set_once` first write wins, `$add` deltas are summed and `$union`
+    and `$unset` lists are combined. Other operations are left as they are.
+
+    Args:
+        messages (List[str]): JSON people or groups updates, in send order.
+
+    Returns:
+        List[str]: the updates after merging.
+    """
+    merged: List[dict | str] = []
+    # profile -> index in merged of its latest update.
+    latest: Dict[Tuple, int] = {}
+    changed = False
+
+    for raw in messages:
+        try:
+            message = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            merged.append(raw)
+            continue
+        if not isinstance(message, dict):
+            merged.append(raw)
+            continue
+
+        profile = profile_of(message)
+        op = operation_of(message)
+        index = latest.get(profile)
+        if op is not None and index is not None:
+            previous = merged[index]
+            if (
+                isinstance(previous, dict)
+                and op in previous
+                and context_of(previous, op) == context_of(message, op)
+                and type(previous[op]) is type(message[op])
+            ):
+                try:
+                    previous[op] = MERGES[op](previous[op], message[op])
+                except TypeError:
+                    pass
+                else:
+                    if "$time" in message:
+                        previous["$time"] = max(
+                            previous.get("$time", 0), message["$time"]
+                        )
+                    changed = True
+                    continue
+
+        latest[profile] = len(merged)
+        merged.append(message if op is not None else raw)
+
+    if not changed:
+        return messages
+    return [dumps(m) if isinstance(m, dict) else m for m in merged]
@@ -0,0 +1,84 @@
+import logging
+import threading
+from typing import Dict, List
+
+from src.app.config import mixer_settings
+from src.app.utils.metrics import metrics
+from src.projects.project_repository import DeadLetterRepo, dead_letter_repo
+
+logger = logging.getLogger(__name__)
+
+
+class DeadLetterStore:
+    """Keeps Mixpanel messages whose delivery failed, for a later replay.
+
+    Messages are stored one row each with the Project, endpoint, error and
+    the number of delivery attempts, each attempt already retried by the
+    data center lane.
+    """
+
+    def __init__(self, repo: DeadLetterRepo):
+        self.repo = repo
+        self._projects: Dict[str, int | None] = {}
+        self._lock = threading.Lock()
+
+    def project_id(self, mixpanel_key: str) -> int | None:
+        with self._lock:
+            if mixpanel_key in self._projects:
+                return self._projects[mixpanel_key]
+        project_id = self.repo.get_project_id(mixpanel_key)
+        if project_id is not None:
+            with self._lock:
+                self._projects[mixpanel_key] = project_id
+        return project_id
+
+    def add(
+        self,
+        mixpanel_key: str,
+        endpoint: str,
+        messages: List[str],
+        error: str,
+        attempts: int = 1,
+    ) -> int:
+        """Stores messages that could not be delivered.
+
+        Args:
+            mixpanel_key (str): Mixpanel key of the Project.
+            endpoint (str): Mixpanel endpoint of the messages.
+            messages (List[str]): JSON messages.
+            error (str): delivery error.
+            attempts (int, optional): deliveries tried. Defaults to 1.
+
+        Returns:
+            int: number of messages stored.
+        """
+        try:
+            project_id = self.project_id(mixpanel_key)
+            if project_id is None:
+                raise LookupError("no Project uses this Mixpanel key")
+            self.repo.create_dead_letters(
+                [
+                    {
+                        "project_id": project_id,
+                        "endpoint": endpoint,
+                        "message": message,
+                        "error": error,
+                        "attempts": attempts,
+                    }
+                    for message in messages
+                ]
+            )
+        except Exception as e:
+            metrics.incr("mixer_dead_letters_lost", len(messages), endpoint=endpoint)
+            logger.error(
+                "%s failed messages to %s were lost: %s", len(messages), endpoint, e
+            )
+            return 0
+
+        metrics.incr("mixer_dead_letters", len(messages), endpoint=endpoint)
+        return len(messages)
+
+
+dead_letter_store = None
+if mixer_settings.mixer_dead_letter_enabled:
+    dead_letter_store = DeadLetterStore(dead_letter_repo)
@@ -0,0 +1,157 @@
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Hashable, Set, Tuple
+
+from src.app.config import mixer_settings
+from src.app.utils.metrics import metrics
+
+# (bucket start, scope -> ids, approximate bytes)
+Bucket = Tuple[float, Dict[Hashable, Set[str]], int]
+
+
+class RecentIds:
+    """Time-bucketed index of the `$insert_id`s seen per project.
+
+    Ids are kept for `window` seconds in `buckets` rotating buckets, and the
+    oldest bucket is dropped early once more than `max_ids` ids are held.
+    """
+
+    def __init__(self, window: float, buckets: int, max_ids: int):
+        self.window = window
+        self.span = window / max(1, buckets)
+        self.max_ids = max_ids
+        self.ids = 0
+        self.bytes = 0
+        self._buckets: Deque[Bucket] = deque()
+        self._lock = threading.Lock()
+
+    def _rotate(self, now: float):
+        while self._buckets and (
+            now - self._buckets[0][0] >= self.window or self.ids > self.max_ids
+        ):
+            _, scopes, size = self._buckets.popleft()
+            self.ids -= sum(len(ids) for ids in scopes.values())
+            self.bytes -= size
+        if not self._buckets or now - self._buckets[-1][0] >= self.span:
+            scopes = {}
+            self._buckets.append((now, scopes, sys.getsizeof(scopes)))
+            self.bytes += sys.getsizeof(scopes)
+
+    def seen(self, scope: Hashable, insert_id: str) -> bool:
+        """Records an id and tells whether it was already seen in the window.
+
+        Args:
+            scope (Hashable): Project the id belongs to, e.g. its mixpanel key.
+            insert_id (str): `$insert_id` of the event.
+
+        Returns:
+            bool: True for a repeat.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._rotate(now)
+            for _, scopes, _ in self._buckets:
+                if insert_id in scopes.get(scope, ()):
+                    metrics.incr("mixer_dedup_events", outcome="duplicate")
+                    return True
+
+            start, scopes, size = self._buckets[-1]
+            # the id, and what the set and dict holding it grew by.
+            before = sys.getsizeof(scopes)
+            ids = scopes.get(scope)
+            if ids is None:
+                ids = scopes[scope] = set()
+                before -= sys.getsizeof(ids)
+            before += sys.getsizeof(ids)
+            ids.add(insert_id)
+            added = (
+                sys.getsizeof(insert_id)
+                + sys.getsizeof(scopes)
+                + sys.getsizeof(ids)
+                - before
+            )
+            self._buckets[-1] = (start, scopes, size + added)
+            self.ids += 1
+            self.bytes += added
+        metrics.incr("mixer_dedup_events", outcome="unique")
+        return False
+
+    def forget(self, scope: Hashable, insert_id: str):
+        """Drops an id, so it is not taken for a repeat anymore.
+
+        Args:
+            scope (Hashable): Project the id belongs to.
+            insert_id (str): `$insert_id` of the event.
+        """
+        with self._lock:
+            for i, (start, scopes, size) in enumerate(self._buckets):
+                ids = scopes.get(scope)
+                if ids is not None and insert_id in ids:
+                    ids.discard(insert_id)
+                    removed = sys.getsizeof(insert_id)
+                    self._buckets[i] = (start, scopes, size - removed)
+                    self.ids -= 1
+                    self.bytes -= removed
+                    return
+
+
+def is_repeat(scope: Hashable, properties: dict, insert_id: str | None = None) -> bool:
+    """Gives an event its `$insert_id` and tells whether it is a repeat.
+
+    An id the client sent, in the properties or as insert_id, is kept and
+    checked against recent_ids; otherwise a new one is generated.
+
+    Args:
+        scope (Hashable): Project of the event, e.g. its mixpanel key.
+        properties (dict): event properties, updated in place.
+        insert_id (str | None, optional): id sent next to the properties. Defaults to None.
+
+    Returns:
+        bool: True when the event was already forwarded.
+    """
+    supplied = properties.get("$insert_id") or insert_id
+    if supplied is None:
+        properties["$insert_id"] = uuid.uuid4().hex
+        return False
+
+    properties["$insert_id"] = supplied
+    if not mixer_settings.mixer_dedup_enabled:
+        return False
+    return recent_ids.seen(scope, str(supplied))
+
+
+def forget_repeat(scope: Hashable, properties: dict):
+    """Forgets the `$insert_id` of an event that was not forwarded, so a
+    retry of it is not answered as a repeat.
+
+    Args:
+        scope (Hashable): Project of the event, e.g. its mixpanel key.
+        properties (dict): event properties given to is_repeat.
+    """
+    insert_id = properties.get("$insert_id")
+    if insert_id is not None and mixer_settings.mixer_dedup_enabled:
+        recent_ids.forget(scope, str(insert_id))
+
+
+@contextmanager
+def forget_on_failure(scope: Hashable, properties: dict):
+    """Forgets the `$insert_id` of an event when the block forwarding it fails."""
+    try:
+        yield
+    except BaseException:
+        forget_repeat(scope, properties)
+        raise
+
+
+recent_ids = RecentIds(
+    mixer_settings.mixer_dedup_window,
+    mixer_settings.mixer_dedup_buckets,
+    mixer_settings.mixer_dedup_max_ids,
+)
+
+metrics.register("mixer_dedup_ids", lambda: recent_ids.ids)
+metrics.register("mixer_dedup_bytes", lambda: recent_ids.bytes)
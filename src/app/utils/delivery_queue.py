@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryQueue:
+    """In-process asyncio queue of Mixer calls run by background workers.
+
+    Requests accepted with `Prefer: respond-async` are answered before the
+    call to Mixpanel is made; the workers make it afterwards.
+    """
+
+    def __init__(self, workers: int, maxsize: int):
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue | None = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """Creates the queue and its workers on the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10):
+        """Waits for queued calls to finish, then stops the workers.
+
+        Args:
+            timeout (float, optional): seconds to wait for the queue to drain. Defaults to 10.
+        """
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(
+                "Delivery queue stopped with %s calls pending", self._queue.qsize()
+            )
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._queue = None
+        self._loop = None
+
+    def _put(self, item) -> bool:
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def submit(self, fn: Callable, *args) -> bool:
+        """Queues fn(*args) for delivery. Safe to call from threadpool workers.
+
+        Args:
+            fn (Callable): Mixer method or coroutine function.
+
+        Returns:
+            bool: False when the queue is not running or is full.
+        """
+        if self._loop is None:
+            return False
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            return self._put((fn, args))
+
+        future = asyncio.run_coroutine_threadsafe(self._submit((fn, args)), self._loop)
+        return future.result()
+
+    async def _submit(self, item) -> bool:
+        return self._put(item)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            fn, args = await self._queue.get()
+            try:
+                if asyncio.iscoroutinefunction(fn):
+                    await fn(*args)
+                else:
+                    await loop.run_in_executor(None, fn, *args)
+            except Exception as e:
+                logger.error("Queued Mixer call %s failed: %s", fn.__name__, e)
+            finally:
+                self._queue.task_done()
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue else 0
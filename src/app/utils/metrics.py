@@ -0,0 +1,59 @@
+import threading
+from typing import Callable, Dict, Tuple
+
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: dict) -> MetricKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    """In-process counters and gauges, exposed by the /metrics/ route."""
+
+    def __init__(self):
+        self._counters: Dict[MetricKey, float] = {}
+        self._gauges: Dict[MetricKey, float] = {}
+        self._callbacks: Dict[MetricKey, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: float = 1, **labels):
+        """Adds value to a counter."""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name: str, value: float, **labels):
+        """Sets a gauge to value."""
+        self._gauges[_key(name, labels)] = value
+
+    def register(self, name: str, callback: Callable[[], float], **labels):
+        """Registers a gauge read from callback when metrics are collected."""
+        self._callbacks[_key(name, labels)] = callback
+
+    def get(self, name: str, **labels) -> float:
+        key = _key(name, labels)
+        if key in self._callbacks:
+            return self._callbacks[key]()
+        return self._counters.get(key, self._gauges.get(key, 0))
+
+    def snapshot(self) -> Dict[str, list]:
+        """All metrics grouped by name.
+
+        Returns:
+            Dict[str, list]: name -> [{"labels": {...}, "value": ...}]
+        """
+        with self._lock:
+            values = {**self._counters, **self._gauges}
+        for key, callback in list(self._callbacks.items()):
+            values[key] = callback()
+
+        snapshot: Dict[str, list] = {}
+        for (name, labels), value in sorted(values.items()):
+            snapshot.setdefault(name, []).append(
+                {"labels": dict(labels), "value": value}
+            )
+        return snapshot
+
+
+metrics = Metrics()
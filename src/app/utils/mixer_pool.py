@@ -0,0 +1,199 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+from mixpanel import Consumer, Mixpanel, MixpanelException
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+from src.app.config import mixer_settings
+from src.app.utils.encoding import encode_request
+from src.app.utils.resilience import (
+    DataCenterLane,
+    MixpanelRejected,
+    MixpanelThrottled,
+    lane_of,
+)
+from src.app.utils.schemas_utils import MixPanelDataCenter
+
+# Mixpanel accepts at most 50 messages per request.
+MIXPANEL_MAX_BATCH = 50
+
+MIXPANEL_ENDPOINTS = ("events", "people", "groups", "imports")
+
+ENDPOINT_PATHS = {
+    "events": "track",
+    "people": "engage",
+    "groups": "groups",
+    "imports": "import",
+}
+
+
+def api_host(data_center: str | None) -> str:
+    """Mixpanel API host for a Project data center.
+
+    Args:
+        data_center (str | None): MixPanelDataCenter value of the Project.
+
+    Returns:
+        str: API host.
+    """
+    if data_center == MixPanelDataCenter.eu.value:
+        return mixer_settings.mixer_eu_api_host
+    return mixer_settings.mixer_api_host
+
+
+def api_url(api_host: str, endpoint: str) -> str:
+    """URL of a Mixpanel endpoint on an API host, with MIXER_API_SCHEME."""
+    return f"{mixer_settings.mixer_api_scheme}://{api_host}/{ENDPOINT_PATHS[endpoint]}"
+
+
+def raise_for_response(response) -> bool:
+    """Reads a Mixpanel answer of a requests or httpx response.
+
+    Raises:
+        MixpanelThrottled: If Mixpanel is throttling the project; worth retrying.
+        MixpanelException: If Mixpanel is failing; worth retrying.
+        MixpanelRejected: If Mixpanel refused the message itself.
+    """
+    if response.status_code == 429:
+        raise MixpanelThrottled(f"Mixpanel answered 429: {response.text}")
+    if response.status_code >= 500:
+        raise MixpanelException(
+            f"Mixpanel answered {response.status_code}: {response.text}"
+        )
+    try:
+        response_dict = response.json()
+    except ValueError:
+        raise MixpanelException(
+            f"Cannot interpret Mixpanel server response: {response.text}"
+        )
+    if response_dict.get("status") != 1:
+        # Mixpanel answered with an error for the message itself.
+        raise MixpanelRejected(f"Mixpanel error: {response_dict.get('error')}")
+    return True
+
+
+class PooledConsumer(Consumer):
+    """Mixpanel Consumer whose session keeps a sized keep-alive connection pool.
+
+    Requests go through the DataCenterLane of the host, which owns retries,
+    the circuit breaker and the concurrency limit. Bodies are built with
+    encode_request, so large ones are gzipped.
+    """
+
+    def __init__(
+        self,
+        api_host: str,
+        pool_maxsize: int,
+        lane: DataCenterLane | None = None,
+        **kwargs,
+    ):
+        kwargs.setdefault("request_timeout", mixer_settings.mixer_request_timeout)
+        kwargs.setdefault("retry_limit", 0)
+        kwargs.setdefault("events_url", api_url(api_host, "events"))
+        kwargs.setdefault("people_url", api_url(api_host, "people"))
+        kwargs.setdefault("groups_url", api_url(api_host, "groups"))
+        kwargs.setdefault("import_url", api_url(api_host, "imports"))
+        super().__init__(api_host=api_host, **kwargs)
+        self.lane = lane
+        # reuse the retry policy of the default adapter on the sized pool.
+        retries = self._session.get_adapter(f"https://{api_host}").max_retries
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_maxsize,
+            max_retries=retries,
+        )
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def send(self, endpoint, json_message, api_key=None, api_secret=None):
+        if self.lane is None:
+            return super().send(endpoint, json_message, api_key, api_secret)
+        return self.lane.call(super().send, endpoint, json_message, api_key, api_secret)
+
+    def _write_request(self, request_url, json_message, api_key=None, api_secret=None):
+        if isinstance(api_key, tuple):
+            api_key, api_secret = api_key
+        body, headers = encode_request(json_message, api_key)
+
+        basic_auth = None
+        if api_secret is not None:
+            basic_auth = HTTPBasicAuth(api_secret, "")
+
+        try:
+            response = self._session.post(
+                request_url,
+                data=body,
+                headers=headers,
+                auth=basic_auth,
+                timeout=self._request_timeout,
+                verify=self._verify_cert,
+            )
+        except Exception as e:
+            raise MixpanelException(e) from e
+        return raise_for_response(response)
+
+
+class ConsumerPool:
+    """One shared PooledConsumer per Mixpanel API host, sending through lanes."""
+
+    def __init__(self, pool_maxsize: int, lanes: Dict | None = None):
+        self.pool_maxsize = pool_maxsize
+        self.lanes = lanes
+        self._consumers: Dict[str, PooledConsumer] = {}
+        self._lock = threading.Lock()
+
+    def get(self, data_center: str | None) -> PooledConsumer:
+        """Consumer of the API host serving a data center."""
+        host = api_host(data_center)
+        consumer = self._consumers.get(host)
+        if consumer is None:
+            with self._lock:
+                consumer = self._consumers.get(host)
+                if consumer is None:
+                    consumer = self._consumers[host] = PooledConsumer(
+                        host,
+                        self.pool_maxsize,
+                        lane_of(self.lanes, data_center) if self.lanes else None,
+                    )
+        return consumer
+
+
+class MixerRegistry:
+    """Bounded LRU of Mixpanel clients keyed by (mixpanel_key, data_center)."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(1, maxsize)
+        self._clients: OrderedDict[Hashable, Mixpanel] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, factory: Callable[[], Mixpanel]) -> Mixpanel:
+        """Returns the cached client of a key, building it with factory on a miss.
+
+        Args:
+            key (Hashable): (mixpanel_key, data_center)
+            factory (Callable[[], Mixpanel]): builds the client.
+
+        Returns:
+            Mixpanel: client.
+        """
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+
+        client = factory()
+        with self._lock:
+            self._clients[key] = client
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.maxsize:
+                self._clients.popitem(last=False)
+        return client
+
+    def __len__(self):
+        return len(self._clients)
+
+
+mixer_clients = MixerRegistry(mixer_settings.mixer_client_cache_size)
@@ -1,34 +1,110 @@
 from datetime import datetime
+from typing import Dict, List
 
-from mixpanel import Consumer, Mixpanel
+from mixpanel import Mixpanel, MixpanelException
 
+from src.app.config import mixer_settings
+from src.app.utils.batcher import BatchedConsumer
+from src.app.utils.encoding import FastSerializer
+from src.app.utils.mixer_pool import MIXPANEL_MAX_BATCH, mixer_clients
 from src.app.utils.schemas_utils import MixPanelDataCenter
+from src.app.utils.tiers import DeliveryTier, tier
+
+
+class CapturingConsumer:
+    """Mixpanel consumer keeping messages per endpoint so they can be sent together."""
+
+    def __init__(self):
+        self.messages: Dict[str, List[str]] = {}
+
+    def send(self, endpoint, json_message, api_key=None, api_secret=None):
+        self.messages.setdefault(endpoint, []).append(json_message)
+
+
+def send_batches(
+    data_center: str | None, endpoint: str, messages: List[str], premium: bool = False
+) -> List[str | None]:
+    """Sends messages to Mixpanel in requests of 50 over the pooled connection.
+
+    Args:
+        data_center (str | None): MixPanelDataCenter value of the Project.
+        endpoint (str): Mixpanel endpoint of the messages.
+        messages (List[str]): JSON messages.
+        premium (bool, optional): send on the premium delivery tier. Defaults to False.
+
+    Returns:
+        List[str | None]: per message, None when sent or the error of its request.
+    """
+    consumer = tier(premium).consumer_pool.get(data_center)
+    results: List[str | None] = []
+    for start in range(0, len(messages), MIXPANEL_MAX_BATCH):
+        chunk = messages[start : start + MIXPANEL_MAX_BATCH]
+        error = None
+        try:
+            consumer.send(endpoint, "[{0}]".format(",".join(chunk)))
+        except MixpanelException as e:
+            error = str(e)
+        results.extend([error] * len(chunk))
+
+    return results
 
 
 class Mixer:
-    def __init__(
-        self,
-        token,
-        data_center,
-    ):
+    def __init__(self, token, data_center, consumer=None, premium=False):
         self.token: str = token
         self.data_center: str | None = data_center
+        # overrides the pooled client, e.g. with a CapturingConsumer.
+        self.consumer = consumer
+        # premium projects are delivered by their own workers and pools.
+        self.premium: bool = premium
+
+    @property
+    def tier(self) -> DeliveryTier:
+        return tier(self.premium)
+
+    def gravity(self) -> Mixpanel:
+        if self.consumer is not None:
+            return Mixpanel(
+                self.token, consumer=self.consumer, serializer=FastSerializer
+            )
+
+        # clients are reused across requests for the same project.
+        return mixer_clients.get(
+            (self.token, self.data_center, self.premium), self.core
+        )
 
-    def gravity(self):
-        if self.data_center:
-            if self.data_center == MixPanelDataCenter.eu.value:
-                return self.core_eu()
-            else:
-                return self.core_()
+    def core(self) -> Mixpanel:
+        # buffered messages are sent in batches by the Mixer batcher.
+        if mixer_settings.mixer_batch_enabled:
+            return self.core_batched()
+
+        if self.data_center == MixPanelDataCenter.eu.value:
+            return self.core_eu()
+        return self.core_()
 
     def core_(self) -> Mixpanel:
-        core = Mixpanel(self.token)
+        core = Mixpanel(
+            self.token,
+            consumer=self.tier.consumer_pool.get(self.data_center),
+            serializer=FastSerializer,
+        )
         return core
 
+    def core_batched(self) -> Mixpanel:
+        core_batched = Mixpanel(
+            self.token,
+            consumer=BatchedConsumer(
+                self.tier.batcher, self.token, self.data_center, self.tier.spool
+            ),
+            serializer=FastSerializer,
+        )
+        return core_batched
+
     def core_eu(self) -> Mixpanel:
         core_eu = Mixpanel(
             self.token,
-            consumer=Consumer(api_host="api-eu.mixpanel.com"),
+            consumer=self.tier.consumer_pool.get(MixPanelDataCenter.eu.value),
+            serializer=FastSerializer,
         )
         return core_eu
 
@@ -0,0 +1,46 @@
+from typing import AsyncIterable, AsyncIterator, Tuple
+
+
+async def iter_lines(
+    chunks: AsyncIterable[bytes], max_line_bytes: int
+) -> AsyncIterator[Tuple[int, bytes | None]]:
+    """Splits a streamed body into lines as the chunks arrive.
+
+    Only the line being read is held in memory. A line longer than
+    max_line_bytes is skipped up to its newline and given as None.
+
+    Args:
+        chunks (AsyncIterable[bytes]): body chunks, e.g. Request.stream().
+        max_line_bytes (int): longest line kept.
+
+    Yields:
+        Tuple[int, bytes | None]: line number from 1 and the line, blank lines left out.
+    """
+    lineno = 0
+    pending = b""
+    too_long = False
+
+    async for chunk in chunks:
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            if end == -1:
+                if not too_long:
+                    pending += chunk[start:]
+                    if len(pending) > max_line_bytes:
+                        pending, too_long = b"", True
+                break
+
+            lineno += 1
+            line = b"" if too_long else pending + chunk[start:end]
+            if too_long or len(line) > max_line_bytes:
+                yield lineno, None
+            elif line.strip():
+                yield lineno, line
+            pending, too_long = b"", False
+            start = end + 1
+
+    if too_long:
+        yield lineno + 1, None
+    elif pending.strip():
+        yield lineno + 1, pending
@@ -0,0 +1,265 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import redis
+
+from src.app.config import mixer_settings
+from src.app.utils.metrics import metrics
+from src.app.utils.rate_limit import RateDecision, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+class Lease:
+    """Calls of a project this worker may make without asking the limiter."""
+
+    def __init__(self, lease_id: str, units: int, expires: float):
+        self.lease_id = lease_id
+        self.units = units
+        self.used = 0
+        self.expires = expires
+
+    def left(self) -> int:
+        return self.units - self.used
+
+
+class ProjectQuota:
+    def __init__(self):
+        self.leases: List[Lease] = []
+        # refusals are cached until denied_until; retry_at is when the
+        # limiter expects a call to leave the window.
+        self.denied_until = 0.0
+        self.retry_at = 0.0
+        self.renewing = False
+        # limit and burst of the project's plan, for renewing in the background.
+        self.limit: int | None = None
+        self.burst: int | None = None
+        # one cold lease at a time per project.
+        self.cold = threading.Lock()
+
+
+class QuotaLeases:
+    """Rate limit decisions made locally from leases on the shared limiter.
+
+    A worker leases `share` of the calls a project has left, at most
+    `max_units`, and spends them without network calls. Once a lease is
+    down to `low_water` of its units, the next one is taken in the
+    background. After `ttl` seconds a lease expires and its unspent calls
+    are given back.
+
+    The limit itself is never overshot, as leased calls are counted by the
+    limiter when leased. In exchange each worker may hold back up to
+    `max_units` calls from the others, and a call is counted in the window
+    up to `ttl` seconds before it is made. A refusal is cached for at most
+    `ttl` seconds, as calls other workers leased may be given back by then.
+    """
+
+    def __init__(
+        self,
+        limiter,
+        share: float,
+        max_units: int,
+        ttl: float,
+        low_water: float = 0.2,
+    ):
+        self.limiter = limiter
+        self.share = share
+        self.max_units = max(1, max_units)
+        self.ttl = ttl
+        self.low_water = low_water
+
+        self._projects: Dict[int, ProjectQuota] = {}
+        self._lock = threading.Lock()
+        self._renewer = ThreadPoolExecutor(1, thread_name_prefix="quota-lease")
+        self._reaper: threading.Thread | None = None
+
+    def quota(self, project_id: int) -> ProjectQuota:
+        with self._lock:
+            quota = self._projects.get(project_id)
+            if quota is None:
+                quota = self._projects[project_id] = ProjectQuota()
+            return quota
+
+    def _spend(
+        self, quota: ProjectQuota, now: float, cost: int
+    ) -> Tuple[RateDecision, bool] | None:
+        """Spends `cost` leased calls, or tells when the project is known to be
+        over its limit, and whether to lease more. None when the worker holds
+        too few calls to decide with."""
+        with self._lock:
+            live = [lease for lease in quota.leases if lease.expires > now]
+            left = sum(lease.left() for lease in live)
+            if left >= cost:
+                for lease in live:
+                    spent = min(cost, lease.left())
+                    lease.used += spent
+                    cost -= spent
+                left = sum(lease.left() for lease in live)
+                renew = not quota.renewing and left <= live[-1].units * self.low_water
+                if renew:
+                    quota.renewing = True
+                used = sum(lease.used for lease in live)
+                return RateDecision(True, used, 0.0), renew
+            if quota.denied_until > now:
+                wait = max(quota.retry_at, quota.denied_until) - now
+                return (
+                    RateDecision(False, quota.limit or self.limiter.limit, wait),
+                    False,
+                )
+        return None
+
+    def hit(
+        self,
+        project_id: int,
+        limit: int | None = None,
+        cost: int = 1,
+        burst: int | None = None,
+    ) -> RateDecision:
+        """Counts a call of a project against its leases.
+
+        Only a worker holding too few leased calls for the project, and not
+        knowing it to be over its limit, asks the limiter.
+
+        Args:
+            project_id (int): Project id.
+            limit (int | None, optional): calls allowed in the window. Defaults to the limiter's.
+            cost (int, optional): units of the limit the call spends. Defaults to 1.
+            burst (int | None, optional): most units in a burst window. Defaults to the limiter's.
+
+        Returns:
+            RateDecision: whether the call is allowed.
+        """
+        self.start()
+        quota = self.quota(project_id)
+        quota.limit, quota.burst = limit, burst
+        spent = self._spend(quota, time.monotonic(), cost)
+        if spent is None:
+            with quota.cold:
+                spent = self._spend(quota, time.monotonic(), cost)
+                # calls on the hot path may spend the new lease first, or a
+                # short refusal be over already: lease again a few times.
+                for _ in range(3):
+                    if spent is not None:
+                        break
+                    metrics.incr("mixer_quota_leases", outcome="cold")
+                    self.renew(project_id, cost)
+                    spent = self._spend(quota, time.monotonic(), cost)
+            if spent is None:
+                metrics.incr("mixer_quota_leases", outcome="contended")
+                wait = max(quota.retry_at - time.monotonic(), 1.0)
+                return RateDecision(False, limit or self.limiter.limit, wait)
+
+        decision, renew = spent
+        if renew:
+            self._renewer.submit(self.renew, project_id)
+        return decision
+
+    def renew(self, project_id: int, cost: int = 1):
+        """Leases more calls of a project from the limiter, at least `cost`."""
+        quota = self.quota(project_id)
+        lease_id = uuid.uuid4().hex
+        with self._lock:
+            # calls still held count towards a call costing more than one.
+            held = sum(
+                lease.left()
+                for lease in quota.leases
+                if lease.expires > time.monotonic()
+            )
+        try:
+            units, wait = self.limiter.lease(
+                project_id,
+                lease_id,
+                self.max_units,
+                self.share,
+                limit=quota.limit,
+                cost=max(1, cost - held),
+                burst=quota.burst,
+            )
+        except redis.RedisError as e:
+            # without the limiter, calls go through on a lease that is not
+            # recorded anywhere, and the limiter is asked again once it expires.
+            metrics.incr("mixer_quota_leases", outcome="error")
+            logger.error("Quota lease failed, not throttling: %s", e)
+            units, wait = max(self.max_units, cost), 0.0
+            lease_id = None
+        finally:
+            quota.renewing = False
+
+        now = time.monotonic()
+        with self._lock:
+            if units:
+                quota.leases.append(Lease(lease_id, units, now + self.ttl))
+                metrics.incr("mixer_quota_leases", outcome="leased")
+            else:
+                quota.retry_at = now + wait
+                quota.denied_until = now + min(wait, self.ttl)
+                metrics.incr("mixer_quota_leases", outcome="denied")
+
+    def release_expired(self, force: bool = False):
+        """Gives back the unspent calls of expired leases."""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for project_id, quota in list(self._projects.items()):
+                for lease in list(quota.leases):
+                    if force or lease.expires <= now or not lease.left():
+                        quota.leases.remove(lease)
+                        expired.append((project_id, lease))
+                if not quota.leases and quota.denied_until <= now:
+                    del self._projects[project_id]
+
+        for project_id, lease in expired:
+            if lease.lease_id is None:
+                continue
+            try:
+                self.limiter.release(
+                    project_id, lease.lease_id, lease.used, lease.units
+                )
+            except redis.RedisError as e:
+                logger.error("Quota lease was not given back: %s", e)
+
+    def start(self):
+        """Starts the thread giving back expired leases if it is not running."""
+        if self._reaper and self._reaper.is_alive():
+            return
+        with self._lock:
+            if self._reaper and self._reaper.is_alive():
+                return
+            self._reaper = threading.Thread(
+                target=self._run, name="quota-lease-reaper", daemon=True
+            )
+            self._reaper.start()
+
+    def _run(self):
+        while True:
+            time.sleep(max(self.ttl / 4, 0.01))
+            self.release_expired()
+
+    def close(self):
+        """Gives back every lease, e.g. when the worker stops."""
+        self.release_expired(force=True)
+
+    def held(self) -> int:
+        """Leased calls not spent yet."""
+        with self._lock:
+            return sum(
+                lease.left()
+                for quota in self._projects.values()
+                for lease in quota.leases
+            )
+
+
+quota_leases = None
+if mixer_settings.mixer_quota_lease_enabled and rate_limiter is not None:
+    quota_leases = QuotaLeases(
+        rate_limiter,
+        mixer_settings.mixer_quota_lease_share,
+        mixer_settings.mixer_quota_lease_max,
+        mixer_settings.mixer_quota_lease_ttl,
+        mixer_settings.mixer_quota_lease_low_water,
+    )
+    metrics.register("mixer_quota_leased_calls", quota_leases.held)
@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, NamedTuple
+
+import redis
+
+from src.app.config import mixer_settings
+from src.app.utils.metrics import metrics
+from src.app.utils.rate_limit import RedisRateLimiter, rate_limiter
+from src.projects.project_repository import QuotaPlanRepo, quota_plan_repo
+
+logger = logging.getLogger(__name__)
+
+# bumped by tools/quota_plans.py whenever a plan or an assignment changes.
+VERSION_KEY = "mixer:quota-plans:version"
+
+
+class QuotaLimit(NamedTuple):
+    hourly_limit: int
+    # most units in a burst window, 0 for no burst limit.
+    burst: int
+    # units an operation spends, by operation name of MIXER_OPERATIONS.
+    weights: Dict[str, int]
+
+    def cost(self, operation: str) -> int:
+        return self.weights.get(operation, 1)
+
+
+class QuotaPlans:
+    """Quota plans of projects, cached in memory.
+
+    Plans and the organizations assigned one are loaded together and kept
+    for `ttl` seconds. Past that they keep answering while they are reloaded
+    in the background, so only the first lookup waits on the DB. A plan
+    assigned to the project wins over the one of its organization, and
+    projects without either get `default`.
+
+    With `versions`, a Redis client, the version key bumped by `changed` is
+    checked every `check_interval` seconds, so changes are picked up within
+    that time rather than the ttl.
+    """
+
+    def __init__(
+        self,
+        repo: QuotaPlanRepo,
+        default: QuotaLimit,
+        ttl: float,
+        versions: redis.Redis | None = None,
+        check_interval: float = 2.0,
+    ):
+        self.repo = repo
+        self.default = default
+        self.ttl = ttl
+        self.versions = versions
+        self.check_interval = check_interval
+
+        self._plans: Dict[int, QuotaLimit] = {}
+        self._org_plans: Dict[int, int] = {}
+        self._version: bytes | None = None
+        self._loaded_at: float | None = None
+        self._checked_at = 0.0
+        self._reloading = False
+        self._lock = threading.Lock()
+        self._loader = ThreadPoolExecutor(1, thread_name_prefix="quota-plans")
+
+    def load(self):
+        """Reads every plan and plan assignment of organizations."""
+        try:
+            # read first, so a change made while loading is seen by the next check.
+            version = self.version()
+        except redis.RedisError as e:
+            # checked again, and the plans reloaded, once Redis is back.
+            version = None
+            logger.error("Quota plan version was not read: %s", e)
+        try:
+            plans = {
+                plan_id: QuotaLimit(hourly_limit, burst, dict(weights or {}))
+                for plan_id, _, hourly_limit, burst, weights in self.repo.get_plans()
+            }
+            org_plans = self.repo.get_org_plans()
+        except Exception as e:
+            # the plans loaded last keep answering until the next reload.
+            metrics.incr("mixer_quota_plan_loads", outcome="error")
+            logger.error("Quota plans were not reloaded: %s", e)
+        else:
+            metrics.incr("mixer_quota_plan_loads", outcome="loaded")
+            self._plans, self._org_plans = plans, org_plans
+            self._version = version
+        finally:
+            with self._lock:
+                self._loaded_at = time.monotonic()
+                self._reloading = False
+
+    def version(self) -> bytes | None:
+        """Version of the plans in Redis, None without Redis."""
+        if self.versions is None:
+            return None
+        return self.versions.get(VERSION_KEY)
+
+    def changed(self) -> bool:
+        """Tells every worker the plans changed, so they reload them.
+
+        Returns:
+            bool: False without Redis, when workers wait for the ttl instead.
+        """
+        if self.versions is None:
+            return False
+        self.versions.incr(VERSION_KEY)
+        return True
+
+    def check_version(self):
+        """Reloads the plans when their version moved since the last load."""
+        try:
+            version = self.version()
+        except redis.RedisError as e:
+            metrics.incr("mixer_quota_plan_loads", outcome="error")
+            logger.error("Quota plan version was not checked: %s", e)
+            return
+        if version != self._version:
+            self.invalidate()
+
+    def invalidate(self):
+        """Reloads the plans now, in the background."""
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        self._loader.submit(self.load)
+
+    def plan_of(self, project) -> QuotaLimit:
+        """Quota plan of a Project.
+
+        Args:
+            project (Project): Project with its quota_plan_id and org_id.
+
+        Returns:
+            QuotaLimit: limit, burst and weights of the Project.
+        """
+        if self._loaded_at is None:
+            with self._lock:
+                first = self._loaded_at is None and not self._reloading
+                if first:
+                    self._reloading = True
+            if first:
+                self.load()
+        elif time.monotonic() - self._loaded_at > self.ttl:
+            self.invalidate()
+        elif self.versions is not None:
+            now = time.monotonic()
+            with self._lock:
+                check = now - self._checked_at > self.check_interval
+                if check:
+                    self._checked_at = now
+            if check:
+                self._loader.submit(self.check_version)
+
+        plan_id = project.quota_plan_id or self._org_plans.get(project.org_id)
+        return self._plans.get(plan_id, self.default)
+
+
+quota_plans = QuotaPlans(
+    quota_plan_repo,
+    QuotaLimit(
+        mixer_settings.mixer_freemium_hourly_limit,
+        mixer_settings.mixer_freemium_burst,
+        {},
+    ),
+    mixer_settings.mixer_quota_plan_ttl,
+    # the Redis of the rate limit carries the version of the plans.
+    rate_limiter.client if isinstance(rate_limiter, RedisRateLimiter) else None,
+    mixer_settings.mixer_quota_plan_check_interval,
+)
@@ -0,0 +1,370 @@
+import bisect
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Tuple
+
+import redis
+
+from src.app.config import mixer_settings
+from src.app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Sliding window log of one project: trims the calls older than the window,
+# then works out whether `cost` more calls fit under the limit and the burst.
+# KEYS[1] project key; ARGV: now (ms), window (ms), limit, cost, burst (0 for
+# none), burst window (ms). Leaves `left`, the calls that fit, and `wait`, the
+# ms until `cost` calls fit, 0 when they do.
+CHECK = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local burst = tonumber(ARGV[5])
+local burst_window = tonumber(ARGV[6])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+local left = limit - count
+local wait = 0
+if left < cost then
+    local i = cost - left - 1
+    local freed = redis.call('ZRANGE', KEYS[1], i, i, 'WITHSCORES')
+    wait = freed[2] and tonumber(freed[2]) + window - now or window
+end
+if burst > 0 then
+    local since = '(' .. (now - burst_window)
+    local recent = redis.call('ZCOUNT', KEYS[1], since, '+inf')
+    if burst - recent < cost then
+        local freed = redis.call(
+            'ZRANGEBYSCORE', KEYS[1], since, '+inf', 'WITHSCORES',
+            'LIMIT', cost - (burst - recent) - 1, 1
+        )
+        wait = math.max(
+            wait, freed[2] and tonumber(freed[2]) + burst_window - now or burst_window
+        )
+    end
+    left = math.min(left, burst - recent)
+end
+"""
+
+# Records the call, as `cost` members ARGV[7]:1 .. ARGV[7]:cost, when it fits.
+# Returns {allowed, calls in the window, ms until the call fits}.
+SLIDING_WINDOW = (
+    CHECK
+    + """
+if wait > 0 then
+    return {0, count, wait}
+end
+for i = 1, cost do
+    redis.call('ZADD', KEYS[1], now, ARGV[7] .. ':' .. i)
+end
+redis.call('PEXPIRE', KEYS[1], window)
+return {1, count + cost, 0}
+"""
+)
+
+# Leases a share of what is left of the window: records ARGV[9] of the calls
+# that fit, at least `cost` and at most ARGV[8], as ARGV[7]:0 .. ARGV[7]:n-1.
+# Returns {units leased, ms until `cost` calls fit when none}.
+LEASE = (
+    CHECK
+    + """
+if wait > 0 then
+    return {0, wait}
+end
+local units = math.max(
+    cost,
+    math.min(left, tonumber(ARGV[8]), math.max(1, math.ceil(left * tonumber(ARGV[9]))))
+)
+for i = 0, units - 1 do
+    redis.call('ZADD', KEYS[1], now, ARGV[7] .. ':' .. i)
+end
+redis.call('PEXPIRE', KEYS[1], window)
+return {units, 0}
+"""
+)
+
+
+class RateDecision(NamedTuple):
+    allowed: bool
+    # calls of the project in the window, this one included when allowed.
+    count: int
+    # seconds until the call fits, 0 when allowed.
+    retry_after: float
+
+
+class QuotaExceeded(Exception):
+    """Raised when a project has no units of its quota left for a call."""
+
+    def __init__(self, count: int, retry_after: int):
+        super().__init__(
+            f"This Project has reached it maximum call for the hour: {count}, check back in {retry_after} seconds"
+        )
+        self.retry_after = retry_after
+
+
+class RedisRateLimiter:
+    """Sliding window rate limit per project, checked and counted in one
+    atomic Redis script, so concurrent workers cannot overshoot it.
+
+    A call may cost more than one unit of the limit, and with a burst no more
+    than `burst` units are spent in any `burst_window` seconds. The limit and
+    burst of the limiter are the defaults of projects calling without theirs.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        limit: int,
+        window: float,
+        prefix: str = "mixer:rate",
+        burst: int = 0,
+        burst_window: float = 60.0,
+    ):
+        self.client = client
+        self.limit = limit
+        self.window = window
+        self.prefix = prefix
+        self.burst = burst
+        self.burst_window = burst_window
+        self._script = client.register_script(SLIDING_WINDOW)
+        self._lease = client.register_script(LEASE)
+
+    def key(self, project_id: int) -> str:
+        return f"{self.prefix}:{project_id}"
+
+    def _args(self, limit: int | None, cost: int, burst: int | None) -> list:
+        return [
+            int(time.time() * 1000),
+            int(self.window * 1000),
+            self.limit if limit is None else limit,
+            cost,
+            self.burst if burst is None else burst,
+            int(self.burst_window * 1000),
+        ]
+
+    def hit(
+        self,
+        project_id: int,
+        limit: int | None = None,
+        cost: int = 1,
+        burst: int | None = None,
+    ) -> RateDecision:
+        """Counts a call of a project if it fits under the limit.
+
+        Args:
+            project_id (int): Project id.
+            limit (int | None, optional): calls allowed in the window. Defaults to the limiter's.
+            cost (int, optional): units of the limit the call spends. Defaults to 1.
+            burst (int | None, optional): most units in a burst window, 0 for no burst limit. Defaults to the limiter's.
+
+        Returns:
+            RateDecision: whether the call is allowed.
+        """
+        allowed, count, wait_ms = self._script(
+            keys=[self.key(project_id)],
+            args=self._args(limit, cost, burst) + [uuid.uuid4().hex],
+        )
+        return RateDecision(bool(allowed), int(count), max(0, int(wait_ms)) / 1000)
+
+    def lease(
+        self,
+        project_id: int,
+        lease_id: str,
+        max_units: int,
+        share: float,
+        limit: int | None = None,
+        cost: int = 1,
+        burst: int | None = None,
+    ) -> Tuple[int, float]:
+        """Takes a share of the calls left to a project, to spend locally.
+
+        Args:
+            project_id (int): Project id.
+            lease_id (str): unique id of the lease.
+            max_units (int): most calls leased.
+            share (float): share of the calls left leased, at least `cost`.
+            limit (int | None, optional): calls allowed in the window. Defaults to the limiter's.
+            cost (int, optional): units the lease must hold at least. Defaults to 1.
+            burst (int | None, optional): most units in a burst window. Defaults to the limiter's.
+
+        Returns:
+            Tuple[int, float]: calls leased, seconds until `cost` fit when none.
+        """
+        units, wait_ms = self._lease(
+            keys=[self.key(project_id)],
+            args=self._args(limit, cost, burst) + [lease_id, max_units, share],
+        )
+        return int(units), max(0, int(wait_ms)) / 1000
+
+    def release(self, project_id: int, lease_id: str, used: int, units: int):
+        """Gives back the calls of a lease that were not spent."""
+        if used < units:
+            self.client.zrem(
+                self.key(project_id), *(f"{lease_id}:{i}" for i in range(used, units))
+            )
+
+    def counts(self) -> Dict[int, int]:
+        """Calls in the window of every project that made one.
+
+        Returns:
+            Dict[int, int]: project id -> count.
+        """
+        oldest = int((time.time() - self.window) * 1000)
+        keys = list(self.client.scan_iter(match=f"{self.prefix}:*", count=1000))
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.zcount(key, f"({oldest}", "+inf")
+        counts = {}
+        for key, count in zip(keys, pipe.execute()):
+            if count:
+                counts[int(key.rsplit(b":", 1)[1])] = count
+        return counts
+
+
+class MemoryRateLimiter:
+    """In-process sliding window with the behaviour of RedisRateLimiter.
+
+    For a single process, and as a stand-in for Redis in tests.
+    """
+
+    def __init__(
+        self, limit: int, window: float, burst: int = 0, burst_window: float = 60.0
+    ):
+        self.limit = limit
+        self.window = window
+        self.burst = burst
+        self.burst_window = burst_window
+        self._calls: Dict[int, Deque[float]] = {}
+        self._leases: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def _trim(self, calls: Deque[float], now: float):
+        while calls and calls[0] <= now - self.window:
+            calls.popleft()
+
+    def _check(
+        self,
+        calls: Deque[float],
+        now: float,
+        limit: int | None,
+        cost: int,
+        burst: int | None,
+    ) -> Tuple[int, float]:
+        """Calls that fit, and seconds until `cost` of them do; see CHECK."""
+        limit = self.limit if limit is None else limit
+        burst = self.burst if burst is None else burst
+        self._trim(calls, now)
+        left = limit - len(calls)
+        wait = 0.0
+        if left < cost:
+            i = cost - left - 1
+            wait = calls[i] + self.window - now if i < len(calls) else self.window
+        if burst > 0:
+            since = bisect.bisect_right(calls, now - self.burst_window)
+            recent = len(calls) - since
+            if burst - recent < cost:
+                i = since + cost - (burst - recent) - 1
+                wait = max(
+                    wait,
+                    calls[i] + self.burst_window - now
+                    if i < len(calls)
+                    else self.burst_window,
+                )
+            left = min(left, burst - recent)
+        return left, wait
+
+    def hit(
+        self,
+        project_id: int,
+        limit: int | None = None,
+        cost: int = 1,
+        burst: int | None = None,
+    ) -> RateDecision:
+        now = time.time()
+        with self._lock:
+            calls = self._calls.setdefault(project_id, deque())
+            _, wait = self._check(calls, now, limit, cost, burst)
+            if wait > 0:
+                return RateDecision(False, len(calls), wait)
+            calls.extend([now] * cost)
+            return RateDecision(True, len(calls), 0.0)
+
+    def lease(
+        self,
+        project_id: int,
+        lease_id: str,
+        max_units: int,
+        share: float,
+        limit: int | None = None,
+        cost: int = 1,
+        burst: int | None = None,
+    ) -> Tuple[int, float]:
+        now = time.time()
+        with self._lock:
+            calls = self._calls.setdefault(project_id, deque())
+            left, wait = self._check(calls, now, limit, cost, burst)
+            if wait > 0:
+                return 0, wait
+            units = max(cost, min(left, max_units, max(1, math.ceil(left * share))))
+            self._leases[lease_id] = [now] * units
+            calls.extend([now] * units)
+            return units, 0.0
+
+    def release(self, project_id: int, lease_id: str, used: int, units: int):
+        with self._lock:
+            stamps = self._leases.pop(lease_id, [])
+            calls = self._calls.get(project_id)
+            for stamp in stamps[used:units]:
+                if calls and stamp in calls:
+                    calls.remove(stamp)
+
+    def counts(self) -> Dict[int, int]:
+        now = time.time()
+        with self._lock:
+            for project_id, calls in list(self._calls.items()):
+                self._trim(calls, now)
+                if not calls:
+                    del self._calls[project_id]
+            return {project_id: len(calls) for project_id, calls in self._calls.items()}
+
+
+def check_rate(limiter, project_id: int, **quota) -> RateDecision:
+    """limiter.hit, letting the call through when the limiter is unreachable."""
+    try:
+        decision = limiter.hit(project_id, **quota)
+    except redis.RedisError as e:
+        metrics.incr("mixer_rate_limit", outcome="error")
+        logger.error("Rate limiter unavailable, not throttling: %s", e)
+        return RateDecision(True, 0, 0.0)
+    metrics.incr(
+        "mixer_rate_limit", outcome="allowed" if decision.allowed else "limited"
+    )
+    return decision
+
+
+def build_rate_limiter():
+    backend = mixer_settings.mixer_rate_limit_backend
+    limit = mixer_settings.mixer_freemium_hourly_limit
+    window = mixer_settings.mixer_rate_limit_window
+    burst = mixer_settings.mixer_freemium_burst
+    burst_window = mixer_settings.mixer_rate_burst_window
+    if backend == "redis":
+        client = redis.Redis.from_url(
+            mixer_settings.mixer_rate_limit_redis_url,
+            socket_timeout=mixer_settings.mixer_lane_timeout,
+        )
+        return RedisRateLimiter(
+            client, limit, window, burst=burst, burst_window=burst_window
+        )
+    if backend == "memory":
+        return MemoryRateLimiter(limit, window, burst, burst_window)
+    # "db": counted in the hour buckets of project_rate_buckets.
+    return None
+
+
+rate_limiter = build_rate_limiter()
@@ -0,0 +1,333 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+from typing import Awaitable, Callable, Dict, Tuple
+
+from mixpanel import MixpanelException
+
+from src.app.config import mixer_settings
+from src.app.utils.metrics import metrics
+from src.app.utils.schemas_utils import MixPanelDataCenter
+
+
+class MixpanelRejected(MixpanelException):
+    """Mixpanel answered and refused the message; retrying will not help."""
+
+    pass
+
+
+class MixpanelThrottled(MixpanelException):
+    """Mixpanel throttled the project (HTTP 429); the data center is up."""
+
+    pass
+
+
+class CircuitOpen(MixpanelException):
+    """Raised without calling Mixpanel while a data center breaker is open."""
+
+    pass
+
+
+class LaneFull(MixpanelException):
+    """Raised when a data center lane has no free slot in time."""
+
+    pass
+
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive failures, lets a trial call through
+    after `reset_timeout` seconds and closes again once one succeeds."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failures: int, reset_timeout: float):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failed = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go to Mixpanel now."""
+        return self.enter()[0]
+
+    def enter(self) -> Tuple[bool, bool]:
+        """Whether a call may go to Mixpanel now, and whether it is the trial
+        call, which must record its outcome or be abandoned."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True, False
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False, False
+                self.state = self.HALF_OPEN
+                self._trial = False
+            # a single trial call at a time while half open.
+            if self._trial:
+                return False, False
+            self._trial = True
+            return True, True
+
+    def abandon_trial(self):
+        """Lets another call be the trial, when the trial call recorded no
+        outcome (e.g. it was cancelled or failed outside of Mixpanel)."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failed = 0
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failed += 1
+            self._trial = False
+            if self.state == self.HALF_OPEN or self._failed >= self.failures:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def state_code(self) -> int:
+        """0 closed, 1 half open, 2 open."""
+        return [self.CLOSED, self.HALF_OPEN, self.OPEN].index(self.state)
+
+
+class DataCenterLane:
+    """Retries, circuit breaker and concurrency limit for one Mixpanel data center.
+
+    Each data center gets its own lane so a degraded one only uses up its
+    own slots instead of every worker thread. Each delivery tier has its own
+    lanes and breakers, so free traffic cannot open the breaker premium
+    traffic goes through.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        acquire_timeout: float,
+        retries: int,
+        backoff: float,
+        backoff_max: float,
+        breaker: CircuitBreaker,
+        async_concurrency: int | None = None,
+        tier: str = "free",
+    ):
+        self.name = name
+        self.tier = tier
+        self.concurrency = concurrency
+        self.acquire_timeout = acquire_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.breaker = breaker
+        self.async_concurrency = async_concurrency or concurrency
+        self.in_flight = 0
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._async_slots: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+        self.labels = {"data_center": name, "tier": tier}
+        metrics.register("mixer_breaker_state", breaker.state_code, **self.labels)
+        metrics.register("mixer_lane_in_flight", lambda: self.in_flight, **self.labels)
+
+    def delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2**attempt))
+
+    def _full(self):
+        metrics.incr("mixer_upstream_rejected", **self.labels)
+        raise LaneFull(f"Mixpanel {self.name} lane is full")
+
+    def _count(self, delta: int):
+        with self._lock:
+            self.in_flight += delta
+
+    def _admit(self) -> bool:
+        """Lets a call through the breaker.
+
+        Raises:
+            CircuitOpen: If the breaker of the data center is open.
+
+        Returns:
+            bool: whether the call is the trial of a half open breaker.
+        """
+        allowed, trial = self.breaker.enter()
+        if not allowed:
+            metrics.incr("mixer_upstream_rejected", **self.labels)
+            raise CircuitOpen(f"Mixpanel {self.name} circuit is open")
+        return trial
+
+    def _on_success(self):
+        self.breaker.record_success()
+        metrics.incr("mixer_upstream_requests", **self.labels, outcome="sent")
+
+    def _on_failure(
+        self, error: MixpanelException, attempt: int, trial: bool
+    ) -> Tuple[bool, bool]:
+        """Records a failed attempt and tells whether to try again.
+
+        Args:
+            error (MixpanelException): error of the attempt.
+            attempt (int): attempts made before this one.
+            trial (bool): whether the attempt was the trial of the breaker.
+
+        Returns:
+            Tuple[bool, bool]: whether to retry, and whether the retry is the trial.
+        """
+        if isinstance(error, MixpanelRejected):
+            # Mixpanel is up, the message itself was refused.
+            self.breaker.record_success()
+            outcome = "rejected"
+        elif isinstance(error, MixpanelThrottled):
+            # one project is over its Mixpanel limit: says nothing of the
+            # data center, so the breaker records no outcome.
+            if trial:
+                self.breaker.abandon_trial()
+            outcome = "throttled"
+        else:
+            self.breaker.record_failure()
+            outcome = "failed"
+        metrics.incr("mixer_upstream_requests", **self.labels, outcome=outcome)
+
+        if outcome == "rejected" or attempt >= self.retries:
+            return False, False
+        allowed, trial = self.breaker.enter()
+        if not allowed:
+            return False, False
+        metrics.incr("mixer_upstream_retries", **self.labels)
+        return True, trial
+
+    def call(self, fn: Callable, *args):
+        """Calls fn(*args), retrying MixpanelException with backoff.
+
+        Raises:
+            CircuitOpen: If the breaker of the data center is open.
+            LaneFull: If no slot frees up within acquire_timeout.
+            MixpanelException: Once the retries are used up.
+        """
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            self._full()
+
+        self._count(1)
+        trial = False
+        try:
+            trial = self._admit()
+            attempt = 0
+            while True:
+                try:
+                    result = fn(*args)
+                except MixpanelException as e:
+                    retry, trial = self._on_failure(e, attempt, trial)
+                    if not retry:
+                        raise
+                    time.sleep(self.delay(attempt))
+                    attempt += 1
+                    continue
+                trial = False
+                self._on_success()
+                return result
+        finally:
+            # cancelled or failed outside of Mixpanel: no outcome to record.
+            if trial:
+                self.breaker.abandon_trial()
+            self._count(-1)
+            self._slots.release()
+
+    def async_slots(self) -> asyncio.Semaphore:
+        """Concurrency limit of the lane for the running event loop."""
+        loop = asyncio.get_running_loop()
+        slots = self._async_slots.get(loop)
+        if slots is None:
+            slots = self._async_slots[loop] = asyncio.Semaphore(self.async_concurrency)
+        return slots
+
+    async def acall(self, fn: Callable[..., Awaitable], *args):
+        """Awaits fn(*args) with the retries and breaker of call().
+
+        Requests in flight on an event loop are bounded by async_concurrency.
+
+        Raises:
+            CircuitOpen: If the breaker of the data center is open.
+            LaneFull: If no slot frees up within acquire_timeout.
+            MixpanelException: Once the retries are used up.
+        """
+        slots = self.async_slots()
+        try:
+            await asyncio.wait_for(slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._full()
+
+        self._count(1)
+        trial = False
+        try:
+            trial = self._admit()
+            attempt = 0
+            while True:
+                try:
+                    result = await fn(*args)
+                except MixpanelException as e:
+                    retry, trial = self._on_failure(e, attempt, trial)
+                    if not retry:
+                        raise
+                    await asyncio.sleep(self.delay(attempt))
+                    attempt += 1
+                    continue
+                trial = False
+                self._on_success()
+                return result
+        finally:
+            if trial:
+                self.breaker.abandon_trial()
+            self._count(-1)
+            slots.release()
+
+
+def build_lanes(
+    tier: str, concurrency: int, async_concurrency: int
+) -> Dict[MixPanelDataCenter, DataCenterLane]:
+    """Lanes of every data center for one delivery tier, each with a breaker
+    of its own.
+
+    Args:
+        tier (str): delivery tier name.
+        concurrency (int): blocking requests in flight per data center.
+        async_concurrency (int): async requests in flight per data center and loop.
+
+    Returns:
+        Dict[MixPanelDataCenter, DataCenterLane]: lane per data center.
+    """
+    return {
+        data_center: DataCenterLane(
+            data_center.value,
+            concurrency,
+            mixer_settings.mixer_lane_timeout,
+            mixer_settings.mixer_retry_limit,
+            mixer_settings.mixer_retry_backoff,
+            mixer_settings.mixer_retry_backoff_max,
+            CircuitBreaker(
+                mixer_settings.mixer_breaker_failures,
+                mixer_settings.mixer_breaker_reset,
+            ),
+            async_concurrency,
+            tier,
+        )
+        for data_center in MixPanelDataCenter
+    }
+
+
+def lane_of(
+    lanes: Dict[MixPanelDataCenter, DataCenterLane], data_center: str | None
+) -> DataCenterLane:
+    """Lane of a Project data center; projects without one use `other`."""
+    if data_center == MixPanelDataCenter.eu.value:
+        return lanes[MixPanelDataCenter.eu]
+    return lanes[MixPanelDataCenter.other]
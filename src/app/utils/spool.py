@@ -0,0 +1,394 @@
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Tuple
+
+from mixpanel import MixpanelException
+
+from src.app.utils.resilience import MixpanelRejected
+
+logger = logging.getLogger(__name__)
+
+# every record is prefixed with its payload length and crc32.
+HEADER = struct.Struct(">II")
+
+SEGMENT_SUFFIX = ".seg"
+CHECKPOINT_FILE = "checkpoint"
+LOCK_FILE = "lock"
+
+# (segment sequence, byte offset in the segment)
+Position = Tuple[int, int]
+
+
+class SpoolFull(MixpanelException):
+    """Raised when the spool has reached its disk cap."""
+
+    pass
+
+
+class MixerSpool:
+    """Write-ahead spool of Mixpanel messages kept in append-only segment files.
+
+    Messages are appended to the active segment and fsynced periodically.
+    A drainer thread reads them back with mmap, hands them to `deliver` in
+    batches per (mixpanel_key, data_center, endpoint), checkpoints its
+    position after every batch and removes the segments it has finished.
+    Batches Mixpanel refuses outright are handed to `reject` and skipped.
+
+    A process locks the directory it spools to; other processes sharing
+    `directory` spool to the first free worker-N directory under it, and
+    pick the segments left there by a previous run.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int,
+        max_bytes: int,
+        fsync_interval: float,
+        batch_size: int = 50,
+        deliver: Callable[[tuple, List[str]], None] | None = None,
+        read_batch: int = 1000,
+        poll_interval: float = 0.2,
+        reject: Callable[[tuple, List[str], Exception], None] | None = None,
+    ):
+        self.root = directory
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync_interval = fsync_interval
+        self.batch_size = batch_size
+        self.deliver = deliver
+        self.read_batch = read_batch
+        self.poll_interval = poll_interval
+        self.reject = reject
+
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._file = None
+        self._seq = 0
+        self._size = 0
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+        self._checkpoint: Position = (0, 0)
+        # positions of records delivered past the checkpoint, not sent again.
+        self._delivered: set = set()
+        self._thread: threading.Thread | None = None
+
+    def _path(self, name) -> str:
+        return os.path.join(self.directory, name)
+
+    def _segment_path(self, seq: int) -> str:
+        return self._path(f"{seq:020d}{SEGMENT_SUFFIX}")
+
+    def segments(self) -> List[int]:
+        """Sequence numbers of the segments on disk, oldest first."""
+        return sorted(
+            int(name[: -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def open(self):
+        """Opens a new active segment after the ones left by a previous run."""
+        with self._lock:
+            if self._file is None:
+                self._open()
+
+    def _claim(self):
+        """Locks the first spool directory no other process holds."""
+        worker = 0
+        while True:
+            directory = self.root
+            if worker:
+                directory = os.path.join(self.root, f"worker-{worker}")
+            os.makedirs(directory, exist_ok=True)
+            lock_file = open(os.path.join(directory, LOCK_FILE), "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                worker += 1
+                continue
+            self.directory = directory
+            self._lock_file = lock_file
+            return
+
+    def _open(self):
+        if self._lock_file is None:
+            self._claim()
+        segments = self.segments()
+        self._size = sum(os.path.getsize(self._segment_path(s)) for s in segments)
+        # never append after a tail that may have been torn by a crash.
+        self._seq = segments[-1] + 1 if segments else 1
+        self._file = open(self._segment_path(self._seq), "ab")
+
+        checkpoint = self.read_checkpoint()
+        if checkpoint is None:
+            checkpoint = (segments[0] if segments else self._seq, 0)
+        self._checkpoint = checkpoint
+
+    def close(self):
+        """Fsyncs and closes the active segment."""
+        with self._lock:
+            if self._file is not None:
+                self._fsync()
+                self._file.close()
+                self._file = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    def read_checkpoint(self) -> Position | None:
+        try:
+            with open(self._path(CHECKPOINT_FILE)) as f:
+                seq, offset = f.read().split()
+        except (FileNotFoundError, ValueError):
+            return None
+        return int(seq), int(offset)
+
+    def size(self) -> int:
+        """Bytes used on disk by the segments."""
+        return self._size
+
+    def append(self, key: tuple, json_message: str):
+        """Writes a message to the active segment.
+
+        Args:
+            key (tuple): (mixpanel_key, data_center, endpoint)
+            json_message (str): JSON message formatted for the endpoint.
+
+        Raises:
+            SpoolFull: If the record would take the spool over its disk cap.
+        """
+        payload = json.dumps([list(key), json_message]).encode()
+        record = HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        with self._lock:
+            if self._file is None:
+                self._open()
+            if self._size + len(record) > self.max_bytes:
+                raise SpoolFull(f"Spool is over its cap of {self.max_bytes} bytes")
+            if (
+                self._file.tell()
+                and self._file.tell() + len(record) > self.segment_bytes
+            ):
+                self._roll()
+
+            self._file.write(record)
+            self._file.flush()
+            self._size += len(record)
+            self._dirty = True
+            if time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self._fsync()
+
+        self.start()
+
+    def _fsync(self):
+        if self._dirty:
+            os.fsync(self._file.fileno())
+            self._dirty = False
+        self._last_fsync = time.monotonic()
+
+    def _roll(self):
+        self._fsync()
+        self._file.close()
+        self._seq += 1
+        self._file = open(self._segment_path(self._seq), "ab")
+
+    def read(self, max_records: int) -> Tuple[List[Tuple[tuple, str]], Position]:
+        """Reads records after the checkpoint.
+
+        Args:
+            max_records (int): maximum number of records to return.
+
+        Returns:
+            Tuple[List[Tuple[tuple, str]], Position]: records and the position after them.
+        """
+        records, _, position = self._read(max_records)
+        return records, position
+
+    def _read(
+        self, max_records: int
+    ) -> Tuple[List[Tuple[tuple, str]], List[Position], Position]:
+        """Records after the checkpoint, the position after each of them, and
+        the position after the read."""
+        with self._lock:
+            active = self._seq
+        seq, offset = self._checkpoint
+        records: List[Tuple[tuple, str]] = []
+        positions: List[Position] = []
+
+        for segment in self.segments():
+            if segment < seq:
+                continue
+            if segment > seq:
+                seq, offset = segment, 0
+
+            offset, complete = self._read_segment(
+                segment, offset, records, positions, max_records
+            )
+            if len(records) >= max_records or segment == active:
+                break
+            if not complete:
+                logger.error("Skipping torn tail of spool segment %s", segment)
+
+        return records, positions, (seq, offset)
+
+    def _read_segment(
+        self,
+        segment: int,
+        offset: int,
+        records: list,
+        positions: list,
+        max_records: int,
+    ) -> Tuple[int, bool]:
+        path = self._segment_path(segment)
+        size = os.path.getsize(path)
+        if size <= offset:
+            return offset, True
+
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as m:
+                while offset + HEADER.size <= size and len(records) < max_records:
+                    length, crc = HEADER.unpack_from(m, offset)
+                    end = offset + HEADER.size + length
+                    if end > size:
+                        return offset, False
+                    payload = m[offset + HEADER.size : end]
+                    if zlib.crc32(payload) != crc:
+                        logger.error("Corrupt record in spool segment %s", segment)
+                        return size, False
+                    key, message = json.loads(payload)
+                    records.append((tuple(key), message))
+                    positions.append((segment, end))
+                    offset = end
+
+        return offset, offset >= size
+
+    def commit(self, position: Position):
+        """Checkpoints the drained position and compacts finished segments.
+
+        Args:
+            position (Position): position returned by read.
+        """
+        tmp = self._path(CHECKPOINT_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            f.write(f"{position[0]} {position[1]}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(CHECKPOINT_FILE))
+        self._checkpoint = position
+        self._delivered = {p for p in self._delivered if p > position}
+        self.compact()
+
+    def compact(self):
+        """Removes the segments before the checkpoint."""
+        for segment in self.segments():
+            if segment >= self._checkpoint[0]:
+                break
+            path = self._segment_path(segment)
+            size = os.path.getsize(path)
+            os.remove(path)
+            with self._lock:
+                self._size -= size
+
+    def batches(
+        self, records: List[Tuple[tuple, str]]
+    ) -> List[Tuple[tuple, List[int]]]:
+        """Groups records per key in batches of batch_size, keeping their order.
+
+        Returns:
+            List[Tuple[tuple, List[int]]]: key and indexes of the records of a batch.
+        """
+        grouped: Dict[tuple, List[int]] = {}
+        for i, (key, _) in enumerate(records):
+            grouped.setdefault(key, []).append(i)
+
+        batches = []
+        for key, indexes in grouped.items():
+            for start in range(0, len(indexes), self.batch_size):
+                batches.append((key, indexes[start : start + self.batch_size]))
+        return batches
+
+    def drain_once(self) -> int:
+        """Delivers one read of records, checkpointing after every batch.
+
+        A batch Mixpanel refuses outright goes to `reject` and counts as
+        delivered. Batches delivered before one that failed are not sent
+        again when the read is retried.
+
+        Raises:
+            MixpanelException: If a batch was not delivered; the records from
+                the first one not delivered on stay spooled.
+
+        Returns:
+            int: number of records delivered.
+        """
+        records, positions, position = self._read(self.read_batch)
+        done = [p in self._delivered for p in positions]
+        for key, indexes in self.batches(records):
+            if done[indexes[0]]:
+                continue
+            batch = [records[i][1] for i in indexes]
+            try:
+                self.deliver(key, batch)
+            except MixpanelRejected as e:
+                # retrying a message Mixpanel refuses would block the spool.
+                if self.reject is None:
+                    logger.error("Dropping %s spooled messages: %s", len(batch), e)
+                else:
+                    self.reject(key, batch, e)
+            for i in indexes:
+                done[i] = True
+                self._delivered.add(positions[i])
+            self._checkpoint_done(done, positions)
+        if all(done) and position != self._checkpoint:
+            # past a torn tail or a corrupt record.
+            self.commit(position)
+        return len(records)
+
+    def _checkpoint_done(self, done: List[bool], positions: List[Position]):
+        """Commits the position after the records delivered in read order."""
+        delivered = 0
+        while delivered < len(done) and done[delivered]:
+            delivered += 1
+        if delivered and positions[delivered - 1] > self._checkpoint:
+            self.commit(positions[delivered - 1])
+
+    def start(self):
+        """Starts the drainer thread if it is not running."""
+        if self.deliver is None or (self._thread and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="mixer-spool", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        backoff = self.poll_interval
+        while True:
+            try:
+                drained = self.drain_once()
+            except Exception as e:
+                # events stay on disk until Mixpanel takes them again.
+                logger.error("Spool delivery failed, retrying in %ss: %s", backoff, e)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+
+            backoff = self.poll_interval
+            if not drained:
+                with self._lock:
+                    if self._file is not None and self._dirty:
+                        self._fsync()
+                time.sleep(self.poll_interval)
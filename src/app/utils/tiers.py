@@ -0,0 +1,139 @@
+import asyncio
+import os
+
+from src.app.config import mixer_settings
+from src.app.utils.async_transport import AsyncMixerTransport
+from src.app.utils.batcher import AsyncMixerBatcher, MixerBatcher
+from src.app.utils.dead_letters import dead_letter_store
+from src.app.utils.delivery_queue import DeliveryQueue
+from src.app.utils.metrics import metrics
+from src.app.utils.mixer_pool import ConsumerPool
+from src.app.utils.resilience import build_lanes
+from src.app.utils.spool import MixerSpool
+
+FREE = "free"
+PREMIUM = "premium"
+
+
+class DeliveryTier:
+    """Workers, connection pools and lanes delivering one tier of projects.
+
+    Premium and freemium projects each get a tier, so a flood of freemium
+    traffic queues behind its own workers and connections only.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        lane_concurrency: int,
+        lane_async_concurrency: int,
+        pool_maxsize: int,
+        async_max_connections: int,
+        async_max_keepalive: int,
+        delivery_workers: int,
+        delivery_queue_size: int,
+        spool_dir: str | None = None,
+    ):
+        self.name = name
+        self.lanes = build_lanes(name, lane_concurrency, lane_async_concurrency)
+        self.consumer_pool = ConsumerPool(pool_maxsize, self.lanes)
+        self.transport = AsyncMixerTransport(
+            async_max_connections,
+            async_max_keepalive,
+            mixer_settings.mixer_request_timeout,
+            self.lanes,
+        )
+        self.delivery_queue = DeliveryQueue(delivery_workers, delivery_queue_size)
+
+        batcher_options = dict(
+            coalesce=mixer_settings.mixer_coalesce_enabled,
+            dead_letters=dead_letter_store,
+            consumer_pool=self.consumer_pool,
+        )
+        if mixer_settings.mixer_transport == "async":
+            # as many batches in flight as the lanes let through, and as many
+            # of one project as MIXER_PROJECT_INFLIGHT.
+            self.batcher = AsyncMixerBatcher(
+                mixer_settings.mixer_batch_size,
+                mixer_settings.mixer_batch_max_age,
+                transport=self.transport,
+                concurrency=lane_async_concurrency,
+                per_project=mixer_settings.mixer_project_inflight,
+                **batcher_options,
+            )
+        else:
+            self.batcher = MixerBatcher(
+                mixer_settings.mixer_batch_size,
+                mixer_settings.mixer_batch_max_age,
+                **batcher_options,
+            )
+
+        self.spool = None
+        if spool_dir is not None:
+            self.spool = MixerSpool(
+                spool_dir,
+                mixer_settings.mixer_spool_segment_bytes,
+                mixer_settings.mixer_spool_max_bytes,
+                mixer_settings.mixer_spool_fsync_interval,
+                batch_size=self.batcher.batch_size,
+                deliver=self.batcher.deliver,
+                reject=self.batcher.dead_letter,
+            )
+
+        metrics.register(
+            "mixer_delivery_queue_depth", self.delivery_queue.qsize, tier=name
+        )
+
+    async def start(self):
+        await self.delivery_queue.start()
+        if self.spool is not None:
+            # picks up events spooled by a previous run.
+            self.spool.open()
+            self.spool.start()
+
+    async def stop(self):
+        # runs queued calls, then sends whatever is still buffered for Mixpanel.
+        await self.delivery_queue.stop()
+        await asyncio.to_thread(self.batcher.flush)
+        if self.spool is not None:
+            self.spool.close()
+        await self.transport.close()
+
+
+def spool_dir(name: str) -> str | None:
+    if not mixer_settings.mixer_spool_enabled:
+        return None
+    if name == FREE:
+        return mixer_settings.mixer_spool_dir
+    return os.path.join(mixer_settings.mixer_spool_dir, name)
+
+
+tiers = {
+    FREE: DeliveryTier(
+        FREE,
+        mixer_settings.mixer_lane_concurrency,
+        mixer_settings.mixer_lane_async_concurrency,
+        mixer_settings.mixer_pool_maxsize,
+        mixer_settings.mixer_async_max_connections,
+        mixer_settings.mixer_async_max_keepalive,
+        mixer_settings.mixer_delivery_workers,
+        mixer_settings.mixer_delivery_queue_size,
+        spool_dir(FREE),
+    ),
+    PREMIUM: DeliveryTier(
+        PREMIUM,
+        mixer_settings.mixer_premium_lane_concurrency,
+        mixer_settings.mixer_premium_lane_async_concurrency,
+        mixer_settings.mixer_premium_pool_maxsize,
+        mixer_settings.mixer_premium_async_max_connections,
+        mixer_settings.mixer_premium_async_max_keepalive,
+        mixer_settings.mixer_premium_delivery_workers,
+        mixer_settings.mixer_premium_delivery_queue_size,
+        spool_dir(PREMIUM),
+    ),
+}
+
+
+def tier(premium: bool) -> DeliveryTier:
+    """Delivery tier of a Project from its is_premium flag."""
+    return tiers[PREMIUM if premium else FREE]
@@ -2,9 +2,12 @@ from fastapi import APIRouter, status, Depends
 from src.auth import schemas
 from src.auth.auth_service import user_service
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
+from src.app.utils.encoding import ORJSONRoute
 from src.auth.oauth import get_current_user, verify_refresh_token
 
-user_router = APIRouter(prefix="/api/v1/auth", tags={"User Authentication"})
+user_router = APIRouter(
+    prefix="/api/v1/auth", tags={"User Authentication"}, route_class=ORJSONRoute
+)
 
 
 @user_router.post(
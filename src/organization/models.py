@@ -13,6 +13,9 @@ class Organization(AbstractModel):
         Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True
     )
     revoke_link = Column(Boolean, server_default=text("false"))
+    quota_plan_id = Column(
+        Integer, ForeignKey("quota_plans.id", ondelete="SET NULL"), nullable=True
+    )
     creator = relationship("User")
     org_member = relationship("OrgMember", back_populates="org")
 
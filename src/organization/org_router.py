@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, status
 from starlette.requests import Request
 
+from src.app.utils.encoding import ORJSONRoute
 from src.auth.models import User
 from src.auth.oauth import get_current_user
 from src.organization import schemas
 from src.organization.org_service import org_service
 
-org_router = APIRouter(prefix="/api/v1/org", tags={"Organization and Org Members"})
+org_router = APIRouter(
+    prefix="/api/v1/org", tags={"Organization and Org Members"}, route_class=ORJSONRoute
+)
 
 
 @org_router.post(
@@ -1,5 +1,14 @@
-from fastapi import Depends, Header, HTTPException, status
+import math
+import time
+from typing import Callable, Iterable
 
+from fastapi import Depends, Header, HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+
+from src.app.utils.admission import InFlightFull, in_flight
+from src.app.utils.quota_lease import quota_leases
+from src.app.utils.quota_plans import quota_plans
+from src.app.utils.rate_limit import QuotaExceeded, check_rate, rate_limiter
 from src.projects.project_service import Project, project_service
 
 
@@ -17,10 +26,82 @@ def mixer_header(mixer_key: str = Header()):
     return project
 
 
-def project_rate_header(project: Project = Depends(mixer_header)):
+def charges(operation: str | None):
+    """Names the operation of MIXER_OPERATIONS a route forwards, whose weight
+    in the quota plan a call spends.
+
+    Routes forwarding a list of operations pass None and charge the weights
+    of the operations in their body themselves, with charge_operations.
+
+    Args:
+        operation (str | None): operation name, None to charge per operation.
+    """
+
+    def mark(endpoint):
+        endpoint.mixer_operation = operation
+        return endpoint
+
+    return mark
+
+
+def charge_operations(project: Project, operations: Iterable[str]) -> Project:
+    """Spends the weights of operations from the quota of a freemium project.
+
+    Args:
+        project (Project): Project of the Mixer-Key.
+        operations (Iterable[str]): names of the operations of the call.
+
+    Raises:
+        QuotaExceeded: If the quota has fewer units left than the call spends.
+
+    Returns:
+        Project: the project.
+    """
+    # checks if the project is premium.
+    if project.is_premium is not False:
+        return project
+
+    # plans are cached, so this reads nothing from the DB.
+    quota = quota_plans.plan_of(project)
+    cost = sum(quota.cost(operation) for operation in operations)
+    if cost <= 0:
+        # operations weighted 0 are not counted.
+        return project
+
+    if rate_limiter is not None:
+        if quota_leases is not None:
+            # decided from this worker's lease, renewed in the background.
+            decision = quota_leases.hit(
+                project.id, quota.hourly_limit, cost, quota.burst
+            )
+        else:
+            # checked and counted in one call to the rate limiter.
+            decision = check_rate(
+                rate_limiter,
+                project.id,
+                limit=quota.hourly_limit,
+                cost=cost,
+                burst=quota.burst,
+            )
+        if not decision.allowed:
+            raise QuotaExceeded(decision.count, math.ceil(decision.retry_after))
+        return project
+
+    # checked and counted in the bucket of the hour in one statement; the
+    # buckets count hours only, so the burst is not checked here.
+    limit = quota.hourly_limit
+    count = project_service.pj_rate_repo.hit_project_hour(project.id, limit, cost)
+    if count is None:
+        raise QuotaExceeded(limit, 3600 - int(time.time()) % 3600)
+    return project
+
+
+def project_rate_header(request: Request, project: Project = Depends(mixer_header)):
     """Depends on the Mixer header
-    Throttles an endpoint if a project is freemium.
+    Throttles an endpoint if a project is freemium, by the quota plan of the
+    project; a call spends the weight of the operation its route forwards.
     Args:
+        request (Request): the request, for the operation of its endpoint.
         project (Project, optional): _description_. Defaults to Depends(mixer_header).
 
     Raises:
@@ -29,23 +110,71 @@ def project_rate_header(project: Project = Depends(mixer_header)):
     Returns:
         _type_: Project is returned.
     """
-    # checks if the project is premium.
-    if project.is_premium is False:
-        # check if Project Rate Limit data from Project.
-        pj_rate = project_service.get_project_rate_limit(project.id)
-        pj_rate_for_last_hour = project_service.pj_rate_repo.get_project_hour(
-            project.id
+    operation = getattr(request.scope.get("endpoint"), "mixer_operation", "")
+    if operation is None:
+        # the route charges each operation of its body.
+        return project
+    return throttle(charge_operations, project, [operation])
+
+
+def throttle(charge: Callable, project: Project, *args) -> Project:
+    """Runs charge(project, *args), answering 400 with Retry-After when the
+    quota of the project is spent.
+
+    Raises:
+        HTTPException: If the quota has fewer units left than the call spends.
+    """
+    try:
+        return charge(project, *args)
+    except QuotaExceeded as e:
+        raise HTTPException(
+            detail=str(e),
+            status_code=status.HTTP_400_BAD_REQUEST,
+            headers={"Retry-After": str(e.retry_after)},
         )
 
-        # checks the rate limit count.
-        if pj_rate_for_last_hour.count >= 2:
-            raise HTTPException(
-                detail=f"This Project has reached it maximum call for the hour: {pj_rate_for_last_hour.count}, check back in an hour",
-                status_code=status.HTTP_400_BAD_REQUEST,
-            )
 
-        # increases the count once the project rate limit is < 50.
-        pj_rate.count += 1
-        project_service.pj_rate_repo.update_project_rate(pj_rate)
-        # returns project.
-        return project
+async def project_in_flight(request: Request, project: Project = Depends(mixer_header)):
+    """Holds an in-flight slot of the project while the request is served.
+
+    Premium projects wait in a bounded queue for a slot; other projects are
+    throttled straight away. The slot is taken before the rate limit is
+    charged, so a request refused for want of a slot spends no quota.
+
+    Args:
+        request (Request): the request, for the operation of its endpoint.
+        project (Project, optional): _description_. Defaults to Depends(mixer_header).
+
+    Raises:
+        HTTPException: 429 with Retry-After when no slot is free.
+
+    Yields:
+        _type_: Project is returned.
+    """
+    try:
+        await in_flight.acquire(project.id, wait=project.is_premium)
+    except InFlightFull as e:
+        raise HTTPException(
+            detail=f"Too many requests in flight ({e.scope} limit), retry later",
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    try:
+        # the rate limit may read Redis or the DB, so it runs off the loop.
+        yield await run_in_threadpool(project_rate_header, request, project)
+    finally:
+        await in_flight.release(project.id)
+
+
+def respond_async(prefer: str | None = Header(None)) -> bool:
+    """Reads the delivery mode of a request from the Prefer header.
+
+    Args:
+        prefer (str | None, optional): Prefer header. Defaults to Header(None).
+
+    Returns:
+        bool: True for `Prefer: respond-async`, False for the confirmed mode.
+    """
+    if not prefer:
+        return False
+    return "respond-async" in [p.strip().lower() for p in prefer.split(",")]
@@ -0,0 +1,513 @@
+import asyncio
+import time
+from typing import (
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Tuple,
+    Type,
+    Union,
+)
+
+import orjson
+from mixpanel import MixpanelException
+from pydantic import Field, ValidationError, conlist, create_model
+from typing_extensions import Annotated
+
+from src.app.config import mixer_settings
+from src.app.utils.coalesce import COALESCED_ENDPOINTS, coalesce
+from src.app.utils.dead_letters import dead_letter_store
+from src.app.utils.dedup import forget_on_failure, is_repeat
+from src.app.utils.metrics import metrics
+from src.app.utils.mixer_pool import MIXPANEL_MAX_BATCH
+from src.app.utils.mixers import CapturingConsumer, Mixer, send_batches
+from src.app.utils.rate_limit import QuotaExceeded
+from src.app.utils.schemas_utils import AbstractModel
+from src.app.utils.tiers import tier
+from src.projects import schemas
+
+# operation name -> (payload schema, Mixer call)
+MIXER_OPERATIONS: Dict[str, Tuple[Type[AbstractModel], Callable]] = {
+    "track": (
+        schemas.EventProp,
+        lambda mixer, e: mixer.track_events(e.distinct_id, e.event, e.properties),
+    ),
+    "alias": (
+        schemas.Alias,
+        lambda mixer, e: mixer.create_alias(e.distinct_id, e.new_id),
+    ),
+    "people_set": (
+        schemas.PeopleProp,
+        lambda mixer, e: mixer.people_prop(e.distinct_id, e),
+    ),
+    "people_set_once": (
+        schemas.PeopleProp_,
+        lambda mixer, e: mixer.people_set_(e.distinct_id, e.data),
+    ),
+    "increment": (
+        schemas.PeopleProp_,
+        lambda mixer, e: mixer.increment_people(e.distinct_id, e.data),
+    ),
+    "append": (
+        schemas.PeopleProp_,
+        lambda mixer, e: mixer.append_to_people(e.distinct_id, e.data),
+    ),
+    "union": (
+        schemas.PeopleUnion,
+        lambda mixer, e: mixer.union_people(e.distinct_id, e.data),
+    ),
+    "unset": (
+        schemas.PeopleUnset,
+        lambda mixer, e: mixer.unset_people(e.distinct_id, e.prop),
+    ),
+    "remove": (
+        schemas.PeopleProp_,
+        lambda mixer, e: mixer.remove_people_prop(e.distinct_id, e.data),
+    ),
+    "delete": (
+        schemas.Distinct,
+        lambda mixer, e: mixer.delete_people(e.distinct_id),
+    ),
+    "charge": (
+        schemas.ChargePeople,
+        lambda mixer, e: mixer.charge_people(e.distinct_id, e.amount, e.data),
+    ),
+    "clear_charges": (
+        schemas.Distinct,
+        lambda mixer, e: mixer.clear_people_charge(e.distinct_id),
+    ),
+    "group_set": (
+        schemas.GroupProp,
+        lambda mixer, e: mixer.set_group(e.group_key, e.group_id, e.data),
+    ),
+    "group_set_once": (
+        schemas.GroupProp,
+        lambda mixer, e: mixer.set_group_(e.group_key, e.group_id, e.data),
+    ),
+    "group_union": (
+        schemas.GroupProp,
+        lambda mixer, e: mixer.union_group(e.group_key, e.group_id, e.data),
+    ),
+    "group_unset": (
+        schemas.GroupUnset,
+        lambda mixer, e: mixer.unset_group(e.group_key, e.group_id, e.property),
+    ),
+    "group_remove": (
+        schemas.GroupProp,
+        lambda mixer, e: mixer.remove_group(e.group_key, e.group_id, e.data),
+    ),
+    "group_delete": (
+        schemas.BaseGroup,
+        lambda mixer, e: mixer.delete_group(e.group_key, e.group_id),
+    ),
+}
+
+
+# operation name -> {"op": name, "payload": schema} model, for typed requests.
+OPERATION_MODELS: Dict[str, Type[AbstractModel]] = {
+    op: create_model(
+        "".join(part.title() for part in op.split("_")) + "Operation",
+        __base__=AbstractModel,
+        op=(Literal[op], ...),
+        payload=(schema, ...),
+    )
+    for op, (schema, _) in MIXER_OPERATIONS.items()
+}
+
+
+Operation = Annotated[
+    Union[tuple(OPERATION_MODELS.values())], Field(discriminator="op")
+]
+
+
+class OperationList(AbstractModel):
+    __root__: conlist(
+        Operation, min_items=1, max_items=mixer_settings.mixer_bulk_max_events
+    )
+
+
+def run_operation(mixer: Mixer, op: str, payload) -> bool:
+    """Runs one operation against a Mixer.
+
+    Args:
+        mixer (Mixer): Mixer of the Project.
+        op (str): operation name in MIXER_OPERATIONS.
+        payload (_type_): router payload, as its schema or as a dict.
+
+    Returns:
+        bool: result of the Mixer call.
+    """
+    schema, call = MIXER_OPERATIONS[op]
+    if isinstance(payload, dict):
+        payload = schema.parse_obj(payload)
+    return call(mixer, payload)
+
+
+class PartialDelivery(MixpanelException):
+    """Raised when Mixpanel did not take some messages of a delivery.
+
+    Args:
+        error (str): error of the first failed request.
+        failed (Dict[str, List[str]]): messages not delivered, per endpoint.
+    """
+
+    def __init__(self, error: str, failed: Dict[str, List[str]]):
+        super().__init__(error)
+        self.failed = failed
+
+
+def capture_operations(
+    mixpanel_key: str, data_center: str | None, operations: List[dict]
+) -> Dict[str, List[str]]:
+    """Mixpanel messages of operations per endpoint, coalesced when it is on.
+
+    Args:
+        mixpanel_key (str): Mixpanel key of the Project.
+        data_center (str | None): MixPanelDataCenter value of the Project.
+        operations (List[dict]): {"op": name, "payload": router payload} items.
+
+    Returns:
+        Dict[str, List[str]]: JSON messages per endpoint.
+    """
+    capture = CapturingConsumer()
+    mixer = Mixer(mixpanel_key, data_center, consumer=capture)
+    for operation in operations:
+        run_operation(mixer, operation["op"], operation["payload"])
+
+    messages = {}
+    for endpoint, captured in capture.messages.items():
+        if mixer_settings.mixer_coalesce_enabled and endpoint in COALESCED_ENDPOINTS:
+            captured = coalesce(captured)
+        messages[endpoint] = captured
+    return messages
+
+
+def deliver_messages(
+    mixpanel_key: str,
+    data_center: str | None,
+    messages: Dict[str, List[str]],
+    dead_letter: bool = False,
+    attempts: int = 1,
+    premium: bool = False,
+) -> int:
+    """Sends messages straight to Mixpanel, 50 messages per request.
+
+    Args:
+        mixpanel_key (str): Mixpanel key of the Project.
+        data_center (str | None): MixPanelDataCenter value of the Project.
+        messages (Dict[str, List[str]]): JSON messages per endpoint.
+        dead_letter (bool, optional): store failed messages as dead letters instead of raising. Defaults to False.
+        attempts (int, optional): deliveries tried, recorded on dead letters. Defaults to 1.
+        premium (bool, optional): send on the premium delivery tier. Defaults to False.
+
+    Raises:
+        PartialDelivery: With the messages Mixpanel did not take, without dead_letter.
+
+    Returns:
+        int: number of messages delivered.
+    """
+    failed: Dict[str, List[str]] = {}
+    error = None
+    delivered = 0
+    for endpoint, batch in messages.items():
+        results = send_batches(data_center, endpoint, batch, premium)
+        errors = [e for e in results if e]
+        delivered += len(results) - len(errors)
+        if errors:
+            failed[endpoint] = [m for m, e in zip(batch, results) if e]
+            error = error or errors[0]
+
+    if failed and dead_letter and dead_letter_store is not None:
+        for endpoint, batch in failed.items():
+            dead_letter_store.add(mixpanel_key, endpoint, batch, error, attempts)
+    elif failed:
+        # only these are sent again, so updates Mixpanel took are not repeated.
+        raise PartialDelivery(error, failed)
+    return delivered
+
+
+def deliver_operations(
+    mixpanel_key: str,
+    data_center: str | None,
+    operations: List[dict],
+    dead_letter: bool = False,
+    attempts: int = 1,
+    premium: bool = False,
+) -> int:
+    """Sends a batch of operations straight to Mixpanel, 50 messages per request.
+
+    Args:
+        mixpanel_key (str): Mixpanel key of the Project.
+        data_center (str | None): MixPanelDataCenter value of the Project.
+        operations (List[dict]): {"op": name, "payload": router payload} items.
+        dead_letter (bool, optional): store failed messages as dead letters instead of raising. Defaults to False.
+        attempts (int, optional): deliveries tried, recorded on dead letters. Defaults to 1.
+        premium (bool, optional): send on the premium delivery tier. Defaults to False.
+
+    Raises:
+        PartialDelivery: With the messages Mixpanel did not take, without dead_letter.
+
+    Returns:
+        int: number of operations delivered.
+    """
+    messages = capture_operations(mixpanel_key, data_center, operations)
+    deliver_messages(
+        mixpanel_key, data_center, messages, dead_letter, attempts, premium
+    )
+    return len(operations)
+
+
+async def run_buffered(premium: bool, fn: Callable, *args):
+    """Runs fn(*args), which buffers messages for the batcher of a tier.
+
+    When the tier spools to disk the buffering writes and fsyncs files, so
+    it runs on a thread instead of stalling every request on the event loop.
+    """
+    if tier(premium).spool is not None:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
+async def forward_operation(
+    mixpanel_key: str,
+    data_center: str | None,
+    op: str,
+    payload,
+    dead_letter: bool = False,
+    premium: bool = False,
+) -> bool:
+    """Runs one operation for an async route without blocking the event loop.
+
+    The message is captured and sent with the async transport, so a
+    confirmed caller learns whether Mixpanel took it. Calls whose failures
+    are dead-lettered have no caller waiting on them: with batching on,
+    their message is only buffered for the batcher, which dead-letters the
+    batches it cannot deliver.
+
+    Args:
+        mixpanel_key (str): Mixpanel key of the Project.
+        data_center (str | None): MixPanelDataCenter value of the Project.
+        op (str): operation name in MIXER_OPERATIONS.
+        payload (_type_): router payload, as its schema or as a dict.
+        dead_letter (bool, optional): store a message Mixpanel did not take as a dead letter instead of raising, buffering it when batching is on. Defaults to False.
+        premium (bool, optional): deliver on the premium tier. Defaults to False.
+
+    Raises:
+        MixpanelException: If Mixpanel did not take the message.
+
+    Returns:
+        bool: result of the Mixer call.
+    """
+    if dead_letter and mixer_settings.mixer_batch_enabled:
+        return await run_buffered(
+            premium,
+            run_operation,
+            Mixer(mixpanel_key, data_center, premium=premium),
+            op,
+            payload,
+        )
+
+    transport = tier(premium).transport
+    capture = CapturingConsumer()
+    result = run_operation(
+        Mixer(mixpanel_key, data_center, consumer=capture), op, payload
+    )
+    for endpoint, messages in capture.messages.items():
+        for message in messages:
+            try:
+                await transport.send(data_center, endpoint, message)
+            except MixpanelException as e:
+                if not dead_letter or dead_letter_store is None:
+                    raise
+                await asyncio.to_thread(
+                    dead_letter_store.add, mixpanel_key, endpoint, [message], str(e)
+                )
+    return result
+
+
+def parse_operation(line: bytes) -> Tuple[str, AbstractModel]:
+    """Reads one {"op": name, "payload": {...}} line.
+
+    Raises:
+        ValueError: If the line is not a known, valid operation.
+
+    Returns:
+        Tuple[str, AbstractModel]: operation name and its payload schema.
+    """
+    operation = orjson.loads(line)
+    if not isinstance(operation, dict) or operation.get("op") not in MIXER_OPERATIONS:
+        raise ValueError('expected {"op": <operation>, "payload": {...}}')
+    schema, _ = MIXER_OPERATIONS[operation["op"]]
+    return operation["op"], schema.parse_obj(operation.get("payload") or {})
+
+
+async def forward_stream(
+    mixpanel_key: str,
+    data_center: str | None,
+    lines: AsyncIterable[Tuple[int, bytes | None]],
+    max_errors: int,
+    premium: bool = False,
+    charge: Callable[[str], Awaitable[None]] | None = None,
+) -> dict:
+    """Forwards NDJSON operations one line at a time as they are read.
+
+    Args:
+        mixpanel_key (str): Mixpanel key of the Project.
+        data_center (str | None): MixPanelDataCenter value of the Project.
+        lines (AsyncIterable[Tuple[int, bytes | None]]): numbered lines, None for a line that is too long.
+        max_errors (int): line errors kept for the response.
+        premium (bool, optional): deliver on the premium tier. Defaults to False.
+        charge (Callable[[str], Awaitable[None]] | None, optional): charges the rate limit for an operation, raising QuotaExceeded when refused. Defaults to None.
+
+    Returns:
+        dict: counts of the lines and the first line errors.
+    """
+    result = {"received": 0, "sent": 0, "duplicates": 0, "failed": 0, "errors": []}
+    async for lineno, line in lines:
+        result["received"] += 1
+        try:
+            if line is None:
+                raise ValueError("line is too long")
+            op, payload = parse_operation(line)
+            if charge is not None:
+                await charge(op)
+            if op == "track" and is_repeat(
+                mixpanel_key, payload.properties, payload.insert_id
+            ):
+                result["duplicates"] += 1
+                continue
+            properties = payload.properties if op == "track" else {}
+            with forget_on_failure(mixpanel_key, properties):
+                await forward_operation(
+                    mixpanel_key, data_center, op, payload, premium=premium
+                )
+        except (ValueError, ValidationError, MixpanelException, QuotaExceeded) as e:
+            result["failed"] += 1
+            if len(result["errors"]) < max_errors:
+                result["errors"].append({"line": lineno, "error": str(e)})
+            continue
+        result["sent"] += 1
+
+    return result
+
+
+async def forward_operations(
+    mixpanel_key: str,
+    data_center: str | None,
+    operations: list,
+    dead_letter: bool = False,
+    premium: bool = False,
+) -> List[str | None]:
+    """Runs a list of operations for one Project, as forward_operation does.
+
+    The messages of all operations are sent together in concurrent requests
+    of 50; with batching on, the ones of a dead-lettered list are buffered.
+
+    Args:
+        mixpanel_key (str): Mixpanel key of the Project.
+        data_center (str | None): MixPanelDataCenter value of the Project.
+        operations (list): items of OperationList.
+        dead_letter (bool, optional): store the messages Mixpanel did not take as dead letters, buffering them when batching is on. Defaults to False.
+        premium (bool, optional): deliver on the premium tier. Defaults to False.
+
+    Returns:
+        List[str | None]: per operation, None when taken or its error.
+    """
+    errors: List[str | None] = [None] * len(operations)
+    if dead_letter and mixer_settings.mixer_batch_enabled:
+        mixer = Mixer(mixpanel_key, data_center, premium=premium)
+
+        def buffer():
+            for index, operation in enumerate(operations):
+                try:
+                    run_operation(mixer, operation.op, operation.payload)
+                except MixpanelException as e:
+                    errors[index] = str(e)
+
+        await run_buffered(premium, buffer)
+        return errors
+
+    capture = CapturingConsumer()
+    mixer = Mixer(mixpanel_key, data_center, consumer=capture)
+    # endpoint -> operation index of each captured message.
+    owners: Dict[str, List[int]] = {}
+    for index, operation in enumerate(operations):
+        counts = {e: len(m) for e, m in capture.messages.items()}
+        run_operation(mixer, operation.op, operation.payload)
+        for endpoint, messages in capture.messages.items():
+            added = len(messages) - counts.get(endpoint, 0)
+            owners.setdefault(endpoint, []).extend([index] * added)
+
+    # (endpoint, error) -> messages Mixpanel did not take.
+    failed: Dict[Tuple[str, str], List[str]] = {}
+    for endpoint, messages in capture.messages.items():
+        sent = await tier(premium).transport.send_batches(
+            data_center, endpoint, messages
+        )
+        for index, message, error in zip(owners[endpoint], messages, sent):
+            errors[index] = errors[index] or error
+            if error:
+                failed.setdefault((endpoint, error), []).append(message)
+
+    if dead_letter and dead_letter_store is not None:
+        for (endpoint, error), messages in failed.items():
+            await asyncio.to_thread(
+                dead_letter_store.add, mixpanel_key, endpoint, messages, error
+            )
+    return errors
+
+
+def replay_dead_letters(
+    project_id: int | None = None,
+    limit: int = mixer_settings.mixer_dead_letter_replay_limit,
+    rate: float = mixer_settings.mixer_dead_letter_replay_rate,
+) -> dict:
+    """Re-sends the oldest dead letters to Mixpanel, 50 messages per request.
+
+    Delivered dead letters are deleted; the others keep the new error and
+    one more attempt. Replays go out on the freemium delivery tier, leaving
+    the premium one to live traffic.
+
+    Args:
+        project_id (int | None, optional): only this Project's. Defaults to None.
+        limit (int, optional): most dead letters replayed. Defaults to MIXER_DEAD_LETTER_REPLAY_LIMIT.
+        rate (float, optional): most requests per second, 0 for no limit. Defaults to MIXER_DEAD_LETTER_REPLAY_RATE.
+
+    Returns:
+        dict: counts of the replayed, sent and failed dead letters.
+    """
+    repo = dead_letter_store.repo
+    rows = repo.get_dead_letters(project_id, limit)
+
+    # (data_center, endpoint) -> rows, keeping the order they failed in.
+    groups: Dict[Tuple[str | None, str], list] = {}
+    for row in rows:
+        groups.setdefault((row.data_center, row.endpoint), []).append(row)
+
+    result = {"replayed": len(rows), "sent": 0, "failed": 0}
+    interval = 1 / rate if rate else 0.0
+    due = time.monotonic()
+    for (data_center, endpoint), group in groups.items():
+        for start in range(0, len(group), MIXPANEL_MAX_BATCH):
+            batch = group[start : start + MIXPANEL_MAX_BATCH]
+            time.sleep(max(0.0, due - time.monotonic()))
+            due = max(due, time.monotonic()) + interval
+
+            ids = [row.id for row in batch]
+            # a batch of 50 is sent in one request, so its messages share the error.
+            error = send_batches(data_center, endpoint, [row.message for row in batch])[
+                0
+            ]
+            if error:
+                repo.fail_dead_letters(ids, error)
+                result["failed"] += len(batch)
+            else:
+                repo.delete_dead_letters(ids)
+                result["sent"] += len(batch)
+
+    metrics.incr("mixer_dead_letters_replayed", result["sent"], outcome="sent")
+    metrics.incr("mixer_dead_letters_replayed", result["failed"], outcome="failed")
+    return result
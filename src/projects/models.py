@@ -1,5 +1,16 @@
 from src.app.utils.models_utils import AbstractModel
-from sqlalchemy import Column, String, Boolean, Integer, ForeignKey, text
+from sqlalchemy import (
+    TIMESTAMP,
+    Column,
+    String,
+    Boolean,
+    Integer,
+    ForeignKey,
+    Text,
+    UniqueConstraint,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from src.organization.models import Organization
 
@@ -17,6 +28,9 @@ class Project(AbstractModel):
     mixpanel_key = Column(String, nullable=True)
 
     is_premium = Column(Boolean, server_default=text("false"))
+    quota_plan_id = Column(
+        Integer, ForeignKey("quota_plans.id", ondelete="SET NULL"), nullable=True
+    )
     created_by = Column(
         Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True
     )
@@ -25,6 +39,20 @@ class Project(AbstractModel):
     pj_rate = relationship("ProjectRateLimit", back_populates="project")
 
 
+class QuotaPlan(AbstractModel):
+    """Rate limit of the freemium projects it is assigned to, directly or
+    through their organization."""
+
+    __tablename__ = "quota_plans"
+
+    name = Column(String, nullable=False, unique=True)
+    hourly_limit = Column(Integer, nullable=False)
+    # most units in a burst window, 0 for no burst limit.
+    burst = Column(Integer, nullable=False, server_default=text("0"))
+    # units an operation spends, by operation name; 1 when not listed.
+    weights = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+
+
 class ProjectRateLimit(AbstractModel):
     __tablename__ = "project_rate_limit"
 
@@ -33,3 +61,29 @@ class ProjectRateLimit(AbstractModel):
     )
     count = Column(Integer, nullable=False, default=0)
     project = relationship("Project")
+
+
+class ProjectRateBucket(AbstractModel):
+    """Calls of a Project in one hour, counted in place."""
+
+    __tablename__ = "project_rate_buckets"
+    __table_args__ = (UniqueConstraint("project_id", "hour_bucket"),)
+
+    project_id = Column(
+        Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False
+    )
+    hour_bucket = Column(TIMESTAMP(timezone=True), nullable=False)
+    count = Column(Integer, nullable=False, server_default=text("0"))
+
+
+class DeadLetter(AbstractModel):
+    __tablename__ = "dead_letters"
+
+    project_id = Column(
+        Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False
+    )
+    endpoint = Column(String, nullable=False)
+    message = Column(Text, nullable=False)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, server_default=text("1"))
+    project = relationship("Project")
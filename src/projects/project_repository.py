@@ -1,9 +1,19 @@
-from datetime import datetime, timedelta
+import threading
+from datetime import timedelta
+from typing import Dict, List
 
-from sqlalchemy import or_
+from sqlalchemy import bindparam, delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
 
 from src.app.utils.base_repository import BaseRepo
-from src.projects.models import Project, ProjectRateLimit
+from src.organization.models import Organization
+from src.projects.models import (
+    DeadLetter,
+    Project,
+    ProjectRateBucket,
+    ProjectRateLimit,
+    QuotaPlan,
+)
 
 
 class ProjectRepository(BaseRepo):
@@ -136,49 +146,77 @@ class ProjectRateRepo(BaseRepo):
             self.base_query().filter(ProjectRateLimit.project_id == project_id).first()
         )
 
-    def get_project_hour(self, project_id):
-        """Return Project RateLimit based on the current hour
+    def hit_project_hour(
+        self, project_id: int, limit: int, cost: int = 1
+    ) -> int | None:
+        """Count a call of a Project in the bucket of the current hour, if the
+        Project is under its limit.
+
+        Checked and counted in one upsert, so concurrent calls cannot lose
+        an update or overshoot the limit. It runs on a connection of its own
+        as requests check their rate from many threads.
 
         Args:
-            project_id (_type_): Project Id
+            project_id (int): Project id.
+            limit (int): calls allowed in an hour.
+            cost (int, optional): units of the limit the call spends. Defaults to 1.
 
         Returns:
-            _type_: Project Rate Limit instance
+            int | None: calls of the hour with this one, None when over the limit.
         """
-        return (
-            self.base_query()
-            .filter(
-                ProjectRateLimit.project_id == project_id,
-                or_(
-                    ProjectRateLimit.date_updated <= datetime.now(),
-                    ProjectRateLimit.date_updated > datetime.now() - timedelta(hours=1),
-                ),
+        if cost > limit:
+            return None
+        hour = func.date_trunc("hour", func.now())
+        upsert = (
+            insert(ProjectRateBucket)
+            .values(project_id=project_id, hour_bucket=hour, count=cost)
+            .on_conflict_do_update(
+                index_elements=[
+                    ProjectRateBucket.project_id,
+                    ProjectRateBucket.hour_bucket,
+                ],
+                set_={
+                    "count": ProjectRateBucket.count + cost,
+                    "date_updated": func.now(),
+                },
+                where=ProjectRateBucket.count + cost <= limit,
             )
-            .first()
+            .returning(ProjectRateBucket.count)
         )
+        with self.db.get_bind().begin() as conn:
+            row = conn.execute(upsert).first()
+        return row[0] if row else None
 
-    def update_pj_rate_base_hour(self, pj_rate: ProjectRateLimit):
-        """Reverting project Rate Limit back to the hour default
-
-        Args:
-            pj_rate (ProjectRateLimit): SQLAlchemy Object instance
+    def get_hour_counts(self) -> Dict[int, int]:
+        """Calls of the current hour of every Project that made one.
 
         Returns:
-            _type_: True when done successfully updated.
+            Dict[int, int]: project id -> count.
         """
-        pj_rate.count = 0
+        hour = func.date_trunc("hour", func.now())
+        with self.db.get_bind().connect() as conn:
+            rows = conn.execute(
+                select(ProjectRateBucket.project_id, ProjectRateBucket.count).where(
+                    ProjectRateBucket.hour_bucket == hour
+                )
+            )
+            return dict(rows.all())
 
-        self.db.commit()
-        self.db.refresh(pj_rate)
-        return True
+    def prune_buckets(self, hours: int) -> int:
+        """Delete the hour buckets older than some hours, in one statement.
 
-    def get_all_pj_rate(self):
-        """Returns all Project Rate Limit data.
+        Args:
+            hours (int): hours of buckets kept, the current one included.
 
         Returns:
-            _type_: Project Rate Limit for all
+            int: number of buckets deleted.
         """
-        return self.base_query().all()
+        oldest = func.date_trunc("hour", func.now()) - timedelta(hours=hours - 1)
+        pruned = self.db.execute(
+            delete(ProjectRateBucket).where(ProjectRateBucket.hour_bucket < oldest)
+        )
+        self.db.commit()
+        return pruned.rowcount
 
     def create_project_rate(self, new_project_rate: dict) -> ProjectRateLimit:
         """Create Project Rate Limit
@@ -195,6 +233,25 @@ class ProjectRateRepo(BaseRepo):
         self.db.refresh(new_pj_rate)
         return new_pj_rate
 
+    def persist_counts(self, counts: Dict[int, int]):
+        """Store the counts of a rate limiter, 0 for the projects it has none for.
+
+        Args:
+            counts (Dict[int, int]): project id -> calls in the window.
+        """
+        reset = update(ProjectRateLimit).values(count=0, date_updated=func.now())
+        if counts:
+            reset = reset.where(ProjectRateLimit.project_id.not_in(list(counts)))
+        self.db.execute(reset.where(ProjectRateLimit.count != 0))
+        if counts:
+            self.db.execute(
+                update(ProjectRateLimit)
+                .where(ProjectRateLimit.project_id == bindparam("pid"))
+                .values(count=bindparam("pj_count"), date_updated=func.now()),
+                [{"pid": pid, "pj_count": count} for pid, count in counts.items()],
+            )
+        self.db.commit()
+
     def update_project_rate(self, project_rate: ProjectRateLimit) -> ProjectRateLimit:
         """Updating project Rate Limit
 
@@ -209,5 +266,244 @@ class ProjectRateRepo(BaseRepo):
         return project_rate
 
 
+class DeadLetterRepo(BaseRepo):
+    """Dead Letter ORM
+
+    Dead letters are written from delivery threads and workers, so the
+    session is only used under a lock.
+
+    Args:
+        BaseRepo (_type_): Inhert the DB instance
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+
+    def base_query(self):
+        """Base Table query
+
+        Returns:
+            _type_: Table query
+        """
+        return self.db.query(DeadLetter)
+
+    def get_project_id(self, mixpanel_key: str) -> int | None:
+        """Id of the Project using a Mixpanel key.
+
+        Args:
+            mixpanel_key (str): Mixpanel key of the Project.
+
+        Returns:
+            int | None: Project id if any.
+        """
+        with self.lock:
+            row = (
+                self.db.query(Project.id)
+                .filter(Project.mixpanel_key == mixpanel_key)
+                .order_by(Project.id)
+                .first()
+            )
+        return row[0] if row else None
+
+    def create_dead_letters(self, dead_letters: List[dict]):
+        """Store dead letters in one statement.
+
+        Args:
+            dead_letters (List[dict]): DeadLetter data.
+        """
+        with self.lock:
+            try:
+                self.db.bulk_insert_mappings(DeadLetter, dead_letters)
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                raise
+
+    def get_dead_letters(
+        self, project_id: int | None = None, limit: int = 1000
+    ) -> List[tuple]:
+        """Oldest dead letters, with the data center of their Project.
+
+        Args:
+            project_id (int | None, optional): only this Project's. Defaults to None.
+            limit (int, optional): most rows returned. Defaults to 1000.
+
+        Returns:
+            List[tuple]: (id, project_id, data_center, endpoint, message) rows.
+        """
+        with self.lock:
+            query = self.db.query(
+                DeadLetter.id,
+                DeadLetter.project_id,
+                Project.data_center,
+                DeadLetter.endpoint,
+                DeadLetter.message,
+            ).join(Project, Project.id == DeadLetter.project_id)
+            if project_id is not None:
+                query = query.filter(DeadLetter.project_id == project_id)
+            rows = query.order_by(DeadLetter.id).limit(limit).all()
+            self.db.commit()
+        return rows
+
+    def delete_dead_letters(self, ids: List[int]):
+        """Delete dead letters once they are delivered.
+
+        Args:
+            ids (List[int]): DeadLetter ids.
+        """
+        with self.lock:
+            self.base_query().filter(DeadLetter.id.in_(ids)).delete(
+                synchronize_session=False
+            )
+            self.db.commit()
+
+    def fail_dead_letters(self, ids: List[int], error: str):
+        """Count another failed attempt of dead letters.
+
+        Args:
+            ids (List[int]): DeadLetter ids.
+            error (str): error of the attempt.
+        """
+        with self.lock:
+            self.base_query().filter(DeadLetter.id.in_(ids)).update(
+                {
+                    DeadLetter.attempts: DeadLetter.attempts + 1,
+                    DeadLetter.error: error,
+                    DeadLetter.date_updated: func.now(),
+                },
+                synchronize_session=False,
+            )
+            self.db.commit()
+
+    def count_dead_letters(self, project_id: int | None = None) -> int:
+        """Number of dead letters, of one Project or all."""
+        with self.lock:
+            query = self.db.query(func.count(DeadLetter.id))
+            if project_id is not None:
+                query = query.filter(DeadLetter.project_id == project_id)
+            count = query.scalar()
+            self.db.commit()
+        return count
+
+
+class QuotaPlanRepo(BaseRepo):
+    """Quota Plan ORM
+
+    Plans are read by the plan cache from its reloading thread, so the
+    session is only used under a lock.
+
+    Args:
+        BaseRepo (_type_): Inhert the DB instance
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+
+    def base_query(self):
+        """Base Table query
+
+        Returns:
+            _type_: Table query
+        """
+        return self.db.query(QuotaPlan)
+
+    def get_plans(self) -> List[tuple]:
+        """Every Quota Plan.
+
+        Returns:
+            List[tuple]: (id, name, hourly_limit, burst, weights) rows by name.
+        """
+        with self.lock:
+            try:
+                return (
+                    self.db.query(
+                        QuotaPlan.id,
+                        QuotaPlan.name,
+                        QuotaPlan.hourly_limit,
+                        QuotaPlan.burst,
+                        QuotaPlan.weights,
+                    )
+                    .order_by(QuotaPlan.name)
+                    .all()
+                )
+            finally:
+                # the next read sees the plans as they are by then.
+                self.db.rollback()
+
+    def get_org_plans(self) -> Dict[int, int]:
+        """Organizations assigned a Quota Plan.
+
+        Returns:
+            Dict[int, int]: organization id -> quota plan id.
+        """
+        with self.lock:
+            try:
+                rows = (
+                    self.db.query(Organization.id, Organization.quota_plan_id)
+                    .filter(Organization.quota_plan_id.is_not(None))
+                    .all()
+                )
+            finally:
+                self.db.rollback()
+        return dict(rows)
+
+    def save_plan(
+        self, name: str, hourly_limit: int, burst: int, weights: Dict[str, int]
+    ) -> QuotaPlan:
+        """Create a Quota Plan, or update the one of that name.
+
+        Args:
+            name (str): Quota Plan name.
+            hourly_limit (int): calls allowed in an hour.
+            burst (int): most units in a burst window, 0 for no burst limit.
+            weights (Dict[str, int]): units an operation spends.
+
+        Returns:
+            QuotaPlan: DB record of Quota Plan.
+        """
+        with self.lock:
+            plan = self.base_query().filter(QuotaPlan.name == name).first()
+            if plan is None:
+                plan = QuotaPlan(name=name)
+                self.db.add(plan)
+            plan.hourly_limit = hourly_limit
+            plan.burst = burst
+            plan.weights = weights
+            plan.date_updated = func.now()
+            self.db.commit()
+            self.db.refresh(plan)
+            return plan
+
+    def assign_plan(
+        self,
+        plan_id: int | None,
+        project_id: int | None = None,
+        org_id: int | None = None,
+    ) -> int:
+        """Assign a Quota Plan to a Project or an Organization, None to unassign.
+
+        Args:
+            plan_id (int | None): Quota Plan id.
+            project_id (int | None, optional): Project id. Defaults to None.
+            org_id (int | None, optional): Organization id. Defaults to None.
+
+        Returns:
+            int: number of records assigned.
+        """
+        model, record_id = (
+            (Project, project_id) if org_id is None else (Organization, org_id)
+        )
+        with self.lock:
+            assigned = self.db.execute(
+                update(model).where(model.id == record_id).values(quota_plan_id=plan_id)
+            )
+            self.db.commit()
+        return assigned.rowcount
+
+
 project_repo = ProjectRepository()
 pj_rate_repo = ProjectRateRepo()
+dead_letter_repo = DeadLetterRepo()
+quota_plan_repo = QuotaPlanRepo()
@@ -1,15 +1,227 @@
-from fastapi import APIRouter, Depends, Header, HTTPException, status
+import json
+from typing import List, Tuple
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+
+from starlette.concurrency import run_in_threadpool
 
-from src.app.utils.mixers import Mixer
+from src.app.celery_jobs import operation_batcher
+from src.app.config import mixer_settings
+from src.app.utils.admission import in_flight
+from src.app.utils.dedup import forget_on_failure, forget_repeat, is_repeat
+from src.app.utils.encoding import ORJSONRoute
+from src.app.utils.ndjson import iter_lines
+from src.app.utils.tiers import tier
 from src.auth.oauth import get_current_user
 from src.permissions.org_permissions import test_permission
 from src.projects import models, project_service, schemas
-from src.projects.mixer_handler import project_rate_header
+from src.projects.mixer_handler import (
+    charge_operations,
+    charges,
+    project_in_flight,
+    respond_async,
+    throttle,
+)
+from src.projects.mixer_ops import (
+    OPERATION_MODELS,
+    OperationList,
+    forward_operation,
+    forward_operations,
+    forward_stream,
+)
 
 project_service = project_service.project_service
 
 
-project_router = APIRouter(prefix="/api/v1/project", tags={"Org Projects on Mixer"})
+project_router = APIRouter(
+    prefix="/api/v1/project", tags={"Org Projects on Mixer"}, route_class=ORJSONRoute
+)
+
+# answer for an event whose $insert_id was already forwarded.
+DUPLICATE_EVENT = {
+    "message": "Duplicate event was already sent to Mix Pannel",
+    "status": status.HTTP_200_OK,
+}
+
+
+async def in_flight_delivery(project_id: int, fn, *args):
+    """Awaits fn(*args) holding an in-flight slot of the Project, so queued
+    deliveries count towards its upstream concurrency like confirmed calls."""
+    async with in_flight.held(project_id):
+        return await fn(*args)
+
+
+def enqueue(project: models.Project, fn, *args):
+    """Queues fn(*args) on the in-process delivery queue of the Project tier.
+
+    Raises:
+        HTTPException: If the delivery queue cannot take the call.
+    """
+    queue = tier(project.is_premium).delivery_queue
+    if not queue.submit(in_flight_delivery, project.id, fn, *args):
+        raise HTTPException(
+            detail="Delivery queue is full, retry later",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+
+
+def operation_key(project: models.Project) -> tuple:
+    """operation_batcher buffer of a Project, kept apart per delivery tier."""
+    return (project.mixpanel_key, project.data_center, tier(project.is_premium).name)
+
+
+async def forward_list(
+    response: Response,
+    project: models.Project,
+    operations: list,
+    accept_async: bool,
+) -> Tuple[List[str | None], int]:
+    """Forwards a list of typed operations as /ops/ does.
+
+    The rate limit of the project is charged the weights of all operations
+    first. Events repeating an `$insert_id` are skipped. The others are
+    handed over for delivery, or sent and reported on when the request is
+    confirmed.
+
+    Args:
+        response (Response): Response of the route.
+        project (models.Project): Project of the Mixer-Key.
+        operations (list): items of OperationList.
+        accept_async (bool): hand the operations over and answer 202 Accepted.
+
+    Raises:
+        HTTPException: If the quota of the project is spent, or the delivery queue cannot take the operations.
+
+    Returns:
+        Tuple[List[str | None], int]: per operation None or its error, and the status of the taken ones.
+    """
+    # the rate limit may read Redis or the DB, so it runs off the loop.
+    await run_in_threadpool(
+        throttle, charge_operations, project, [o.op for o in operations]
+    )
+
+    taken = status.HTTP_200_OK
+    errors = [None] * len(operations)
+    duplicate = [
+        operation.op == "track"
+        and is_repeat(
+            project.mixpanel_key,
+            operation.payload.properties,
+            operation.payload.insert_id,
+        )
+        for operation in operations
+    ]
+    forward = [o for o, repeat in zip(operations, duplicate) if not repeat]
+
+    def forget(failed: list):
+        # a retry of an event that was not taken is not a repeat.
+        for operation in failed:
+            if operation.op == "track":
+                forget_repeat(project.mixpanel_key, operation.payload.properties)
+
+    try:
+        if accept_async:
+            taken = response.status_code = status.HTTP_202_ACCEPTED
+            if mixer_settings.mixer_delivery_backend == "celery":
+                for operation in forward:
+                    operation_batcher.send(
+                        operation_key(project),
+                        json.dumps(
+                            {"op": operation.op, "payload": operation.payload.dict()}
+                        ),
+                    )
+            else:
+                enqueue(
+                    project,
+                    forward_operations,
+                    project.mixpanel_key,
+                    project.data_center,
+                    forward,
+                    True,
+                    project.is_premium,
+                )
+        else:
+            sent = iter(
+                await forward_operations(
+                    project.mixpanel_key,
+                    project.data_center,
+                    forward,
+                    premium=project.is_premium,
+                )
+            )
+            errors = [None if repeat else next(sent) for repeat in duplicate]
+    except BaseException:
+        forget(forward)
+        raise
+    forget([o for o, error in zip(operations, errors) if error])
+    return errors, taken
+
+
+def list_message(errors: List[str | None], taken: int, items: str) -> str:
+    """Message of a list forwarded by forward_list.
+
+    Args:
+        errors (List[str | None]): per item None or its error.
+        taken (int): status of the taken items.
+        items (str): what the list holds, e.g. "events".
+
+    Returns:
+        str: how many items were sent, or only queued when answering 202.
+    """
+    count = f"{errors.count(None)} of {len(errors)} {items}"
+    if taken == status.HTTP_202_ACCEPTED:
+        # nothing was sent yet: the items are only queued for delivery.
+        return f"{count} accepted for delivery to Mix Pannel"
+    return f"{count} sent successfully to Mix Pannel"
+
+
+def accepted(response: Response, project: models.Project, op: str, event) -> dict:
+    """Hands an operation over for delivery and answers with 202 Accepted.
+
+    Operations go to the in-process delivery queue, or to the Celery
+    delivery workers when MIXER_DELIVERY_BACKEND is "celery".
+
+    Args:
+        response (Response): Response of the route.
+        project (models.Project): Project of the Mixer-Key.
+        op (str): operation name in MIXER_OPERATIONS.
+        event (_type_): router payload.
+
+    Raises:
+        HTTPException: If the delivery queue cannot take the operation.
+
+    Returns:
+        dict: Response Model
+    """
+    if mixer_settings.mixer_delivery_backend == "celery":
+        operation = json.dumps({"op": op, "payload": event.dict()})
+        operation_batcher.send(operation_key(project), operation)
+    else:
+        enqueue(
+            project,
+            forward_operation,
+            project.mixpanel_key,
+            project.data_center,
+            op,
+            event,
+            True,
+            project.is_premium,
+        )
+
+    response.status_code = status.HTTP_202_ACCEPTED
+    return {
+        "message": "Accepted for delivery to Mix Pannel",
+        "status": status.HTTP_202_ACCEPTED,
+    }
 
 
 @project_router.post(
@@ -122,28 +334,74 @@ def update_project(
     return resp
 
 
+@project_router.post(
+    "/org/{org_slug}/{slug}/dead-letters/replay/",
+    status_code=status.HTTP_200_OK,
+    response_model=schemas.MessageDeadLetterReplayResp,
+)
+def replay_dead_letters(
+    org_slug: str,
+    slug: str,
+    limit: int = Query(mixer_settings.mixer_dead_letter_replay_limit, gt=0),
+    rate: float = Query(mixer_settings.mixer_dead_letter_replay_rate, ge=0),
+    current_user: dict = Depends(test_permission),
+):
+    """Re-send the operations of a Project that Mix Pannel did not take.
+
+    Args:
+        org_slug (str): Organization slug
+        slug (str): Project Slug
+        limit (int): most dead letters replayed by this call.
+        rate (float): most requests per second to Mix Pannel, 0 for no limit.
+        current_user (dict): _description_. Defaults to Depends(test_permission).
+
+    Returns:
+        _type_: Response Model
+    """
+    resp = project_service.replay_dead_letters(org_slug, slug, limit, rate)
+    return resp
+
+
 @project_router.post(
     "/events/mixpanel/",
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def single_event(
-    event: schemas.SingleEvent, project: dict = Depends(project_rate_header)
+@charges("track")
+async def single_event(
+    event: schemas.SingleEvent,
+    response: Response,
+    project: dict = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.track_single_event(event.distinct_id, event.event)
+    event = schemas.EventProp(**event.dict(), properties={})
+    if is_repeat(project.mixpanel_key, event.properties, event.insert_id):
+        return DUPLICATE_EVENT
+
+    # a retry of an event that was not taken is not a repeat.
+    with forget_on_failure(project.mixpanel_key, event.properties):
+        if accept_async:
+            return accepted(response, project, "track", event)
+
+        bool = await forward_operation(
+            project.mixpanel_key,
+            project.data_center,
+            "track",
+            event,
+            premium=project.is_premium,
+        )
 
-    resp = {
-        "message": "event sent successfully to Mix Pannel",
-        "status": status.HTTP_200_OK,
-    }
+        resp = {
+            "message": "event sent successfully to Mix Pannel",
+            "status": status.HTTP_200_OK,
+        }
 
-    if not bool:
-        raise HTTPException(
-            detail="Event was not sent successfully",
-            status_code=status.HTTP_400_BAD_REQUEST,
-        )
+        if not bool:
+            raise HTTPException(
+                detail="Event was not sent successfully",
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
 
     return resp
 
@@ -153,24 +411,193 @@ def single_event(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def event_props(
-    event: schemas.EventProp, project: models.Project = Depends(project_rate_header)
+@charges("track")
+async def event_props(
+    event: schemas.EventProp,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
+):
+
+    if is_repeat(project.mixpanel_key, event.properties, event.insert_id):
+        return DUPLICATE_EVENT
+
+    # a retry of an event that was not taken is not a repeat.
+    with forget_on_failure(project.mixpanel_key, event.properties):
+        if accept_async:
+            return accepted(response, project, "track", event)
+
+        bool = await forward_operation(
+            project.mixpanel_key,
+            project.data_center,
+            "track",
+            event,
+            premium=project.is_premium,
+        )
+
+        resp = {
+            "message": "event sent successfully to Mix Pannel",
+            "status": status.HTTP_200_OK,
+        }
+
+        if not bool:
+            raise HTTPException(
+                detail="Event was not sent successfully",
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+
+    return resp
+
+
+@project_router.post(
+    "/events/mixpanel/batch/",
+    status_code=status.HTTP_200_OK,
+    response_model=schemas.MessageEventBatchResp,
+)
+@charges(None)
+async def event_batch(
+    events: schemas.EventBatch,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
+    """Send a batch of events to Mix Pannel in one call.
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.track_events(event.distinct_id, event.event, event.properties)
+    The rate limit is charged the weight of "track" for each event, and the
+    events are forwarded as the track operations of /ops/ are.
+
+    Args:
+        events (schemas.EventBatch): EventProp items.
+        response (Response): Response of the route.
+        project (models.Project): Defaults to Depends(project_in_flight).
+        accept_async (bool): Defaults to Depends(respond_async).
+
+    Returns:
+        _type_: Response Model with a result per event.
+    """
+    track = OPERATION_MODELS["track"]
+    operations = [track.construct(op="track", payload=e) for e in events.__root__]
+    errors, taken = await forward_list(response, project, operations, accept_async)
+
+    results = []
+    for index, error in enumerate(errors):
+        results.append(
+            {
+                "index": index,
+                "status": status.HTTP_502_BAD_GATEWAY if error else taken,
+                "error": error,
+            }
+        )
 
     resp = {
-        "message": "event sent successfully to Mix Pannel",
-        "status": status.HTTP_200_OK,
+        "message": list_message(errors, taken, "events"),
+        "data": results,
+        "status": taken,
     }
+    return resp
 
-    if not bool:
+
+@project_router.post(
+    "/ops/",
+    status_code=status.HTTP_200_OK,
+    response_model=schemas.MessageOperationsResp,
+)
+@charges(None)
+async def run_operations(
+    operations: OperationList,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
+):
+    """Send a list of typed operations to Mix Pannel in one call.
+
+    Each item is {"op": ..., "payload": ...} for any operation of
+    MIXER_OPERATIONS; auth and project lookup are paid once for the whole
+    list, and the rate limit is charged the weight of each operation.
+
+    Args:
+        operations (OperationList): typed operations, in order.
+        response (Response): Response of the route.
+        project (models.Project): Defaults to Depends(project_in_flight).
+        accept_async (bool): Defaults to Depends(respond_async).
+
+    Returns:
+        _type_: Response Model with a result per operation.
+    """
+    operations = operations.__root__
+    errors, taken = await forward_list(response, project, operations, accept_async)
+
+    results = []
+    for index, (operation, error) in enumerate(zip(operations, errors)):
+        results.append(
+            {
+                "index": index,
+                "op": operation.op,
+                "status": status.HTTP_502_BAD_GATEWAY if error else taken,
+                "error": error,
+            }
+        )
+
+    resp = {
+        "message": list_message(errors, taken, "operations"),
+        "data": results,
+        "status": taken,
+    }
+    return resp
+
+
+@project_router.post(
+    "/events/mixpanel/stream/",
+    status_code=status.HTTP_200_OK,
+    response_model=schemas.MessageStreamResp,
+)
+@charges(None)
+async def stream_operations(
+    request: Request,
+    project: models.Project = Depends(project_in_flight),
+):
+    """Forward an application/x-ndjson body of operations, one per line.
+
+    Each line is an {"op": ..., "payload": ...} operation of MIXER_OPERATIONS
+    and is forwarded as soon as it is read, so the body is never held in
+    memory. The rate limit is charged the weight of each line as it is read;
+    lines over the quota fail.
+
+    Args:
+        request (Request): NDJSON body.
+        project (models.Project): Defaults to Depends(project_in_flight).
+
+    Raises:
+        HTTPException: If the body is not NDJSON.
+
+    Returns:
+        _type_: Response Model with the line counts.
+    """
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("application/x-ndjson"):
         raise HTTPException(
-            detail="Event was not sent successfully",
-            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Content-Type must be application/x-ndjson",
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
         )
 
+    async def charge(op: str):
+        await run_in_threadpool(charge_operations, project, [op])
+
+    lines = iter_lines(request.stream(), mixer_settings.mixer_stream_max_line_bytes)
+    result = await forward_stream(
+        project.mixpanel_key,
+        project.data_center,
+        lines,
+        mixer_settings.mixer_stream_max_errors,
+        premium=project.is_premium,
+        charge=charge,
+    )
+
+    resp = {
+        "message": f"{result['sent']} of {result['received']} operations sent to Mix Pannel",
+        "data": result,
+        "status": status.HTTP_200_OK,
+    }
     return resp
 
 
@@ -179,12 +606,24 @@ def event_props(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def update_distinct_id(
-    event: schemas.Alias, project: models.Project = Depends(project_rate_header)
+@charges("alias")
+async def update_distinct_id(
+    event: schemas.Alias,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.create_alias(event.distinct_id, event.new_id)
+    if accept_async:
+        return accepted(response, project, "alias", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "alias",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "Alias updated successfully to Mix Pannel",
@@ -231,12 +670,24 @@ def update_distinct_id(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def create_people_props(
-    event: schemas.PeopleProp, project: models.Project = Depends(project_rate_header)
+@charges("people_set")
+async def create_people_props(
+    event: schemas.PeopleProp,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.people_prop(event.distinct_id, event)
+    if accept_async:
+        return accepted(response, project, "people_set", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "people_set",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "People Props was created successfully in Mix Pannel",
@@ -257,12 +708,24 @@ def create_people_props(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def set_people_prop_once(
-    event: schemas.PeopleProp_, project: models.Project = Depends(project_rate_header)
+@charges("people_set_once")
+async def set_people_prop_once(
+    event: schemas.PeopleProp_,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.people_set_(event.distinct_id, event.data)
+    if accept_async:
+        return accepted(response, project, "people_set_once", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "people_set_once",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "People Prop set once in Mix Pannel",
@@ -283,12 +746,24 @@ def set_people_prop_once(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def increment_people_prop(
-    event: schemas.PeopleProp_, project: models.Project = Depends(project_rate_header)
+@charges("increment")
+async def increment_people_prop(
+    event: schemas.PeopleProp_,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.increment_people(event.distinct_id, event.data)
+    if accept_async:
+        return accepted(response, project, "increment", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "increment",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "People Prop was incremented successfully in Mix Pannel",
@@ -309,12 +784,24 @@ def increment_people_prop(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def append_people_prop(
-    event: schemas.PeopleProp_, project: models.Project = Depends(project_rate_header)
+@charges("append")
+async def append_people_prop(
+    event: schemas.PeopleProp_,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.append_to_people(event.distinct_id, event.data)
+    if accept_async:
+        return accepted(response, project, "append", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "append",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "People Prop of Array was Appended to successfully in Mix Pannel",
@@ -335,12 +822,24 @@ def append_people_prop(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def union_people_prop(
-    event: schemas.PeopleUnion, project: models.Project = Depends(project_rate_header)
+@charges("union")
+async def union_people_prop(
+    event: schemas.PeopleUnion,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.union_people(event.distinct_id, event.data)
+    if accept_async:
+        return accepted(response, project, "union", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "union",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "People Prop of Array was added successfully in Mix Pannel",
@@ -361,12 +860,24 @@ def union_people_prop(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def unset_people_prop(
-    event: schemas.PeopleUnset, project: models.Project = Depends(project_rate_header)
+@charges("unset")
+async def unset_people_prop(
+    event: schemas.PeopleUnset,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.unset_people(event.distinct_id, event.prop)
+    if accept_async:
+        return accepted(response, project, "unset", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "unset",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "People Prop removed successfully in Mix Pannel",
@@ -387,12 +898,24 @@ def unset_people_prop(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def remove_people_prop(
-    event: schemas.PeopleProp_, project: models.Project = Depends(project_rate_header)
+@charges("remove")
+async def remove_people_prop(
+    event: schemas.PeopleProp_,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.remove_people_prop(event.distinct_id, event.data)
+    if accept_async:
+        return accepted(response, project, "remove", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "remove",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "People Prop removed successfully in Mix Pannel",
@@ -413,12 +936,24 @@ def remove_people_prop(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def delete_people_prop(
-    event: schemas.Distinct, project: models.Project = Depends(project_rate_header)
+@charges("delete")
+async def delete_people_prop(
+    event: schemas.Distinct,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.delete_people(event.distinct_id)
+    if accept_async:
+        return accepted(response, project, "delete", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "delete",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "Person deleted successfully in Mix Pannel",
@@ -439,12 +974,24 @@ def delete_people_prop(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def charge_people_prop(
-    event: schemas.ChargePeople, project: models.Project = Depends(project_rate_header)
+@charges("charge")
+async def charge_people_prop(
+    event: schemas.ChargePeople,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.charge_people(event.distinct_id, event.amount, event.data)
+    if accept_async:
+        return accepted(response, project, "charge", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "charge",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "Person Charged successfully in Mix Pannel",
@@ -465,12 +1012,24 @@ def charge_people_prop(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def clear_people_charge(
-    event: schemas.Distinct, project: models.Project = Depends(project_rate_header)
+@charges("clear_charges")
+async def clear_people_charge(
+    event: schemas.Distinct,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.clear_people_charge(event.distinct_id)
+    if accept_async:
+        return accepted(response, project, "clear_charges", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "clear_charges",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "Person charge cleared successfully in Mix Pannel",
@@ -491,12 +1050,24 @@ def clear_people_charge(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def create_group(
-    event: schemas.GroupProp, project: models.Project = Depends(project_rate_header)
+@charges("group_set")
+async def create_group(
+    event: schemas.GroupProp,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.set_group(event.group_key, event.group_id, event.data)
+    if accept_async:
+        return accepted(response, project, "group_set", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "group_set",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "Group Profile created successfully in Mix Pannel",
@@ -517,12 +1088,24 @@ def create_group(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def create_group_once(
-    event: schemas.GroupProp, project: models.Project = Depends(project_rate_header)
+@charges("group_set_once")
+async def create_group_once(
+    event: schemas.GroupProp,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.set_group_(event.group_key, event.group_id, event.data)
+    if accept_async:
+        return accepted(response, project, "group_set_once", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "group_set_once",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "Group Profile Prop set once successfully in Mix Pannel",
@@ -543,12 +1126,24 @@ def create_group_once(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def group_union(
-    event: schemas.GroupProp, project: models.Project = Depends(project_rate_header)
+@charges("group_union")
+async def group_union(
+    event: schemas.GroupProp,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.union_group(event.group_key, event.group_id, event.data)
+    if accept_async:
+        return accepted(response, project, "group_union", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "group_union",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "Group Profile merged successfully in Mix Pannel",
@@ -569,12 +1164,24 @@ def group_union(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def group_unset(
-    event: schemas.GroupUnset, project: models.Project = Depends(project_rate_header)
+@charges("group_unset")
+async def group_unset(
+    event: schemas.GroupUnset,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.unset_group(event.group_key, event.group_id, event.property)
+    if accept_async:
+        return accepted(response, project, "group_unset", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "group_unset",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "Group Props removed successfully in Mix Pannel",
@@ -595,12 +1202,24 @@ def group_unset(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def group_remove(
-    event: schemas.GroupProp, project: models.Project = Depends(project_rate_header)
+@charges("group_remove")
+async def group_remove(
+    event: schemas.GroupProp,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.remove_group(event.group_key, event.group_id, event.data)
+    if accept_async:
+        return accepted(response, project, "group_remove", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "group_remove",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "Group Prop removed successfully in Mix Pannel",
@@ -621,12 +1240,24 @@ def group_remove(
     status_code=status.HTTP_200_OK,
     response_model=schemas.ResponseModel,
 )
-def delete_group(
-    event: schemas.BaseGroup, project: models.Project = Depends(project_rate_header)
+@charges("group_delete")
+async def delete_group(
+    event: schemas.BaseGroup,
+    response: Response,
+    project: models.Project = Depends(project_in_flight),
+    accept_async: bool = Depends(respond_async),
 ):
 
-    mixer = Mixer(project.mixpanel_key, project.data_center)
-    bool = mixer.delete_group(event.group_key, event.group_id)
+    if accept_async:
+        return accepted(response, project, "group_delete", event)
+
+    bool = await forward_operation(
+        project.mixpanel_key,
+        project.data_center,
+        "group_delete",
+        event,
+        premium=project.is_premium,
+    )
 
     resp = {
         "message": "Group deleted successfully in Mix Pannel",
@@ -666,3 +1297,11 @@ def delete_group(
 #         )
 
 #     return resp
+
+
+# routes a Mixer-Key authenticates, the ones traffic captures sample.
+INGESTION_PATHS = tuple(
+    route.path
+    for route in project_router.routes
+    if any(d.call is project_in_flight for d in route.dependant.dependencies)
+)
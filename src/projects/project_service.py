@@ -1,12 +1,16 @@
 from fastapi import HTTPException, status
 from fastapi.encoders import jsonable_encoder
 
+from src.app.config import mixer_settings
+from src.app.utils.rate_limit import rate_limiter
 from src.app.utils.slugger import slug_gen
 from src.organization.org_repository import org_repo
 from src.projects import schemas
+from src.projects.mixer_ops import replay_dead_letters
 from src.projects.project_repository import (
     Project,
     ProjectRateLimit,
+    dead_letter_repo,
     pj_rate_repo,
     project_repo,
 )
@@ -239,20 +243,64 @@ class ProjectService:
         return pj_rate
 
     def job_pjs_rate_limit(self):
+        """Dropping the hour buckets past the retention.
 
-        """Reverting all count for project rate limit to 0
-
+        Calls are counted per hour bucket, so nothing has to be reset for the
+        limits themselves, and persist_rate_limits keeps the Project Rate
+        Limit counts of the current hour.
 
         Returns:
             str: Info for logging the celery Job
         """
-        pj_rates = pj_rate_repo.get_all_pj_rate()
+        pruned = pj_rate_repo.prune_buckets(
+            mixer_settings.mixer_rate_bucket_retention_hours
+        )
+        return f"{pruned} hour buckets of Project Rates pruned"
+
+    def replay_dead_letters(
+        self, org_slug: str, slug: str, limit: int, rate: float
+    ) -> schemas.MessageDeadLetterReplayResp:
+        """Re-send the dead letters of a Project to Mix Pannel.
+
+        Args:
+            org_slug (str): Organization slug
+            slug (str): Project slug
+            limit (int): most dead letters replayed.
+            rate (float): most requests per second to Mix Pannel.
+
+        Raises:
+            HTTPException: Raises Project does not exists.
+
+        Returns:
+            schemas.MessageDeadLetterReplayResp: Response Model
+        """
+        org_check = self.org_check(org_slug)
 
-        if not pj_rates:
-            return "No Projects to Revert base count"
-        for pj_rate in pj_rates:
-            pj_rate_repo.update_pj_rate_base_hour(pj_rate)
-        return "Project Rates for all project count is reverted to 0"
+        project = self.project_repo.get_project(slug, org_check.id)
+        if not project:
+            self.project_does_not_exist()
+
+        replay = replay_dead_letters(project.id, limit, rate)
+        replay["remaining"] = dead_letter_repo.count_dead_letters(project.id)
+        return {
+            "message": "Dead letters replayed",
+            "data": replay,
+            "status": status.HTTP_200_OK,
+        }
+
+    def persist_rate_limits(self):
+        """Copy the counts of the rate limiter, or of the hour buckets, to
+        Project Rate Limit.
+
+        Returns:
+            str: Info for logging the celery Job
+        """
+        if rate_limiter is None:
+            counts = self.pj_rate_repo.get_hour_counts()
+        else:
+            counts = rate_limiter.counts()
+        self.pj_rate_repo.persist_counts(counts)
+        return f"Project Rate Limit counts of {len(counts)} projects persisted"
 
     def update_project(
         self, org_slug: str, slug: str, update_project: schemas.ProjectUpdate
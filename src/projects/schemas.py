@@ -1,5 +1,8 @@
 from typing import Dict, List, Optional
 
+from pydantic import conlist
+
+from src.app.config import mixer_settings
 from src.app.utils.schemas_utils import AbstractModel, MixPanelDataCenter, ResponseModel
 
 
@@ -54,12 +57,29 @@ class Distinct(AbstractModel):
 class SingleEvent(AbstractModel):
     distinct_id: str
     event: str
+    insert_id: Optional[str]
 
 
 class EventProp(SingleEvent):
     properties: dict
 
 
+class EventBatch(AbstractModel):
+    __root__: conlist(
+        EventProp, min_items=1, max_items=mixer_settings.mixer_bulk_max_events
+    )
+
+
+class EventResult(AbstractModel):
+    index: int
+    status: int
+    error: Optional[str]
+
+
+class MessageEventBatchResp(ResponseModel):
+    data: List[EventResult]
+
+
 class Alias(AbstractModel):
     distinct_id: str
     new_id: str
@@ -112,3 +132,42 @@ class GroupUnset(BaseGroup):
 
 class GroupMessage(AbstractModel):
     message: str
+
+
+class OperationResult(AbstractModel):
+    index: int
+    op: str
+    status: int
+    error: Optional[str]
+
+
+class MessageOperationsResp(ResponseModel):
+    data: List[OperationResult]
+
+
+class LineError(AbstractModel):
+    line: int
+    error: str
+
+
+class StreamResult(AbstractModel):
+    received: int
+    sent: int
+    duplicates: int
+    failed: int
+    errors: List[LineError]
+
+
+class MessageStreamResp(ResponseModel):
+    data: StreamResult
+
+
+class DeadLetterReplay(AbstractModel):
+    replayed: int
+    sent: int
+    failed: int
+    remaining: int
+
+
+class MessageDeadLetterReplayResp(ResponseModel):
+    data: DeadLetterReplay
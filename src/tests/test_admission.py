@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from src.app.utils.admission import InFlightFull, InFlightLimits
+
+
+def make_limits(per_project=1, global_limit=2, queue_size=1, wait_timeout=0.5):
+    return InFlightLimits(per_project, global_limit, queue_size, wait_timeout, 3)
+
+
+def test_project_limit_rejects_without_waiting():
+    limits = make_limits()
+
+    async def run():
+        await limits.acquire("a")
+        with pytest.raises(InFlightFull) as e:
+            await limits.acquire("a")
+        await limits.acquire("b")
+        with pytest.raises(InFlightFull) as g:
+            await limits.acquire("c")
+        return e.value, g.value
+
+    project, global_ = asyncio.run(run())
+    assert (project.scope, project.retry_after) == ("project", 3)
+    assert global_.scope == "global"
+    assert limits.in_flight == 2
+
+
+def test_waiting_request_gets_released_slot():
+    limits = make_limits()
+
+    async def run():
+        await limits.acquire("a")
+        waiter = asyncio.create_task(limits.acquire("a", wait=True))
+        await asyncio.sleep(0)
+        assert limits.waiting == 1
+        # the queue holds a single waiter.
+        with pytest.raises(InFlightFull):
+            await limits.acquire("a", wait=True)
+        await limits.release("a")
+        await waiter
+
+    asyncio.run(run())
+    assert limits.projects == {"a": 1}
+    assert limits.waiting == 0
+
+
+def test_waiting_request_times_out():
+    limits = make_limits(wait_timeout=0.01)
+
+    async def run():
+        async with limits.slot("a"):
+            with pytest.raises(InFlightFull):
+                await limits.acquire("a", wait=True)
+
+    asyncio.run(run())
+    assert limits.in_flight == 0
+    assert limits.projects == {}
+
+
+def test_held_slot_waits_without_timeout():
+    limits = make_limits(queue_size=0, wait_timeout=0.01)
+    held = []
+
+    async def deliver():
+        async with limits.held("a"):
+            held.append(dict(limits.projects))
+
+    async def run():
+        await limits.acquire("a")
+        delivery = asyncio.create_task(deliver())
+        await asyncio.sleep(0.05)
+        # a delivery neither times out nor takes the request queue.
+        assert not held
+        await limits.release("a")
+        await delivery
+
+    asyncio.run(run())
+    assert held == [{"a": 1}]
+    assert limits.in_flight == 0
@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+from src.app.utils.batcher import AsyncMixerBatcher, BatchedConsumer, MixerBatcher
+
+
+class RecordingBatcher(MixerBatcher):
+    def __init__(self, batch_size, max_age):
+        super().__init__(batch_size, max_age)
+        self.sent = []
+
+    def deliver(self, key, batch):
+        self.sent.append((key, list(batch)))
+
+
+def test_full_buffer_is_ready_at_batch_size():
+    batcher = RecordingBatcher(batch_size=3, max_age=60)
+    consumer = BatchedConsumer(batcher, "token", "EU")
+
+    for i in range(4):
+        consumer.send("events", f'{{"n": {i}}}')
+
+    batches = batcher.collect()
+    assert len(batches) == 1
+    key, batch = batches[0]
+    assert key == ("token", "EU", "events")
+    assert len(batch) == 3
+
+
+def test_buffers_are_kept_per_project_and_endpoint():
+    batcher = RecordingBatcher(batch_size=50, max_age=60)
+
+    BatchedConsumer(batcher, "a", "EU").send("events", "{}")
+    BatchedConsumer(batcher, "a", "EU").send("people", "{}")
+    BatchedConsumer(batcher, "b", "Others").send("events", "{}")
+
+    assert batcher.collect() == []
+    assert len(batcher.collect(force=True)) == 3
+
+
+def test_old_buffer_is_flushed_by_age():
+    batcher = RecordingBatcher(batch_size=50, max_age=0.05)
+    BatchedConsumer(batcher, "token", None).send("groups", "{}")
+
+    deadline = time.monotonic() + 2
+    while not batcher.sent and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert batcher.sent == [(("token", None, "groups"), ["{}"])]
+
+
+def test_batch_size_is_capped_to_mixpanel_limit():
+    assert MixerBatcher(batch_size=500, max_age=1).batch_size == 50
+
+
+def test_coalesced_updates_do_not_fill_the_buffer():
+    batcher = RecordingBatcher(batch_size=3, max_age=60)
+    batcher.coalesce = True
+    consumer = BatchedConsumer(batcher, "token", "EU")
+
+    for i in range(5):
+        consumer.send("people", f'{{"$distinct_id": "a", "$add": {{"n": {i}}}}}')
+
+    assert batcher.collect() == []
+    [(key, batch)] = batcher.collect(force=True)
+    assert batch == ['{"$distinct_id":"a","$add":{"n":10}}']
+
+
+class SlowTransport:
+    def __init__(self, delay):
+        self.delay = delay
+        self.in_flight = 0
+        self.most = 0
+        self.sent = 0
+
+    async def send(self, data_center, endpoint, batch_json):
+        self.in_flight += 1
+        self.most = max(self.most, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        self.sent += 1
+
+
+class DeadLetters:
+    def __init__(self):
+        self.batches = []
+
+    def add(self, mixpanel_key, endpoint, messages, error):
+        self.batches.append((mixpanel_key, error))
+
+
+def test_async_batches_in_flight_are_capped_and_awaited_on_flush():
+    transport = SlowTransport(0.05)
+    batcher = AsyncMixerBatcher(1, 60, transport=transport, concurrency=2)
+    for project in range(6):
+        batcher.send((f"p{project}", "EU", "events"), "{}")
+
+    batcher.flush(timeout=5)
+    assert transport.sent == 6
+    assert transport.most == 2
+
+
+def test_async_batches_of_one_project_are_capped():
+    transport = SlowTransport(0.02)
+    batcher = AsyncMixerBatcher(
+        1, 60, transport=transport, concurrency=4, per_project=1
+    )
+    for _ in range(3):
+        batcher.send(("token", "EU", "events"), "{}")
+
+    batcher.flush(timeout=5)
+    assert transport.sent == 3
+    assert transport.most == 1
+
+
+def test_async_batches_still_in_flight_at_the_timeout_are_dead_lettered():
+    dead_letters = DeadLetters()
+    batcher = AsyncMixerBatcher(
+        1, 60, transport=SlowTransport(60), dead_letters=dead_letters
+    )
+    batcher.send(("token", "EU", "events"), "{}")
+    deadline = time.monotonic() + 2
+    while not batcher._pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    batcher.flush(timeout=0.05)
+    assert dead_letters.batches == [
+        ("token", "Mixer stopped before the batch was delivered")
+    ]
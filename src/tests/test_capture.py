@@ -0,0 +1,63 @@
+import base64
+import gzip
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from src.app.utils.capture import CaptureMiddleware, CaptureWriter, redact
+
+
+def make_client(tmp_path, **options):
+    app = FastAPI()
+
+    @app.post("/api/v1/project/events/")
+    async def events(request: Request):
+        return {"received": len(await request.body())}
+
+    @app.post("/api/v1/project/org/acme/web/update/")
+    async def other():
+        return {}
+
+    writer = CaptureWriter(str(tmp_path / "capture.jsonl.gz"))
+    app.add_middleware(
+        CaptureMiddleware,
+        writer=writer,
+        paths=["/api/v1/project/events/"],
+        **options,
+    )
+    return TestClient(app), writer
+
+
+def read(writer: CaptureWriter) -> list:
+    writer.close()
+    with gzip.open(writer.path, "rb") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_captures_project_requests_with_redacted_key(tmp_path):
+    client, writer = make_client(tmp_path)
+    client.post(
+        "/api/v1/project/events/",
+        json={"a": 1},
+        headers={"Mixer-Key": "k", "Authorization": "Bearer t", "Cookie": "s=1"},
+    )
+    client.post("/api/v1/project/org/acme/web/update/", json={"a": 1})
+
+    (record,) = read(writer)
+    headers = dict(record["headers"])
+    assert record["path"] == "/api/v1/project/events/"
+    assert record["status"] == 200
+    assert json.loads(base64.b64decode(record["body"])) == {"a": 1}
+    assert headers["mixer-key"] == redact(b"k") != "k"
+    assert headers["authorization"] == redact(b"Bearer t")
+    assert headers["cookie"] == redact(b"s=1")
+
+
+def test_skips_bodies_over_max_body(tmp_path):
+    client, writer = make_client(tmp_path, max_body=4, redact_keys=False)
+    client.post("/api/v1/project/events/", content=b"12")
+    client.post("/api/v1/project/events/", content=b"123456")
+
+    records = read(writer)
+    assert [base64.b64decode(r["body"]) for r in records] == [b"12"]
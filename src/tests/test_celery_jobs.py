@@ -0,0 +1,73 @@
+import json
+
+from kombu.exceptions import OperationalError
+
+from src.app import celery_jobs
+from src.app.celery_jobs import (
+    OperationBatcher,
+    delivery_queue_name,
+    deliver_operations,
+    route_task,
+)
+from src.app.utils.dead_letters import DeadLetterStore
+from src.projects import mixer_ops
+
+OPERATIONS = [
+    {"op": "track", "payload": {"distinct_id": "d1", "event": "e", "properties": {}}},
+    {"op": "increment", "payload": {"distinct_id": "d1", "data": {"visits": 1}}},
+]
+
+
+class MemoryRepo:
+    def __init__(self):
+        self.rows = []
+
+    def get_project_id(self, mixpanel_key):
+        return 7
+
+    def create_dead_letters(self, dead_letters):
+        self.rows.extend(dead_letters)
+
+
+def test_premium_projects_have_a_delivery_queue_of_their_own():
+    assert delivery_queue_name("token", premium=True) == "mixer.delivery.premium"
+    shard = delivery_queue_name("token")
+    assert shard == delivery_queue_name("token")
+    assert shard.startswith("mixer.delivery.") and shard != "mixer.delivery.premium"
+
+    name = deliver_operations.name
+    assert route_task(name, ("token", "EU", [], True), {}, {}) == {
+        "queue": "mixer.delivery.premium"
+    }
+    assert route_task(name, ("token", "EU", []), {}, {}) == {"queue": shard}
+
+
+def test_only_messages_mixpanel_did_not_take_are_retried(monkeypatch):
+    sent = []
+
+    def send_batches(data_center, endpoint, messages, premium=False):
+        sent.append((endpoint, len(messages)))
+        # the people update fails once, the event goes through.
+        failing = endpoint == "people" and sent.count(("people", 1)) == 1
+        return ["upstream down" if failing else None] * len(messages)
+
+    monkeypatch.setattr(mixer_ops, "send_batches", send_batches)
+    deliver_operations.apply(args=("token", "EU", OPERATIONS))
+
+    assert sent == [("events", 1), ("people", 1), ("people", 1)]
+
+
+def test_batches_celery_cannot_take_are_dead_lettered(monkeypatch):
+    def delay(*args):
+        raise OperationalError("broker down")
+
+    monkeypatch.setattr(celery_jobs.deliver_operations, "delay", delay)
+    repo = MemoryRepo()
+    batcher = OperationBatcher(50, 60, dead_letters=DeadLetterStore(repo))
+    for operation in OPERATIONS:
+        batcher.send(("token", "EU", "free"), json.dumps(operation))
+
+    batcher.flush()
+
+    assert {row["endpoint"] for row in repo.rows} == {"events", "people"}
+    assert all(row["error"] == "broker down" for row in repo.rows)
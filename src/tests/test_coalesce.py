@@ -0,0 +1,63 @@
+import json
+
+from src.app.utils.coalesce import coalesce
+
+
+def update(distinct_id, op, value, time=1):
+    return json.dumps(
+        {"$token": "t", "$time": time, "$distinct_id": distinct_id, op: value}
+    )
+
+
+def test_updates_of_a_profile_are_merged():
+    merged = coalesce(
+        [
+            update("a", "$set", {"plan": "free", "age": 1}),
+            update("a", "$add", {"logins": 1}, time=2),
+            update("a", "$add", {"logins": 2}, time=3),
+            update("b", "$union", {"tags": ["x"]}),
+            update("b", "$union", {"tags": ["x", "y"]}),
+        ]
+    )
+
+    assert [json.loads(m) for m in merged] == [
+        {
+            "$token": "t",
+            "$time": 1,
+            "$distinct_id": "a",
+            "$set": {"plan": "free", "age": 1},
+        },
+        {"$token": "t", "$time": 3, "$distinct_id": "a", "$add": {"logins": 3}},
+        {
+            "$token": "t",
+            "$time": 1,
+            "$distinct_id": "b",
+            "$union": {"tags": ["x", "y"]},
+        },
+    ]
+
+
+def test_set_is_last_write_wins_and_set_once_first_write_wins():
+    merged = coalesce(
+        [
+            update("a", "$set", {"plan": "free"}),
+            update("a", "$set", {"plan": "pro"}),
+            update("b", "$set_once", {"first": 1}),
+            update("b", "$set_once", {"first": 2}),
+        ]
+    )
+
+    assert json.loads(merged[0])["$set"] == {"plan": "pro"}
+    assert json.loads(merged[1])["$set_once"] == {"first": 1}
+
+
+def test_updates_are_not_merged_across_other_operations():
+    messages = [
+        update("a", "$set", {"plan": "free"}),
+        update("a", "$unset", ["plan"]),
+        update("a", "$set", {"plan": "pro"}),
+        update("a", "$append", {"items": 1}),
+        update("a", "$append", {"items": 2}),
+    ]
+
+    assert coalesce(messages) == messages
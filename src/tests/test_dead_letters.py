@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+
+from mixpanel import MixpanelException
+from pydantic import parse_obj_as
+
+from src.app.config import mixer_settings
+from src.app.utils.batcher import MixerBatcher
+from src.app.utils.dead_letters import DeadLetterStore
+from src.projects import mixer_ops
+from src.projects.mixer_ops import OperationList
+
+
+class MemoryRepo:
+    def __init__(self, projects):
+        self.projects = projects
+        self.rows = []
+
+    def get_project_id(self, mixpanel_key):
+        return self.projects.get(mixpanel_key)
+
+    def create_dead_letters(self, dead_letters):
+        self.rows.extend(dead_letters)
+
+
+class FailingBatcher(MixerBatcher):
+    def deliver(self, key, batch):
+        raise MixpanelException("upstream down")
+
+
+def test_failed_batch_is_dead_lettered():
+    repo = MemoryRepo({"token": 7})
+    batcher = FailingBatcher(50, 60, dead_letters=DeadLetterStore(repo))
+    batcher.send(("token", "EU", "events"), '{"n": 1}')
+    batcher.send(("token", "EU", "events"), '{"n": 2}')
+
+    batcher.flush()
+
+    assert [row["message"] for row in repo.rows] == ['{"n": 1}', '{"n": 2}']
+    assert repo.rows[0] == {
+        "project_id": 7,
+        "endpoint": "events",
+        "message": '{"n": 1}',
+        "error": "upstream down",
+        "attempts": 1,
+    }
+
+
+def test_messages_of_unknown_project_are_counted_lost():
+    store = DeadLetterStore(MemoryRepo({}))
+    assert store.add("token", "events", ["{}"], "upstream down") == 0
+
+
+def test_operations_forwarded_later_dead_letter_their_failures(monkeypatch):
+    class Transport:
+        async def send_batches(self, data_center, endpoint, messages):
+            return ["upstream down" if endpoint == "people" else None] * len(messages)
+
+    repo = MemoryRepo({"token": 7})
+    monkeypatch.setattr(mixer_settings, "mixer_batch_enabled", False)
+    monkeypatch.setattr(mixer_ops, "dead_letter_store", DeadLetterStore(repo))
+    monkeypatch.setattr(
+        mixer_ops, "tier", lambda premium: SimpleNamespace(transport=Transport())
+    )
+    operations = parse_obj_as(
+        OperationList,
+        [
+            {
+                "op": "track",
+                "payload": {"distinct_id": "d1", "event": "e", "properties": {}},
+            },
+            {
+                "op": "increment",
+                "payload": {"distinct_id": "d1", "data": {"visits": 1}},
+            },
+        ],
+    ).__root__
+
+    errors = asyncio.run(
+        mixer_ops.forward_operations("token", "EU", operations, dead_letter=True)
+    )
+
+    assert errors == [None, "upstream down"]
+    assert [(row["endpoint"], row["error"]) for row in repo.rows] == [
+        ("people", "upstream down")
+    ]
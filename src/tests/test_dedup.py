@@ -0,0 +1,51 @@
+import sys
+import time
+
+from src.app.utils.dedup import RecentIds
+
+
+def test_repeats_are_detected_per_project():
+    index = RecentIds(window=60, buckets=4, max_ids=100)
+
+    assert index.seen("a", "id-1") is False
+    assert index.seen("a", "id-1") is True
+    assert index.seen("b", "id-1") is False
+    assert index.ids == 2
+
+
+def test_ids_expire_with_the_window():
+    index = RecentIds(window=0.02, buckets=2, max_ids=100)
+    index.seen("a", "id-1")
+
+    time.sleep(0.03)
+    assert index.seen("a", "id-1") is False
+
+
+def test_oldest_bucket_is_dropped_past_max_ids():
+    index = RecentIds(window=60, buckets=60, max_ids=2)
+    index.span = 0
+    for n in range(5):
+        index.seen("a", f"id-{n}")
+
+    assert index.ids <= 3
+    assert index.seen("a", "id-4") is True
+    assert index.seen("a", "id-0") is False
+
+
+def test_forgotten_ids_are_not_repeats():
+    index = RecentIds(window=60, buckets=4, max_ids=100)
+    index.seen("a", "id-1")
+    size = index.bytes
+
+    index.forget("a", "id-1")
+    assert index.ids == 0 and index.bytes < size
+    assert index.seen("a", "id-1") is False
+
+
+def test_bytes_count_the_sets_holding_the_ids():
+    index = RecentIds(window=60, buckets=4, max_ids=100)
+    for n in range(50):
+        index.seen("a", f"id-{n}")
+
+    ids = sum(sys.getsizeof(f"id-{n}") for n in range(50))
+    assert index.bytes > ids + sys.getsizeof(set())
@@ -0,0 +1,29 @@
+import datetime
+import gzip
+import json
+from urllib.parse import parse_qs
+
+from mixpanel import DatetimeSerializer, json_dumps
+
+from src.app.config import mixer_settings
+from src.app.utils.encoding import FastSerializer, encode_request
+
+
+def test_fast_serializer_matches_mixpanel_serializer():
+    data = {"event": "e", "properties": {"at": datetime.datetime(2023, 1, 2, 3, 4, 5)}}
+
+    assert json_dumps(data, cls=FastSerializer) == json_dumps(
+        data, cls=DatetimeSerializer
+    )
+
+
+def test_only_large_bodies_are_gzipped():
+    small, headers = encode_request('{"event":"e"}')
+    assert "Content-Encoding" not in headers
+    assert parse_qs(small.decode())["data"] == ['{"event":"e"}']
+
+    message = json.dumps([{"properties": {"k": "v" * 50}}] * 100)
+    body, headers = encode_request(message)
+    assert headers["Content-Encoding"] == "gzip"
+    assert len(body) < mixer_settings.mixer_gzip_min_bytes
+    assert parse_qs(gzip.decompress(body).decode())["data"] == [message]
@@ -0,0 +1,150 @@
+import asyncio
+from types import SimpleNamespace
+
+import orjson
+import pytest
+from fastapi import Response
+from mixpanel import MixpanelException
+
+from src.app.config import mixer_settings
+from src.projects import mixer_ops, schemas
+
+EVENT = schemas.EventProp(distinct_id="d1", event="e", properties={})
+
+
+class Transport:
+    def __init__(self, error=None):
+        self.error = error
+        self.sent = []
+
+    async def send(self, data_center, endpoint, message):
+        if self.error:
+            raise MixpanelException(self.error)
+        self.sent.append((endpoint, message))
+
+
+class Batcher:
+    def __init__(self):
+        self.buffered = []
+
+    def send(self, key, message):
+        self.buffered.append((key, message))
+
+
+@pytest.fixture()
+def delivery(monkeypatch):
+    def use(transport):
+        batcher = Batcher()
+        delivery_tier = SimpleNamespace(
+            transport=transport, batcher=batcher, spool=None, name="free"
+        )
+        monkeypatch.setattr(mixer_settings, "mixer_batch_enabled", True)
+        monkeypatch.setattr(mixer_ops, "tier", lambda premium: delivery_tier)
+        monkeypatch.setattr("src.app.utils.mixers.tier", lambda premium: delivery_tier)
+        monkeypatch.setattr(mixer_ops, "dead_letter_store", None)
+        return batcher
+
+    return use
+
+
+def test_confirmed_calls_wait_for_mixpanel_with_batching_on(delivery):
+    transport = Transport()
+    batcher = delivery(transport)
+
+    assert asyncio.run(mixer_ops.forward_operation("token", "EU", "track", EVENT))
+    assert [endpoint for endpoint, _ in transport.sent] == ["events"]
+    assert batcher.buffered == []
+
+
+def test_confirmed_calls_see_mixpanel_failures(delivery):
+    delivery(Transport(error="upstream down"))
+
+    with pytest.raises(MixpanelException):
+        asyncio.run(mixer_ops.forward_operation("token", "EU", "track", EVENT))
+
+
+def test_dead_lettered_calls_are_buffered(delivery):
+    transport = Transport()
+    batcher = delivery(transport)
+
+    # Mixpanel clients are cached per project, so this one is only used here.
+    asyncio.run(
+        mixer_ops.forward_operation("buffered", "EU", "track", EVENT, dead_letter=True)
+    )
+    assert transport.sent == []
+    assert [key for key, _ in batcher.buffered] == [("buffered", "EU", "events")]
+
+
+def test_event_batches_are_deduplicated_and_failures_forgotten(delivery, monkeypatch):
+    from src.projects.project_router import forward_list
+
+    class Batches(Transport):
+        async def send_batches(self, data_center, endpoint, messages):
+            self.sent.extend(messages)
+            return [self.error] * len(messages)
+
+    monkeypatch.setattr(mixer_settings, "mixer_dedup_enabled", True)
+    track = mixer_ops.OPERATION_MODELS["track"]
+    project = SimpleNamespace(
+        mixpanel_key="batch-token", data_center="EU", is_premium=True
+    )
+
+    def events():
+        return [
+            track.construct(
+                op="track",
+                payload=schemas.EventProp(
+                    distinct_id="d1", event="e", properties={}, insert_id=insert_id
+                ),
+            )
+            for insert_id in ("a", "a", "b")
+        ]
+
+    transport = Batches(error="upstream down")
+    delivery(transport)
+    errors, _ = asyncio.run(forward_list(Response(), project, events(), False))
+    assert errors == ["upstream down", None, "upstream down"]
+    assert len(transport.sent) == 2
+
+    # the events Mixpanel did not take are sent again on retry.
+    transport.error = None
+    errors, _ = asyncio.run(forward_list(Response(), project, events(), False))
+    assert errors == [None, None, None]
+    assert len(transport.sent) == 4
+
+
+def test_lists_answered_202_are_reported_queued_not_sent():
+    from src.projects.project_router import list_message
+
+    errors = [None, "bad payload", None]
+    assert list_message(errors, 202, "operations") == (
+        "2 of 3 operations accepted for delivery to Mix Pannel"
+    )
+    assert list_message(errors, 200, "events") == (
+        "2 of 3 events sent successfully to Mix Pannel"
+    )
+
+
+def test_stream_lines_over_the_quota_fail(delivery):
+    from src.app.utils.rate_limit import QuotaExceeded
+
+    transport = Transport()
+    delivery(transport)
+    charged = []
+
+    async def charge(op):
+        if len(charged) == 2:
+            raise QuotaExceeded(2, 60)
+        charged.append(op)
+
+    async def lines():
+        for lineno in range(1, 4):
+            payload = {"distinct_id": "d1", "event": "e", "properties": {}}
+            yield lineno, orjson.dumps({"op": "track", "payload": payload})
+
+    result = asyncio.run(
+        mixer_ops.forward_stream("token", "EU", lines(), 5, charge=charge)
+    )
+    assert (result["sent"], result["failed"]) == (2, 1)
+    assert result["errors"][0]["line"] == 3
+    assert len(transport.sent) == 2
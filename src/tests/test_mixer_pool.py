@@ -0,0 +1,22 @@
+from src.app.utils.mixer_pool import ConsumerPool, MixerRegistry
+
+
+def test_registry_evicts_least_recently_used_client():
+    registry = MixerRegistry(maxsize=2)
+
+    registry.get(("a", "EU"), object)
+    registry.get(("b", "EU"), object)
+    client_a = registry.get(("a", "EU"), object)
+    registry.get(("c", "EU"), object)
+
+    assert len(registry) == 2
+    assert registry.get(("a", "EU"), object) is client_a
+    assert registry.get(("b", "EU"), lambda: "rebuilt") == "rebuilt"
+
+
+def test_consumers_are_shared_per_api_host():
+    pool = ConsumerPool(pool_maxsize=4)
+
+    assert pool.get("EU") is pool.get("EU")
+    assert pool.get("Others") is pool.get(None)
+    assert pool.get("EU") is not pool.get("Others")
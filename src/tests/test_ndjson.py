@@ -0,0 +1,30 @@
+import asyncio
+
+from src.app.utils.ndjson import iter_lines
+
+
+async def chunked(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def read(*chunks, max_line_bytes=100):
+    async def collect():
+        return [line async for line in iter_lines(chunked(*chunks), max_line_bytes)]
+
+    return asyncio.run(collect())
+
+
+def test_lines_are_split_across_chunks():
+    assert read(b'{"a"', b':1}\n\n{"b":2}\n{"c"', b":3}") == [
+        (1, b'{"a":1}'),
+        (3, b'{"b":2}'),
+        (4, b'{"c":3}'),
+    ]
+
+
+def test_long_lines_are_skipped():
+    assert read(b"x" * 8, b"x" * 8 + b"\nok\n", max_line_bytes=10) == [
+        (1, None),
+        (2, b"ok"),
+    ]
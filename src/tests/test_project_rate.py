@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from src.app.database import Base
+from src.organization.models import Organization
+from src.projects.models import Project
+from src.projects.project_repository import ProjectRateRepo
+from src.tests.conftest import TestSessLocal, engine
+
+
+@pytest.fixture()
+def project_id():
+    try:
+        engine.connect().close()
+    except OperationalError:
+        pytest.skip("no local Postgres")
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    db = TestSessLocal()
+    org = Organization(name="acme", slug="acme")
+    db.add(org)
+    db.flush()
+    project = Project(name="web", slug="web", org_id=org.id, api_key="key")
+    db.add(project)
+    db.commit()
+    try:
+        yield project.id
+    finally:
+        db.close()
+
+
+def rate_repo() -> ProjectRateRepo:
+    repo = ProjectRateRepo()
+    repo.db = TestSessLocal()
+    return repo
+
+
+def test_calls_are_counted_up_to_the_hour_limit(project_id):
+    repo = rate_repo()
+
+    assert repo.hit_project_hour(project_id, 5) == 1
+    assert repo.hit_project_hour(project_id, 5, cost=3) == 4
+    # a call that would go over the limit is refused and not counted.
+    assert repo.hit_project_hour(project_id, 5, cost=2) is None
+    assert repo.hit_project_hour(project_id, 5) == 5
+    assert repo.hit_project_hour(project_id, 5) is None
+    assert repo.get_hour_counts() == {project_id: 5}
+
+
+def test_concurrent_calls_never_overshoot(project_id):
+    repo = rate_repo()
+    counts = []
+
+    def hit():
+        counts.append(repo.hit_project_hour(project_id, 10))
+
+    threads = [threading.Thread(target=hit) for _ in range(30)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(c for c in counts if c is not None) == list(range(1, 11))
+    assert repo.get_hour_counts() == {project_id: 10}
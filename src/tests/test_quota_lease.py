@@ -0,0 +1,107 @@
+import time
+
+from src.app.utils.quota_lease import QuotaLeases
+from src.app.utils.rate_limit import MemoryRateLimiter
+
+
+class CountingLimiter(MemoryRateLimiter):
+    def __init__(self, limit, window):
+        super().__init__(limit, window)
+        self.leases = 0
+
+    def lease(self, *args, **kwargs):
+        self.leases += 1
+        return super().lease(*args, **kwargs)
+
+
+def wait_for(condition, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_calls_are_decided_from_the_lease():
+    limiter = CountingLimiter(1000, 60)
+    leases = QuotaLeases(limiter, share=0.1, max_units=50, ttl=60)
+
+    for _ in range(30):
+        assert leases.hit(1).allowed
+    # one lease of 50 calls covers all 30.
+    assert limiter.leases == 1
+    assert limiter.counts() == {1: 50}
+
+    leases.close()
+    assert limiter.counts() == {1: 30}
+
+
+def test_lease_is_renewed_before_it_runs_out():
+    limiter = CountingLimiter(1000, 60)
+    leases = QuotaLeases(limiter, share=0.1, max_units=10, ttl=60, low_water=0.5)
+
+    for _ in range(5):
+        leases.hit(1)
+    assert wait_for(lambda: limiter.leases == 2)
+    for _ in range(10):
+        assert leases.hit(1).allowed
+    leases.close()
+
+
+def test_workers_sharing_a_limiter_never_overshoot():
+    limiter = MemoryRateLimiter(20, 60)
+    workers = [QuotaLeases(limiter, share=0.5, max_units=8, ttl=60) for _ in range(3)]
+
+    allowed = 0
+    for _ in range(20):
+        for worker in workers:
+            allowed += worker.hit(1).allowed
+    for worker in workers:
+        worker._renewer.shutdown(wait=True)
+        worker.close()
+    assert allowed <= 20
+    assert limiter.counts() == {1: allowed}
+
+    # calls given back go to whichever worker leases next.
+    while workers[0].hit(1).allowed:
+        allowed += 1
+    assert allowed == 20
+    refused = workers[0].hit(1)
+    assert not refused.allowed and refused.retry_after > 0
+
+
+def test_unspent_calls_are_given_back_when_the_lease_expires():
+    limiter = MemoryRateLimiter(10, 60)
+    first = QuotaLeases(limiter, share=1.0, max_units=10, ttl=0.05)
+    second = QuotaLeases(limiter, share=1.0, max_units=10, ttl=0.2)
+
+    assert first.hit(1).allowed
+    refused = second.hit(1)
+    assert not refused.allowed and refused.retry_after > 0.2
+
+    assert wait_for(lambda: limiter.counts() == {1: 1})
+    # the refusal is cached for the lease ttl, not until a call leaves the window.
+    assert wait_for(lambda: second.hit(1).allowed)
+
+
+def test_calls_are_refused_when_a_new_lease_cannot_be_spent():
+    class EmptyLimiter(MemoryRateLimiter):
+        def lease(self, *args, **kwargs):
+            return 0, 0.0
+
+    leases = QuotaLeases(EmptyLimiter(10, 60), share=1.0, max_units=10, ttl=60)
+
+    refused = leases.hit(1)
+    assert not refused.allowed and refused.retry_after > 0
+
+
+def test_calls_spend_their_weight_of_the_plan_limit():
+    limiter = MemoryRateLimiter(1000, 60)
+    leases = QuotaLeases(limiter, share=0.5, max_units=4, ttl=60)
+
+    # a lease holds at least the cost of the call.
+    assert leases.hit(1, limit=12, cost=5).allowed
+    assert leases.hit(1, limit=12, cost=5).allowed
+    refused = leases.hit(1, limit=12, cost=5)
+    assert not refused.allowed and refused.retry_after > 0
+    leases.close()
+    assert limiter.counts() == {1: 10}
@@ -0,0 +1,119 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.app.utils.quota_plans import QuotaLimit, QuotaPlans
+from src.app.utils.rate_limit import MemoryRateLimiter, QuotaExceeded
+from src.projects import mixer_handler
+
+DEFAULT = QuotaLimit(2, 0, {})
+
+
+class MemoryRepo:
+    def __init__(self, plans, org_plans):
+        self.plans = plans
+        self.org_plans = org_plans
+        self.loads = 0
+
+    def get_plans(self):
+        self.loads += 1
+        return list(self.plans)
+
+    def get_org_plans(self):
+        return dict(self.org_plans)
+
+
+def project(quota_plan_id=None, org_id=1):
+    return SimpleNamespace(
+        id=1, quota_plan_id=quota_plan_id, org_id=org_id, is_premium=False
+    )
+
+
+def wait_for(condition, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_project_plan_wins_over_org_plan_and_default():
+    repo = MemoryRepo(
+        [(1, "starter", 100, 10, {"track": 5}), (2, "team", 1000, 0, {})],
+        {7: 2},
+    )
+    plans = QuotaPlans(repo, DEFAULT, ttl=60)
+
+    starter = plans.plan_of(project(1, org_id=7))
+    assert starter == QuotaLimit(100, 10, {"track": 5})
+    assert starter.cost("track") == 5 and starter.cost("alias") == 1
+    assert plans.plan_of(project(org_id=7)).hourly_limit == 1000
+    assert plans.plan_of(project(org_id=8)) == DEFAULT
+    assert repo.loads == 1
+
+
+def test_plans_are_reloaded_in_the_background_once_stale():
+    repo = MemoryRepo([(1, "starter", 100, 0, {})], {})
+    plans = QuotaPlans(repo, DEFAULT, ttl=0.05)
+    assert plans.plan_of(project(1)).hourly_limit == 100
+
+    repo.plans = [(1, "starter", 300, 0, {})]
+    time.sleep(0.06)
+    # the stale plan answers while the new one loads.
+    plans.plan_of(project(1))
+    assert wait_for(lambda: plans.plan_of(project(1)).hourly_limit == 300)
+
+
+def test_invalidate_reloads_the_plans():
+    repo = MemoryRepo([(1, "starter", 100, 0, {})], {})
+    plans = QuotaPlans(repo, DEFAULT, ttl=60)
+    plans.plan_of(project(1))
+
+    repo.plans = []
+    plans.invalidate()
+    assert wait_for(lambda: plans.plan_of(project(1)) == DEFAULT)
+    assert repo.loads == 2
+
+
+def test_calls_spend_the_weights_of_their_operations(monkeypatch):
+    repo = MemoryRepo([(1, "starter", 10, 0, {"track": 2, "alias": 0})], {})
+    monkeypatch.setattr(mixer_handler, "quota_plans", QuotaPlans(repo, DEFAULT, 60))
+    monkeypatch.setattr(mixer_handler, "rate_limiter", MemoryRateLimiter(10, 3600))
+    monkeypatch.setattr(mixer_handler, "quota_leases", None)
+
+    # a list of 4 events and an alias spends 4 * 2 + 0 units.
+    mixer_handler.charge_operations(project(1), ["track"] * 4 + ["alias"])
+    mixer_handler.charge_operations(project(1), ["alias"] * 50)
+    with pytest.raises(QuotaExceeded):
+        mixer_handler.charge_operations(project(1), ["track", "people_set"])
+    mixer_handler.charge_operations(project(1), ["people_set", "people_set"])
+
+
+class Versions:
+    """Stand-in for the GET and INCR of the Redis holding the plan version."""
+
+    def __init__(self):
+        self.keys = {}
+
+    def get(self, key):
+        return self.keys.get(key)
+
+    def incr(self, key):
+        self.keys[key] = str(int(self.keys.get(key) or 0) + 1).encode()
+
+
+def test_changed_plans_are_reloaded_within_the_check_interval():
+    repo = MemoryRepo([(1, "starter", 100, 0, {})], {})
+    versions = Versions()
+    plans = QuotaPlans(repo, DEFAULT, 60, versions=versions, check_interval=0.01)
+    assert plans.plan_of(project(1)).hourly_limit == 100
+
+    # an unchanged version reloads nothing.
+    time.sleep(0.02)
+    plans.plan_of(project(1))
+    assert not wait_for(lambda: repo.loads > 1, timeout=0.1)
+
+    repo.plans = [(1, "starter", 300, 0, {})]
+    assert plans.changed()
+    assert wait_for(lambda: plans.plan_of(project(1)).hourly_limit == 300)
+    assert repo.loads == 2
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+import redis
+
+from src.app.utils.rate_limit import MemoryRateLimiter, RedisRateLimiter
+
+
+def local_redis():
+    client = redis.Redis.from_url("redis://localhost:6379/15", socket_timeout=0.2)
+    try:
+        client.ping()
+    except redis.RedisError:
+        return None
+    return client
+
+
+@pytest.fixture(params=["memory", "redis"])
+def make_limiter(request):
+    if request.param == "memory":
+        yield MemoryRateLimiter
+        return
+
+    client = local_redis()
+    if client is None:
+        pytest.skip("no local Redis")
+    prefix = f"test:rate:{time.time_ns()}"
+    yield lambda limit, window, **kwargs: RedisRateLimiter(
+        client, limit, window, prefix, **kwargs
+    )
+    for key in client.scan_iter(match=f"{prefix}:*"):
+        client.delete(key)
+
+
+def test_calls_over_the_limit_are_refused(make_limiter):
+    limiter = make_limiter(2, 60)
+
+    assert limiter.hit(1) == (True, 1, 0)
+    assert limiter.hit(1) == (True, 2, 0)
+    refused = limiter.hit(1)
+    assert not refused.allowed and refused.count == 2
+    assert 59 < refused.retry_after <= 60
+
+    assert limiter.hit(2).allowed
+    assert limiter.counts() == {1: 2, 2: 1}
+
+
+def test_window_slides(make_limiter):
+    limiter = make_limiter(1, 0.2)
+
+    assert limiter.hit(1).allowed
+    assert not limiter.hit(1).allowed
+    time.sleep(0.25)
+    assert limiter.hit(1).allowed
+
+
+def test_concurrent_calls_do_not_overshoot(make_limiter):
+    limiter = make_limiter(5, 60)
+    allowed = []
+
+    def hit():
+        allowed.append(limiter.hit(1).allowed)
+
+    threads = [threading.Thread(target=hit) for _ in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert allowed.count(True) == 5
+
+
+def test_calls_spend_their_cost_of_the_project_limit(make_limiter):
+    limiter = make_limiter(2, 60)
+
+    assert limiter.hit(1, limit=10, cost=4) == (True, 4, 0)
+    assert limiter.hit(1, limit=10, cost=4) == (True, 8, 0)
+    refused = limiter.hit(1, limit=10, cost=4)
+    assert not refused.allowed and refused.count == 8
+    assert limiter.hit(1, limit=10, cost=2).allowed
+
+
+def test_burst_is_limited_within_the_burst_window(make_limiter):
+    limiter = make_limiter(100, 60, burst=3, burst_window=0.2)
+
+    for _ in range(3):
+        assert limiter.hit(1).allowed
+    refused = limiter.hit(1)
+    assert not refused.allowed and 0 < refused.retry_after <= 0.2
+    time.sleep(0.25)
+    assert limiter.hit(1).allowed
+    assert limiter.hit(1, burst=0).allowed
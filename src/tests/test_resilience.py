@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+import pytest
+from mixpanel import MixpanelException
+
+from src.app.utils.resilience import (
+    CircuitBreaker,
+    CircuitOpen,
+    DataCenterLane,
+    MixpanelRejected,
+    MixpanelThrottled,
+)
+
+
+def make_lane(retries=2, failures=3, reset_timeout=60):
+    return DataCenterLane(
+        "test",
+        concurrency=2,
+        acquire_timeout=0.1,
+        retries=retries,
+        backoff=0,
+        backoff_max=0,
+        breaker=CircuitBreaker(failures, reset_timeout),
+    )
+
+
+class Flaky:
+    def __init__(self, failures, error=MixpanelException):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error("down")
+        return True
+
+
+def test_lane_retries_until_success():
+    lane = make_lane(retries=2)
+    flaky = Flaky(failures=2)
+
+    assert lane.call(flaky) is True
+    assert flaky.calls == 3
+    assert lane.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_rejected_messages_are_not_retried():
+    lane = make_lane(retries=2)
+    flaky = Flaky(failures=1, error=MixpanelRejected)
+
+    with pytest.raises(MixpanelRejected):
+        lane.call(flaky)
+    assert flaky.calls == 1
+
+
+def test_throttled_projects_do_not_open_the_breaker():
+    lane = make_lane(retries=1, failures=2)
+    flaky = Flaky(failures=10, error=MixpanelThrottled)
+
+    for _ in range(3):
+        with pytest.raises(MixpanelThrottled):
+            lane.call(flaky)
+    assert flaky.calls == 6
+    assert lane.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_opens_and_fails_fast():
+    lane = make_lane(retries=0, failures=2)
+    flaky = Flaky(failures=10)
+
+    for _ in range(2):
+        with pytest.raises(MixpanelException):
+            lane.call(flaky)
+
+    with pytest.raises(CircuitOpen):
+        lane.call(flaky)
+    assert flaky.calls == 2
+    assert lane.breaker.state_code() == 2
+
+
+def test_breaker_closes_after_successful_trial():
+    breaker = CircuitBreaker(failures=1, reset_timeout=0.01)
+    breaker.record_failure()
+    assert breaker.allow() is False
+
+    time.sleep(0.02)
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_async_lane_retries_until_success():
+    lane = make_lane(retries=2)
+    flaky = Flaky(failures=2)
+
+    async def call():
+        return flaky()
+
+    assert asyncio.run(lane.acall(call)) is True
+    assert flaky.calls == 3
+    assert lane.in_flight == 0
+
+
+def test_trial_is_given_back_when_it_records_no_outcome():
+    lane = make_lane(retries=0, failures=1, reset_timeout=0.01)
+    lane.breaker.record_failure()
+    time.sleep(0.02)
+
+    with pytest.raises(ValueError):
+        lane.call(Flaky(failures=1, error=ValueError))
+    assert lane.breaker.state == CircuitBreaker.HALF_OPEN
+
+    # the next call is the trial, and closes the breaker.
+    assert lane.call(Flaky(failures=0)) is True
+    assert lane.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_cancelled_async_trial_is_given_back():
+    lane = make_lane(retries=0, failures=1, reset_timeout=0.01)
+    lane.breaker.record_failure()
+    time.sleep(0.02)
+
+    async def run():
+        task = asyncio.create_task(lane.acall(asyncio.sleep, 10))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        async def ok():
+            return True
+
+        return await lane.acall(ok)
+
+    assert asyncio.run(run()) is True
+    assert lane.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,144 @@
+import os
+
+import pytest
+from mixpanel import MixpanelException
+
+from src.app.utils.resilience import MixpanelRejected
+from src.app.utils.spool import HEADER, MixerSpool, SpoolFull
+
+KEY = ("token", "EU", "events")
+
+
+def make_spool(path, **kwargs):
+    options = {"segment_bytes": 1024, "max_bytes": 1024 * 1024, "fsync_interval": 0}
+    options.update(kwargs)
+    spool = MixerSpool(str(path), **options)
+    spool.open()
+    return spool
+
+
+def test_records_are_read_back_in_order_and_checkpointed(tmp_path):
+    spool = make_spool(tmp_path)
+    for i in range(5):
+        spool.append(KEY, f'{{"n": {i}}}')
+
+    records, position = spool.read(3)
+    assert [m for _, m in records] == ['{"n": 0}', '{"n": 1}', '{"n": 2}']
+    assert records[0][0] == KEY
+
+    spool.commit(position)
+    records, _ = spool.read(10)
+    assert [m for _, m in records] == ['{"n": 3}', '{"n": 4}']
+
+
+def test_drained_segments_are_compacted(tmp_path):
+    spool = make_spool(tmp_path, segment_bytes=200)
+    for i in range(20):
+        spool.append(KEY, f'{{"n": {i}}}')
+    assert len(spool.segments()) > 1
+
+    delivered = []
+    spool.deliver = lambda key, batch: delivered.extend(batch)
+    while spool.drain_once():
+        pass
+
+    assert len(delivered) == 20
+    assert len(spool.segments()) == 1
+    assert spool.size() == os.path.getsize(
+        os.path.join(str(tmp_path), f"{spool.segments()[0]:020d}.seg")
+    )
+
+
+def test_spool_refuses_records_over_its_cap(tmp_path):
+    spool = make_spool(tmp_path, max_bytes=100)
+    spool.append(KEY, "{}")
+
+    with pytest.raises(SpoolFull):
+        spool.append(KEY, "x" * 100)
+
+
+def test_restart_resumes_from_checkpoint_and_skips_torn_tail(tmp_path):
+    spool = make_spool(tmp_path)
+    spool.append(KEY, '{"n": 0}')
+    spool.append(KEY, '{"n": 1}')
+    records, position = spool.read(1)
+    spool.commit(position)
+    spool.close()
+
+    # a crash in the middle of a write leaves half a record behind.
+    segment = os.path.join(str(tmp_path), f"{spool.segments()[-1]:020d}.seg")
+    with open(segment, "ab") as f:
+        f.write(HEADER.pack(50, 0) + b"{")
+
+    spool = make_spool(tmp_path)
+    spool.append(KEY, '{"n": 2}')
+    records, _ = spool.read(10)
+    assert [m for _, m in records] == ['{"n": 1}', '{"n": 2}']
+
+
+def test_rejected_batches_are_handed_off_and_skipped(tmp_path):
+    spool = make_spool(tmp_path)
+    spool.append(KEY, '{"n": 0}')
+    spool.append(("token", "EU", "engage"), '{"bad": 1}')
+    spool.append(KEY, '{"n": 1}')
+
+    delivered, rejected = [], []
+
+    def deliver(key, batch):
+        if key[2] == "engage":
+            raise MixpanelRejected("Mixpanel error: invalid")
+        delivered.extend(batch)
+
+    spool.deliver = deliver
+    spool.reject = lambda key, batch, error: rejected.extend(batch)
+    assert spool.drain_once() == 3
+
+    assert delivered == ['{"n": 0}', '{"n": 1}']
+    assert rejected == ['{"bad": 1}']
+    assert spool.read(10)[0] == []
+
+
+def test_batches_delivered_before_a_failure_are_not_sent_again(tmp_path):
+    spool = make_spool(tmp_path)
+    spool.append(("token", "EU", "engage"), '{"p": 0}')
+    spool.append(KEY, '{"n": 0}')
+    spool.append(("token", "EU", "engage"), '{"p": 1}')
+
+    sent = []
+    failing = {"events"}
+
+    def deliver(key, batch):
+        if key[2] in failing:
+            raise MixpanelException("upstream down")
+        sent.extend(batch)
+
+    spool.deliver = deliver
+    with pytest.raises(MixpanelException):
+        spool.drain_once()
+    assert sent == ['{"p": 0}', '{"p": 1}']
+    # checkpointed past the first record, the last one is remembered as sent.
+    assert spool.read(10)[0] == [
+        (KEY, '{"n": 0}'),
+        (("token", "EU", "engage"), '{"p": 1}'),
+    ]
+
+    failing.clear()
+    spool.drain_once()
+    assert sent == ['{"p": 0}', '{"p": 1}', '{"n": 0}']
+    assert spool.read(10)[0] == []
+
+
+def test_processes_sharing_a_directory_spool_apart(tmp_path):
+    first = make_spool(tmp_path)
+    second = make_spool(tmp_path)
+    first.append(KEY, '{"n": 0}')
+    second.append(KEY, '{"n": 1}')
+
+    assert second.directory == os.path.join(str(tmp_path), "worker-1")
+    assert [m for _, m in first.read(10)[0]] == ['{"n": 0}']
+    assert [m for _, m in second.read(10)[0]] == ['{"n": 1}']
+
+    # a restarted process picks up the directory it is handed.
+    second.close()
+    third = make_spool(tmp_path)
+    assert [m for _, m in third.read(10)[0]] == ['{"n": 1}']
@@ -0,0 +1,21 @@
+from src.app.utils.mixers import Mixer
+from src.app.utils.schemas_utils import MixPanelDataCenter
+from src.app.utils.tiers import FREE, PREMIUM, tier, tiers
+
+
+def test_tiers_share_no_delivery_resources():
+    free, premium = tiers[FREE], tiers[PREMIUM]
+
+    assert tier(True) is premium and tier(False) is free
+    for resource in ("consumer_pool", "transport", "delivery_queue", "batcher"):
+        assert getattr(free, resource) is not getattr(premium, resource)
+
+    eu = MixPanelDataCenter.eu
+    assert free.lanes[eu] is not premium.lanes[eu]
+    assert free.lanes[eu].breaker is not premium.lanes[eu].breaker
+    assert premium.consumer_pool.get("EU").lane is premium.lanes[eu]
+
+
+def test_mixer_uses_the_tier_of_its_project():
+    assert Mixer("token", "EU", premium=True).tier is tiers[PREMIUM]
+    assert Mixer("token", "EU").tier is tiers[FREE]
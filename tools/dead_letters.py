@@ -0,0 +1,66 @@
+"""Counts and replays the dead letters of failed Mixpanel deliveries.
+
+    python -m tools.dead_letters count [--project-id 3]
+    python -m tools.dead_letters replay [--project-id 3] [--limit 50000] [--rate 5]
+
+Replay re-sends the oldest dead letters 50 messages per request, at most
+--rate requests per second, until none are left, --limit is reached or a
+whole round fails. Settings are read from the environment or .env like the app.
+"""
+import argparse
+import json
+
+from src.app.config import mixer_settings
+from src.projects.mixer_ops import replay_dead_letters
+from src.projects.project_repository import dead_letter_repo
+
+
+def replay(project_id: int | None, limit: int, rate: float, round_size: int) -> dict:
+    total = {"replayed": 0, "sent": 0, "failed": 0}
+    while total["replayed"] < limit:
+        result = replay_dead_letters(
+            project_id, min(round_size, limit - total["replayed"]), rate
+        )
+        for name, count in result.items():
+            total[name] += count
+        print(json.dumps(result))
+        # failed dead letters stay first in line, so stop once nothing goes out.
+        if not result["sent"]:
+            break
+    total["remaining"] = dead_letter_repo.count_dead_letters(project_id)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    count_parser = commands.add_parser("count", help="number of dead letters")
+    count_parser.add_argument("--project-id", type=int)
+
+    replay_parser = commands.add_parser("replay", help="re-send dead letters")
+    replay_parser.add_argument("--project-id", type=int)
+    replay_parser.add_argument("--limit", type=int, default=1_000_000)
+    replay_parser.add_argument(
+        "--rate",
+        type=float,
+        default=mixer_settings.mixer_dead_letter_replay_rate,
+        help="requests per second, 0 for no limit",
+    )
+    replay_parser.add_argument(
+        "--round-size",
+        type=int,
+        default=mixer_settings.mixer_dead_letter_replay_limit,
+        help="dead letters read per round",
+    )
+    args = parser.parse_args()
+
+    if args.command == "count":
+        print(dead_letter_repo.count_dead_letters(args.project_id))
+        return
+    total = replay(args.project_id, args.limit, args.rate, args.round_size)
+    print(json.dumps(total, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Open-loop load generator for the project_router ingestion routes.
+
+Sends requests at a target rate for a duration, spread over the chosen
+routes, then reports throughput, latency percentiles, status codes and, with
+--stub, the upstream calls the Mixpanel stub received.
+
+    python -m tools.loadgen --url http://localhost:8000 --mixer-key <api key> \\
+        --rps 500 --duration 30 --routes event_props,increment --stub http://localhost:8900
+
+The Mixer-Key must belong to a premium project, or the hourly limit of
+freemium projects ends the run after a couple of requests.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+import uuid
+from collections import Counter
+from typing import Callable, Dict, List, Tuple
+
+import httpx
+
+PREFIX = "/api/v1/project"
+
+
+def event(n: int) -> dict:
+    return {
+        "distinct_id": f"user-{n % 1000}",
+        "event": "Load Test",
+        "properties": {"n": n, "$insert_id": uuid.uuid4().hex},
+    }
+
+
+# route name -> (path, payload of the n-th request)
+ROUTES: Dict[str, Tuple[str, Callable[[int], object]]] = {
+    "single_event": (
+        "/events/mixpanel/",
+        lambda n: {"distinct_id": f"user-{n % 1000}", "event": "Load Test"},
+    ),
+    "event_props": ("/events/mixpanel/props/", event),
+    "event_batch": ("/events/mixpanel/batch/", lambda n: [event(n)] * 50),
+    "people_set_once": (
+        "/people/mixpanel/add/prop/once/",
+        lambda n: {"distinct_id": f"user-{n % 1000}", "data": {"first_seen": n}},
+    ),
+    "increment": (
+        "/people/mixpanel/increment/prop/",
+        lambda n: {"distinct_id": f"user-{n % 1000}", "data": {"visits": 1}},
+    ),
+    "union": (
+        "/people/mixpanel/union/prop/",
+        lambda n: {"distinct_id": f"user-{n % 1000}", "data": {"tags": [n % 7]}},
+    ),
+    "ops": (
+        "/ops/",
+        lambda n: [
+            {"op": "track", "payload": event(n)},
+            {
+                "op": "increment",
+                "payload": {"distinct_id": f"user-{n % 1000}", "data": {"visits": 1}},
+            },
+        ],
+    ),
+}
+
+
+def percentile(values: List[float], share: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+async def stub_stats(client: httpx.AsyncClient, stub: str | None) -> dict:
+    if not stub:
+        return {}
+    return (await client.get(f"{stub}/stats/")).json()
+
+
+async def run(args) -> dict:
+    routes = [ROUTES[name] for name in args.routes.split(",")]
+    headers = {"Mixer-Key": args.mixer_key}
+    if args.respond_async:
+        headers["Prefer"] = "respond-async"
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    slots = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=args.url, headers=headers, limits=limits, timeout=args.timeout
+    ) as client:
+        before = await stub_stats(client, args.stub)
+
+        async def one(n: int):
+            path, payload = routes[n % len(routes)]
+            start = time.perf_counter()
+            try:
+                response = await client.post(PREFIX + path, json=payload(n))
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+            finally:
+                slots.release()
+
+        tasks = set()
+        interval = 1 / args.rps
+        started = time.perf_counter()
+        for n in itertools.count():
+            due = started + n * interval
+            if due - started >= args.duration:
+                break
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            await slots.acquire()
+            task = asyncio.create_task(one(n))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+        if args.stub:
+            # give batched deliveries time to reach the stub.
+            await asyncio.sleep(args.settle)
+        after = await stub_stats(client, args.stub)
+
+    latencies.sort()
+    report = {
+        "requests": sum(statuses.values()),
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(sum(statuses.values()) / elapsed, 1),
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "latency_ms": {
+            name: round(percentile(latencies, share) * 1000, 2)
+            for name, share in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))
+        },
+    }
+    report["latency_ms"]["max"] = round(latencies[-1] * 1000, 2) if latencies else 0
+    if args.stub:
+        report["upstream"] = {
+            key: {
+                name: count - before.get(key, {}).get(name, 0)
+                for name, count in after.get(key, {}).items()
+            }
+            for key in ("requests", "messages", "outcomes")
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--mixer-key", required=True)
+    parser.add_argument("--rps", type=float, default=100)
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--routes", default="event_props", help=",".join(ROUTES))
+    parser.add_argument("--respond-async", action="store_true")
+    parser.add_argument("--stub", help="base URL of tools.mixpanel_stub")
+    parser.add_argument("--settle", type=float, default=2, help="seconds")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
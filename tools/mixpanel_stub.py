@@ -0,0 +1,180 @@
+"""Local stand-in for the Mixpanel ingestion API.
+
+Serves /track, /engage, /groups and /import with configurable latency, error
+rate, rejection rate and throttling, and records what it receives.
+
+    python -m tools.mixpanel_stub --port 8900 --latency-ms 40 --error-rate 0.01
+
+Point the service at it with:
+
+    MIXER_API_SCHEME=http MIXER_API_HOST=localhost:8900 MIXER_EU_API_HOST=localhost:8900
+
+GET /stats/ returns the counters, POST /reset/ clears them.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import random
+import time
+from collections import Counter
+from typing import IO
+from urllib.parse import parse_qs
+
+import uvicorn
+from fastapi import FastAPI, Request, status
+from fastapi.responses import ORJSONResponse
+
+ENDPOINTS = ("track", "engage", "groups", "import")
+
+
+class StubState:
+    """Behaviour and counters of the stub."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        reject_rate: float = 0.0,
+        throttle_rps: float = 0.0,
+        record: IO | None = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.reject_rate = reject_rate
+        self.throttle_rps = throttle_rps
+        self.record = record
+        self.reset()
+
+    def reset(self):
+        self.requests: Counter = Counter()
+        self.messages: Counter = Counter()
+        self.outcomes: Counter = Counter()
+        self.bytes: Counter = Counter()
+        self._second = 0
+        self._in_second = 0
+
+    def throttled(self) -> bool:
+        if not self.throttle_rps:
+            return False
+        second = int(time.monotonic())
+        if second != self._second:
+            self._second, self._in_second = second, 0
+        self._in_second += 1
+        return self._in_second > self.throttle_rps
+
+    def stats(self) -> dict:
+        return {
+            "requests": dict(self.requests),
+            "messages": dict(self.messages),
+            "outcomes": dict(self.outcomes),
+            "bytes": dict(self.bytes),
+        }
+
+
+def decode(body: bytes, encoding: str | None) -> list:
+    """Messages of a Mixpanel form body, gzipped or not."""
+    if encoding == "gzip":
+        body = gzip.decompress(body)
+    data = parse_qs(body.decode()).get("data", ["[]"])[0]
+    messages = json.loads(data)
+    return messages if isinstance(messages, list) else [messages]
+
+
+def create_app(state: StubState) -> FastAPI:
+    app = FastAPI(default_response_class=ORJSONResponse)
+
+    @app.post("/{endpoint}")
+    async def ingest(endpoint: str, request: Request):
+        if endpoint not in ENDPOINTS:
+            return ORJSONResponse({"error": "not found"}, status.HTTP_404_NOT_FOUND)
+
+        body = await request.body()
+        state.requests[endpoint] += 1
+        state.bytes[request.headers.get("content-encoding", "identity")] += len(body)
+        if state.latency or state.jitter:
+            await asyncio.sleep(
+                max(0.0, state.latency + random.uniform(-state.jitter, state.jitter))
+            )
+
+        if state.throttled():
+            state.outcomes["throttled"] += 1
+            return ORJSONResponse(
+                {"status": 0, "error": "rate limited"},
+                status.HTTP_429_TOO_MANY_REQUESTS,
+            )
+        if random.random() < state.error_rate:
+            state.outcomes["error"] += 1
+            return ORJSONResponse(
+                {"status": 0, "error": "stub failure"},
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+        try:
+            messages = decode(body, request.headers.get("content-encoding"))
+        except ValueError as e:
+            state.outcomes["invalid"] += 1
+            return {"status": 0, "error": f"invalid data: {e}"}
+        if random.random() < state.reject_rate:
+            state.outcomes["rejected"] += 1
+            return {"status": 0, "error": "stub rejection"}
+
+        state.outcomes["accepted"] += 1
+        state.messages[endpoint] += len(messages)
+        if state.record is not None:
+            record = {"endpoint": endpoint, "at": time.time(), "messages": messages}
+            state.record.write(json.dumps(record) + "\n")
+        return {"status": 1, "error": None}
+
+    @app.get("/stats/")
+    def stats():
+        return state.stats()
+
+    @app.post("/reset/")
+    def reset():
+        state.reset()
+        return state.stats()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="share of 503 answers"
+    )
+    parser.add_argument(
+        "--reject-rate", type=float, default=0.0, help='share of {"status": 0} answers'
+    )
+    parser.add_argument(
+        "--throttle-rps", type=float, default=0.0, help="429 past this many requests/s"
+    )
+    parser.add_argument("--record", help="JSONL file of the received messages")
+    args = parser.parse_args()
+
+    record = open(args.record, "a", buffering=1) if args.record else None
+    state = StubState(
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        reject_rate=args.reject_rate,
+        throttle_rps=args.throttle_rps,
+        record=record,
+    )
+    try:
+        uvicorn.run(
+            create_app(state), host=args.host, port=args.port, log_level="warning"
+        )
+    finally:
+        if record is not None:
+            record.close()
+
+
+if __name__ == "__main__":
+    main()
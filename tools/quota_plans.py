@@ -0,0 +1,114 @@
+"""Lists, saves and assigns the quota plans of freemium projects.
+
+    python -m tools.quota_plans list
+    python -m tools.quota_plans save starter --hourly-limit 500 [--burst 50] [--weight track=2]
+    python -m tools.quota_plans assign starter (--project-id 3 | --org-id 2)
+    python -m tools.quota_plans unassign (--project-id 3 | --org-id 2)
+
+Weights are units of the limit an operation spends, by operation name of
+MIXER_OPERATIONS (1 when not listed, 0 to not count it); a list sent to
+/ops/ or the batch and stream routes spends the weight of each of its
+operations. Every change bumps the version of the plans in the Redis of the
+rate limit, and API workers reload them within
+MIXER_QUOTA_PLAN_CHECK_INTERVAL seconds, without a deploy. Without Redis, or
+when it cannot be reached, they pick changes up within MIXER_QUOTA_PLAN_TTL
+seconds. Settings are read from the environment or .env like the app.
+"""
+import argparse
+import json
+import sys
+
+import redis
+
+from src.app.utils.quota_plans import quota_plans
+from src.projects.project_repository import quota_plan_repo
+
+
+def weight(value: str) -> tuple:
+    operation, _, units = value.partition("=")
+    if not operation or not units.isdigit():
+        raise argparse.ArgumentTypeError(f"expected operation=units, got {value!r}")
+    return operation, int(units)
+
+
+def announce():
+    """Tells the API workers to reload the plans."""
+    try:
+        if quota_plans.changed():
+            return
+    except redis.RedisError as e:
+        print(f"Quota plan version not bumped: {e}", file=sys.stderr)
+    print("API workers pick the change up within MIXER_QUOTA_PLAN_TTL seconds")
+
+
+def add_target(parser: argparse.ArgumentParser):
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--project-id", type=int)
+    target.add_argument("--org-id", type=int)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="every quota plan")
+
+    save_parser = commands.add_parser("save", help="create or update a quota plan")
+    save_parser.add_argument("name")
+    save_parser.add_argument("--hourly-limit", type=int, required=True)
+    save_parser.add_argument(
+        "--burst",
+        type=int,
+        default=0,
+        help="most units in MIXER_RATE_BURST_WINDOW seconds, 0 for no limit",
+    )
+    save_parser.add_argument(
+        "--weight", type=weight, action="append", default=[], help="operation=units"
+    )
+
+    assign_parser = commands.add_parser("assign", help="assign a quota plan")
+    assign_parser.add_argument("name")
+    add_target(assign_parser)
+
+    unassign_parser = commands.add_parser("unassign", help="back to the default plan")
+    add_target(unassign_parser)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for plan_id, name, hourly_limit, burst, weights in quota_plan_repo.get_plans():
+            print(
+                json.dumps(
+                    {
+                        "id": plan_id,
+                        "name": name,
+                        "hourly_limit": hourly_limit,
+                        "burst": burst,
+                        "weights": weights,
+                    }
+                )
+            )
+        return
+
+    if args.command == "save":
+        plan = quota_plan_repo.save_plan(
+            args.name, args.hourly_limit, args.burst, dict(args.weight)
+        )
+        print(f"Quota plan {plan.name} saved with id {plan.id}")
+        announce()
+        return
+
+    plan_id = None
+    if args.command == "assign":
+        plans = {name: id_ for id_, name, *_ in quota_plan_repo.get_plans()}
+        if args.name not in plans:
+            sys.exit(f"No quota plan named {args.name}")
+        plan_id = plans[args.name]
+    assigned = quota_plan_repo.assign_plan(plan_id, args.project_id, args.org_id)
+    if not assigned:
+        sys.exit("No such project or organization")
+    print(f"Quota plan {args.name if plan_id else 'default'} assigned")
+    announce()
+
+
+if __name__ == "__main__":
+    main()
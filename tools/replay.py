@@ -0,0 +1,146 @@
+"""Replays a traffic capture against a running instance.
+
+Captures are written by the capture middleware (MIXER_CAPTURE_ENABLED=true).
+Requests are sent in capture order with their recorded spacing divided by
+--speed; --speed 0 sends them as fast as --concurrency allows.
+
+    python -m tools.replay captures/capture.jsonl.gz --url http://localhost:8000 \\
+        --speed 2 --mixer-key <api key> --stub http://localhost:8900
+
+Redacted Mixer-Key values are replaced by --mixer-key, or looked up in the
+JSON file given with --key-map ({"redacted:...": "<api key>"}).
+"""
+import argparse
+import asyncio
+import base64
+import gzip
+import json
+import time
+from collections import Counter
+from typing import Dict, Iterator, List
+
+import httpx
+
+from tools.loadgen import percentile, stub_stats
+
+# hop-by-hop or recomputed by the client.
+SKIPPED_HEADERS = {"host", "content-length", "connection", "transfer-encoding"}
+
+
+def read_capture(path: str) -> Iterator[dict]:
+    with gzip.open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def request_headers(record: dict, key_map: Dict[str, str], mixer_key: str | None):
+    headers = []
+    for name, value in record["headers"]:
+        if name in SKIPPED_HEADERS:
+            continue
+        if name == "mixer-key":
+            value = mixer_key or key_map.get(value, value)
+        headers.append((name, value))
+    return headers
+
+
+async def replay(records: List[dict], args, key_map: Dict[str, str]) -> dict:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    mismatched = 0
+    slots = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=args.timeout
+    ) as client:
+        before = await stub_stats(client, args.stub)
+
+        async def one(record: dict):
+            nonlocal mismatched
+            start = time.perf_counter()
+            try:
+                response = await client.request(
+                    record["method"],
+                    record["path"] + (f"?{record['query']}" if record["query"] else ""),
+                    content=base64.b64decode(record["body"]),
+                    headers=request_headers(record, key_map, args.mixer_key),
+                )
+                statuses[response.status_code] += 1
+                mismatched += response.status_code != record["status"]
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+            finally:
+                slots.release()
+
+        tasks = set()
+        first = records[0]["at"] if records else 0.0
+        started = time.perf_counter()
+        for record in records:
+            if args.speed:
+                due = started + (record["at"] - first) / args.speed
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            await slots.acquire()
+            task = asyncio.create_task(one(record))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+        if args.stub:
+            # give batched deliveries time to reach the stub.
+            await asyncio.sleep(args.settle)
+        after = await stub_stats(client, args.stub)
+
+    latencies.sort()
+    report = {
+        "requests": len(records),
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(len(records) / elapsed, 1) if elapsed else 0,
+        "captured_seconds": round(records[-1]["at"] - first, 2) if records else 0,
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "status_mismatches": mismatched,
+        "latency_ms": {
+            name: round(percentile(latencies, share) * 1000, 2)
+            for name, share in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))
+        },
+    }
+    if args.stub:
+        report["upstream"] = {
+            key: {
+                name: count - before.get(key, {}).get(name, 0)
+                for name, count in after.get(key, {}).items()
+            }
+            for key in ("requests", "messages", "outcomes")
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", help="gzip JSONL capture file")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="1 real time, N faster, 0 max"
+    )
+    parser.add_argument("--mixer-key", help="Mixer-Key sent with every request")
+    parser.add_argument("--key-map", help="JSON file of redacted key -> api key")
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--stub", help="base URL of tools.mixpanel_stub")
+    parser.add_argument("--settle", type=float, default=2, help="seconds")
+    args = parser.parse_args()
+
+    key_map = {}
+    if args.key_map:
+        with open(args.key_map) as f:
+            key_map = json.load(f)
+    records = sorted(read_capture(args.capture), key=lambda r: r["at"])
+    print(json.dumps(asyncio.run(replay(records, args, key_map)), indent=2))
+
+
+if __name__ == "__main__":
+    main()